@@ -0,0 +1,195 @@
+# audio_engine.py
+# In-process audio path for task2/task3: decode once with soundfile, trim, resample to
+# 16 kHz mono with a NumPy polyphase filter and normalize gain on the array. No ffmpeg
+# or ffprobe processes are started.
+#
+# Besides the 16-bit WAV that the rest of the pipeline reads, the float32 result can be
+# kept as a .npy next to it (<output_dir>/.pcm/<name>.npy). Task 3 then memory-maps that
+# buffer and hands it straight to Whisper, instead of Whisper decoding the WAV again
+# through its own ffmpeg call.
+
+import os
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+import soundfile as sf
+
+try:
+    import torchaudio
+except ImportError:
+    torchaudio = None
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+TARGET_RATE = 16000
+PCM_DIR = ".pcm"
+FILTER_HALF_LENGTH = 10     # zero crossings per side of the anti-aliasing filter
+KAISER_BETA = 5.0
+CHUNK_OUTPUT_SAMPLES = 1 << 16
+GATE_BLOCK_SEC = 0.4        # loudness blocks, as in BS.1770
+ABSOLUTE_GATE_DB = -70.0
+RELATIVE_GATE_DB = -10.0
+
+# ---------------------------
+# DECODING
+# ---------------------------
+def decode(path: str, start_sec: float = 0.0, stop_sec: float = None):
+    """
+    Decodes [start_sec, stop_sec) of a file to float32 mono; returns (audio, rate).
+    soundfile (libsndfile >= 1.1) reads WAV/FLAC/OGG/MP3 and seeks without
+    decoding the skipped part; torchaudio is the fallback for anything else.
+    """
+    try:
+        info = sf.info(path)
+        start = int(round(start_sec * info.samplerate))
+        stop = int(round(stop_sec * info.samplerate)) if stop_sec is not None else None
+        audio, rate = sf.read(path, start=start, stop=stop, dtype="float32", always_2d=True)
+        return audio.mean(axis=1, dtype=np.float32), rate
+    except sf.LibsndfileError:
+        if torchaudio is None:
+            raise
+    waveform, rate = torchaudio.load(path)
+    audio = waveform.mean(dim=0).numpy().astype(np.float32)
+    start = int(round(start_sec * rate))
+    stop = int(round(stop_sec * rate)) if stop_sec is not None else None
+    return audio[start:stop], rate
+
+def duration(path: str) -> float:
+    try:
+        return sf.info(path).duration
+    except sf.LibsndfileError:
+        if torchaudio is None:
+            raise
+        info = torchaudio.info(path)
+        return info.num_frames / info.sample_rate
+
+# ---------------------------
+# RESAMPLING
+# ---------------------------
+@lru_cache(maxsize=16)
+def _polyphase_filter(up: int, down: int):
+    """
+    Kaiser-windowed sinc low-pass at the lower of the two Nyquist rates,
+    split into `up` phases: row p holds taps p, p + up, p + 2*up, ...
+    Returns (phases, filter delay on the upsampled grid).
+    """
+    max_rate = max(up, down)
+    half = FILTER_HALF_LENGTH * max_rate
+    n = np.arange(-half, half + 1)
+    taps = np.sinc(n / max_rate) * np.kaiser(2 * half + 1, KAISER_BETA) * (up / max_rate)
+    phase_len = -(-taps.size // up)
+    taps = np.concatenate([taps, np.zeros(phase_len * up - taps.size)])
+    return taps.reshape(phase_len, up).T.astype(np.float32), half
+
+def resample_poly(audio: np.ndarray, from_rate: int, to_rate: int = TARGET_RATE) -> np.ndarray:
+    """
+    Rational-ratio polyphase resampling (the same scheme as scipy's resample_poly):
+    each output sample is one dot product of a filter phase with the input,
+    so nothing is computed for the zero-stuffed samples. Works in chunks of
+    output samples to bound memory on hour-long lectures.
+    """
+    if from_rate == to_rate:
+        return audio.astype(np.float32, copy=False)
+    ratio = Fraction(to_rate, from_rate)
+    up, down = ratio.numerator, ratio.denominator
+    phases, delay = _polyphase_filter(up, down)
+    phase_len = phases.shape[1]
+
+    # Zero padding on both sides so every window index is valid.
+    padded = np.concatenate([np.zeros(phase_len, np.float32), audio.astype(np.float32, copy=False), np.zeros(phase_len, np.float32)])
+    num_out = -(-audio.size * up // down)
+    out = np.empty(num_out, dtype=np.float32)
+    offsets = np.arange(phase_len)
+
+    for chunk_start in range(0, num_out, CHUNK_OUTPUT_SAMPLES):
+        n = np.arange(chunk_start, min(chunk_start + CHUNK_OUTPUT_SAMPLES, num_out), dtype=np.int64)
+        t = n * down + delay           # position on the upsampled grid, centred on the filter
+        phase, base = t % up, t // up
+        windows = padded[phase_len + base[:, None] - offsets]
+        out[n[0]:n[-1] + 1] = np.einsum("ij,ij->i", windows, phases[phase])
+    return out
+
+# ---------------------------
+# GAIN
+# ---------------------------
+def gated_loudness_db(audio: np.ndarray, rate: int) -> float:
+    """
+    Integrated level in dBFS over 400 ms blocks with BS.1770-style absolute
+    and relative gates (no K-weighting), so silences don't drag it down.
+    """
+    block = int(GATE_BLOCK_SEC * rate)
+    if audio.size < block:
+        blocks = audio[None, :]
+    else:
+        blocks = audio[:audio.size // block * block].reshape(-1, block)
+    power = np.mean(blocks.astype(np.float64) ** 2, axis=1)
+    levels = 10 * np.log10(np.maximum(power, 1e-12))
+    kept = power[levels > ABSOLUTE_GATE_DB]
+    if kept.size == 0:
+        return float("-inf")
+    relative_gate = 10 * np.log10(kept.mean()) + RELATIVE_GATE_DB
+    kept = kept[10 * np.log10(kept) > relative_gate]
+    return float(10 * np.log10(kept.mean()))
+
+def normalize_gain(audio: np.ndarray, rate: int, target_db: float, peak_db: float) -> np.ndarray:
+    """One linear gain towards target_db, capped so the peak stays under peak_db."""
+    level = gated_loudness_db(audio, rate)
+    if not np.isfinite(level):
+        return audio
+    gain_db = target_db - level
+    peak = float(np.max(np.abs(audio))) if audio.size else 0.0
+    if peak > 0:
+        gain_db = min(gain_db, peak_db - 20 * np.log10(peak))
+    audio *= np.float32(10 ** (gain_db / 20))
+    return audio
+
+# ---------------------------
+# FILE-LEVEL API
+# ---------------------------
+def pcm_path_for(wav_path: str) -> str:
+    directory, name = os.path.split(wav_path)
+    return os.path.join(directory, PCM_DIR, os.path.splitext(name)[0] + ".npy")
+
+def process_audio(input_file: str, start_trim: float, end_trim: float, target_db: float, peak_db: float,
+                  rate: int = TARGET_RATE):
+    """
+    Decodes, trims, resamples and normalizes one file. Returns the float32
+    16 kHz mono array, or None when the file is too short for the trim.
+    """
+    stop = duration(input_file) - end_trim
+    if stop <= start_trim:
+        return None
+    audio, source_rate = decode(input_file, start_trim, stop)
+    audio = resample_poly(audio, source_rate, rate)
+    return normalize_gain(audio, rate, target_db, peak_db)
+
+def write_outputs(audio: np.ndarray, wav_path: str, keep_pcm: bool = False, rate: int = TARGET_RATE):
+    """
+    Writes the 16-bit WAV (via a .part file, like the ffmpeg path) and, with
+    keep_pcm, the float32 buffer as a .npy for load_for_alignment().
+    """
+    partial = wav_path + ".part"
+    sf.write(partial, audio, rate, subtype="PCM_16", format="WAV")
+    os.replace(partial, wav_path)
+    if keep_pcm:
+        pcm_path = pcm_path_for(wav_path)
+        os.makedirs(os.path.dirname(pcm_path), exist_ok=True)
+        mm = np.lib.format.open_memmap(pcm_path + ".part.npy", mode="w+", dtype=np.float32, shape=audio.shape)
+        mm[:] = audio
+        mm.flush()
+        del mm
+        os.replace(pcm_path + ".part.npy", pcm_path)
+
+def load_for_alignment(wav_path: str, start: int = 0, stop: int = None) -> np.ndarray:
+    """
+    float32 16 kHz samples [start, stop) of a processed lecture. Uses the
+    memory-mapped .npy from the in-process engine when it is at least as new
+    as the WAV (no decode, pages shared between processes), else reads the WAV.
+    """
+    pcm_path = pcm_path_for(wav_path)
+    if os.path.exists(pcm_path) and os.path.getmtime(pcm_path) >= os.path.getmtime(wav_path):
+        return np.load(pcm_path, mmap_mode="r")[start:stop]
+    audio, _ = sf.read(wav_path, start=start, stop=stop, dtype="float32", always_2d=True)
+    return audio.mean(axis=1, dtype=np.float32)
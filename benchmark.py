@@ -0,0 +1,381 @@
+# benchmark.py
+# Reproducible benchmarks for the pipeline stages on a synthetic lecture corpus.
+#
+# The corpus is generated offline from a fixed seed: tone + noise "lectures" (MP3 via
+# ffmpeg, or WAV via soundfile when ffmpeg is missing), matching text PDFs written by a
+# tiny built-in PDF writer, plus ready-made 16 kHz WAVs and transcripts so the later
+# stages can be measured on their own. Corpora are cached under --corpus_dir, keyed by
+# their settings.
+#
+# Each (stage, size) case runs in a fresh spawned process, so its peak RSS is its own.
+# Results are compared with a stored baseline (benchmark_baseline.json); throughput or
+# memory that is worse than the baseline by more than --tolerance is reported as a
+# regression and the script exits non-zero. Baselines are machine-specific: save one
+# (--save_baseline) on the machine you compare on.
+
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from instrumentation import peak_rss_mb
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+CORPUS_DIR = "nptel_data/.bench_corpus"
+BASELINE_FILE = "benchmark_baseline.json"
+DEFAULT_SIZES = [10, 100, 1000]
+DEFAULT_SECONDS = 60.0     # must exceed task2's 12s + 30s trims
+DEFAULT_TOLERANCE = 0.15   # 15% slower (or bigger) than baseline counts as a regression
+SOURCE_RATE = 44100
+PROCESSED_RATE = 16000
+WORDS_PER_MINUTE = 150
+SEED = 1234
+
+STAGES = ["process_file", "process_file_inprocess", "clean_aligned_text", "pdf_extract", "manifest", "dashboard_stats", "dataset_epoch", "quality_metrics"]
+
+VOCABULARY = (
+    "the a of to and in is that we this for it be on with as are by can so at an or "
+    "gradient descent network layer neuron weight bias loss function matrix vector "
+    "convolution kernel activation softmax dropout batch epoch training validation "
+    "model parameter optimizer learning rate error backpropagation output input"
+).split()
+
+# ---------------------------
+# CORPUS GENERATION
+# ---------------------------
+def lecture_text(rng: random.Random, num_words: int) -> str:
+    """Lecture-like text with sentences, punctuation and numbers for the normalizer."""
+    words = []
+    while len(words) < num_words:
+        sentence = [rng.choice(VOCABULARY) for _ in range(rng.randint(6, 18))]
+        if rng.random() < 0.4:
+            sentence.insert(rng.randrange(len(sentence)), str(rng.randint(0, 2024)))
+        sentence[0] = sentence[0].capitalize()
+        words.extend(sentence[:-1] + [sentence[-1] + rng.choice(".,?;")])
+    return " ".join(words[:num_words])
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_text_pdf(path: str, text: str, chars_per_line: int = 90, lines_per_page: int = 50):
+    """Writes a minimal multi-page PDF (Helvetica, one text object per page)."""
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > chars_per_line:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    lines.append(line)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    # Object 1: catalog, 2: page tree, 3: font, then a (page, content) pair per page.
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_lines in pages:
+        stream = "BT /F1 11 Tf 14 TL 50 790 Td " + " ".join(f"({_pdf_escape(l)}) Tj T*" for l in page_lines) + " ET"
+        stream = stream.encode("latin-1", "replace")
+        objects.append(None)  # page, filled in below
+        page_ids.append(len(objects))
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects[page_ids[-1] - 1] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (page_ids[-1] + 1)
+        )
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+def synth_audio(rng: np.random.Generator, seconds: float, sample_rate: int) -> np.ndarray:
+    """A few seconds-long tones over pink-ish noise, so loudnorm has something to do."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    tone = np.zeros_like(t)
+    for start in np.arange(0.0, seconds, 2.0):
+        mask = (t >= start) & (t < start + 1.5)
+        tone[mask] = 0.3 * np.sin(2 * np.pi * rng.uniform(120, 400) * t[mask])
+    noise = np.cumsum(rng.standard_normal(t.size)) * 0.001
+    noise -= np.convolve(noise, np.ones(64) / 64, mode="same")
+    return (tone + noise).astype(np.float32)
+
+def _write_source_audio(path_stem: str, audio: np.ndarray, use_ffmpeg: bool) -> str:
+    if not use_ffmpeg:
+        sf.write(path_stem + ".wav", audio, SOURCE_RATE, subtype="PCM_16")
+        return path_stem + ".wav"
+    cmd = [
+        "ffmpeg", "-y", "-f", "f32le", "-ar", str(SOURCE_RATE), "-ac", "1", "-i", "pipe:0",
+        "-codec:a", "libmp3lame", "-b:a", "128k", path_stem + ".mp3",
+    ]
+    subprocess.run(cmd, input=audio.tobytes(), check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return path_stem + ".mp3"
+
+def generate_corpus(size: int, seconds: float = DEFAULT_SECONDS, corpus_dir: str = CORPUS_DIR, seed: int = SEED) -> str:
+    """
+    Generates (or reuses) a corpus of `size` lectures and returns its directory:
+      audio/                  source audio (MP3, or WAV without ffmpeg)
+      transcripts/            text PDFs
+      raw_text/               the PDFs' text, un-normalized
+      processed_audio/        16 kHz mono WAVs (input to the manifest stage)
+      processed_transcripts/  normalized .txt files
+    """
+    from text_normalizer import normalize_text
+
+    use_ffmpeg = shutil.which("ffmpeg") is not None
+    settings = {"size": size, "seconds": seconds, "seed": seed, "ffmpeg": use_ffmpeg}
+    root = os.path.join(corpus_dir, f"n{size}_s{seconds:g}_seed{seed}")
+    settings_path = os.path.join(root, "corpus.json")
+    if os.path.exists(settings_path):
+        with open(settings_path, "r", encoding="utf-8") as f:
+            if json.load(f) == settings:
+                return root
+    shutil.rmtree(root, ignore_errors=True)
+
+    dirs = {name: os.path.join(root, name) for name in ["audio", "transcripts", "raw_text", "processed_audio", "processed_transcripts"]}
+    for directory in dirs.values():
+        os.makedirs(directory, exist_ok=True)
+
+    text_rng = random.Random(seed)
+    audio_rng = np.random.default_rng(seed)
+    num_words = int(seconds / 60 * WORDS_PER_MINUTE)
+    for i in range(size):
+        name = f"Lecture_{i // 10 + 1}_{i % 10 + 1}_Synthetic"
+        text = lecture_text(text_rng, num_words)
+        write_text_pdf(os.path.join(dirs["transcripts"], name + ".pdf"), text)
+        with open(os.path.join(dirs["raw_text"], name + ".txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        with open(os.path.join(dirs["processed_transcripts"], name + ".txt"), "w", encoding="utf-8") as f:
+            f.write(normalize_text(text))
+
+        _write_source_audio(os.path.join(dirs["audio"], name), synth_audio(audio_rng, seconds, SOURCE_RATE), use_ffmpeg)
+        # Stands in for task2's output, so later stages don't depend on ffmpeg.
+        processed = synth_audio(audio_rng, max(seconds - 42.0, 1.0), PROCESSED_RATE)
+        sf.write(os.path.join(dirs["processed_audio"], name + ".wav"), processed, PROCESSED_RATE, subtype="PCM_16")
+
+    with open(settings_path, "w", encoding="utf-8") as f:
+        json.dump(settings, f)
+    return root
+
+# ---------------------------
+# STAGE RUNNERS
+# ---------------------------
+# Each runner takes the corpus directory, an empty scratch directory and the
+# worker count, times only the stage's own work (not its setup), and returns
+# (items, audio seconds or None, elapsed seconds).
+
+def _list(directory: str, extension) -> list:
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(extension))
+
+def run_process_file(root: str, scratch: str, workers: int, engine: str = "ffmpeg"):
+    import task2_process_audio as task2
+    if engine == "ffmpeg" and shutil.which("ffmpeg") is None:
+        raise RuntimeError("ffmpeg not found")
+    tasks = [(f, scratch, {"trim_mode": "reverse", "engine": engine}) for f in _list(os.path.join(root, "audio"), (".mp3", ".wav"))]
+    with multiprocessing.Pool(workers) as pool:
+        start = time.perf_counter()
+        errors = [r for _, r in pool.imap_unordered(task2.process_task, tasks) if r]
+        elapsed = time.perf_counter() - start
+    if errors:
+        raise RuntimeError(errors[0])
+    return len(tasks), sum(sf.info(p).duration for p in _list(scratch, ".wav")), elapsed
+
+def run_clean_aligned_text(root: str, scratch: str, workers: int):
+    # task3.clean_aligned_text delegates to normalize_text; calling it directly
+    # keeps Whisper out of the benchmark process.
+    from text_normalizer import normalize_text
+    texts = []
+    for path in _list(os.path.join(root, "raw_text"), ".txt"):
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    start = time.perf_counter()
+    for text in texts:
+        normalize_text(text)
+    return len(texts), None, time.perf_counter() - start
+
+def run_pdf_extract(root: str, scratch: str, workers: int):
+    from pdf_text_cache import extract_pdf_text
+    pdfs = _list(os.path.join(root, "transcripts"), ".pdf")
+    start = time.perf_counter()
+    for pdf in pdfs:
+        extract_pdf_text(pdf, "auto", scratch)  # empty cache dir: every PDF is extracted
+    return len(pdfs), None, time.perf_counter() - start
+
+def run_manifest(root: str, scratch: str, workers: int):
+    from task4_manifest_file import build_manifest
+    start = time.perf_counter()
+    summary = build_manifest(os.path.join(root, "processed_audio"), os.path.join(root, "processed_transcripts"),
+                             os.path.join(scratch, "manifest.jsonl"), incremental=False)
+    return summary["entries"], None, time.perf_counter() - start
+
+def run_dashboard_stats(root: str, scratch: str, workers: int):
+    """What the dashboard computes per load: corpus stats plus per-utterance error counts."""
+    from task4_manifest_file import build_manifest
+    from manifest_stats import ManifestStats
+    from error_rates import ErrorTotals, compute_counts
+    manifest = os.path.join(scratch, "manifest.jsonl")
+    build_manifest(os.path.join(root, "processed_audio"), os.path.join(root, "processed_transcripts"), manifest, incremental=False)
+
+    start = time.perf_counter()
+    with open(manifest, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    stats = ManifestStats.from_entries(entries)
+    # Deterministic "hypotheses": every 7th word dropped. No cache, so every pair is scored.
+    refs = [e["text"] for e in entries]
+    hyps = [" ".join(w for i, w in enumerate(r.split()) if i % 7) for r in refs]
+    ErrorTotals().add_many(compute_counts(refs, hyps, workers=workers))
+    return stats.num_utterances, stats.total_duration, time.perf_counter() - start
+
+def run_dataset_epoch(root: str, scratch: str, workers: int):
+    """One epoch of length-bucketed, prefetched training batches over the manifest."""
+    from task4_manifest_file import build_manifest
+    from manifest_dataset import ManifestDataset
+    manifest = os.path.join(scratch, "manifest.jsonl")
+    build_manifest(os.path.join(root, "processed_audio"), os.path.join(root, "processed_transcripts"), manifest, incremental=False)
+
+    start = time.perf_counter()
+    dataset = ManifestDataset(manifest, shuffle=False)
+    items = audio_seconds = 0
+    for batch in dataset:
+        items += len(batch["entries"])
+        audio_seconds += float(batch["lengths"].sum()) / 16000
+    return items, audio_seconds, time.perf_counter() - start
+
+def run_quality_metrics(root: str, scratch: str, workers: int):
+    from quality_filter import score_pairs
+    audio = {os.path.splitext(os.path.basename(p))[0]: p for p in _list(os.path.join(root, "processed_audio"), ".wav")}
+    texts = {os.path.splitext(os.path.basename(p))[0]: p for p in _list(os.path.join(root, "processed_transcripts"), ".txt")}
+    pairs = {c: (audio[c], texts[c]) for c in audio if c in texts}
+    start = time.perf_counter()
+    metrics = score_pairs(pairs, os.path.join(scratch, "quality.json"), workers, show_progress=False)  # empty sidecar: every pair is scored
+    return len(metrics), sum(m["duration"] for m in metrics.values()), time.perf_counter() - start
+
+RUNNERS = {
+    "process_file": run_process_file,
+    "process_file_inprocess": lambda root, scratch, workers: run_process_file(root, scratch, workers, "inprocess"),
+    "clean_aligned_text": run_clean_aligned_text,
+    "pdf_extract": run_pdf_extract,
+    "manifest": run_manifest,
+    "dashboard_stats": run_dashboard_stats,
+    "dataset_epoch": run_dataset_epoch,
+    "quality_metrics": run_quality_metrics,
+}
+
+def _run_case(stage: str, root: str, scratch: str, workers: int) -> dict:
+    """
+    Runs in a fresh process: times one stage and reports its peak RSS, and that
+    of the largest worker process it waited for (Pool workers, ffmpeg).
+    """
+    os.environ["NPTEL_METRICS_LOG"] = ""  # keep the task scripts' metrics out of the timing
+    items, audio_seconds, elapsed = RUNNERS[stage](root, scratch, workers)
+    return {
+        "items": items,
+        "wall_sec": round(elapsed, 4),
+        "items_per_sec": round(items / elapsed, 2) if elapsed > 0 else None,
+        "audio_sec_per_sec": round(audio_seconds / elapsed, 2) if audio_seconds and elapsed > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "child_peak_rss_mb": peak_rss_mb(children=True),
+    }
+
+def run_benchmarks(stages, sizes, seconds: float = DEFAULT_SECONDS, workers: int = None, corpus_dir: str = CORPUS_DIR) -> dict:
+    """Returns {"<stage>@<size>": result} for every case; failed cases carry an "error"."""
+    workers = workers or os.cpu_count() or 1
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for size in sizes:
+        print(f"[INFO] Preparing synthetic corpus: {size} lectures x {seconds:g}s ...")
+        root = generate_corpus(size, seconds, corpus_dir)
+        for stage in stages:
+            scratch = os.path.join(root, ".scratch", stage)
+            shutil.rmtree(scratch, ignore_errors=True)
+            os.makedirs(scratch)
+            case = f"{stage}@{size}"
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    results[case] = pool.submit(_run_case, stage, root, scratch, workers).result()
+            except Exception as e:
+                results[case] = {"error": str(e)}
+            finally:
+                shutil.rmtree(scratch, ignore_errors=True)
+            print(f"[INFO] {case}: {results[case]}")
+    return results
+
+# ---------------------------
+# BASELINE COMPARISON
+# ---------------------------
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """Returns (case, metric, baseline, current, change) rows for every regression."""
+    regressions = []
+    for case, current in results.items():
+        base = baseline.get(case)
+        if not base or "error" in base or "error" in current:
+            continue
+        if base.get("items_per_sec") and current.get("items_per_sec"):
+            change = current["items_per_sec"] / base["items_per_sec"] - 1.0
+            if change < -tolerance:
+                regressions.append((case, "items_per_sec", base["items_per_sec"], current["items_per_sec"], change))
+        for metric in ("peak_rss_mb", "child_peak_rss_mb"):
+            if base.get(metric) and current.get(metric):
+                change = current[metric] / base[metric] - 1.0
+                if change > tolerance:
+                    regressions.append((case, metric, base[metric], current[metric], change))
+    return regressions
+
+# ---------------------------
+# MAIN
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on a synthetic corpus and compare with a baseline.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to benchmark.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="Corpus sizes (number of lectures).")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS, help="Length of each synthetic lecture in seconds.")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel workers where a stage uses them (default: CPU count).")
+    parser.add_argument("--corpus_dir", default=CORPUS_DIR, help="Where generated corpora are cached.")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline results to compare against.")
+    parser.add_argument("--save_baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative slowdown / memory growth.")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.stages, args.sizes, args.seconds, args.workers, args.corpus_dir)
+
+    print("\n" + "="*50)
+    print("BENCHMARK RESULTS")
+    print("="*50)
+    for case, result in results.items():
+        if "error" in result:
+            print(f"{case:<28} skipped: {result['error']}")
+        else:
+            print(f"{case:<28} {result['items_per_sec']:>10} items/s  {result['wall_sec']:>9.3f}s  {str(result['peak_rss_mb']):>8} MB  {str(result.get('child_peak_rss_mb')):>8} MB children")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"\n[DONE] Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for case, metric, base, current, change in regressions:
+            print(f"[REGRESSION] {case} {metric}: {base} -> {current} ({change:+.0%})")
+        if regressions:
+            raise SystemExit(1)
+        print(f"\n[DONE] No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    else:
+        print(f"\n[INFO] No baseline at {args.baseline}; run with --save_baseline to create one.")
@@ -0,0 +1,336 @@
+# dedup_index.py
+# Near-duplicate detection for downloaded lectures, run before task2/task3.
+#
+# Audio: landmark fingerprints. Spectral peaks are picked from a NumPy STFT of a fixed
+# excerpt, paired into (f1, f2, dt) hashes, and matched through an inverted index. A
+# re-upload matches many hashes at one consistent time offset, even when it was trimmed
+# or re-encoded.
+# Transcripts: MinHash signatures of word 5-shingles with LSH banding. Only lectures
+# sharing a band bucket are compared, so lookups stay sublinear in the corpus size.
+#
+# Everything lives in one SQLite file. The first lecture indexed is the original; any
+# later lecture that matches it is recorded in nptel_data/duplicates.json, which task2,
+# task3 and the pipeline consult before doing the expensive work.
+
+import os
+import json
+import sqlite3
+import hashlib
+import argparse
+from collections import Counter
+
+import numpy as np
+from tqdm import tqdm
+
+import audio_engine
+from text_normalizer import normalize_text
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+INDEX_PATH = "nptel_data/dedup_index.sqlite"
+DUPLICATES_FILE = "nptel_data/duplicates.json"
+
+# Audio fingerprint
+FP_RATE = 8000
+FP_START_SEC = 12.0        # skip the shared NPTEL intro (task2's START_TRIM)
+FP_SECONDS = 180.0         # excerpt length; a 3-minute overlap is plenty to match
+N_FFT = 512                # 64 ms frames
+HOP = 256
+PEAK_NEIGHBORHOOD = (15, 7)  # (frequency bins, frames) a peak must dominate
+PEAKS_PER_SEC = 10         # only the strongest peaks survive re-encoding and added noise
+FAN_OUT = 3
+MAX_DT = 63                # frames (~2s) between paired peaks
+AUDIO_THRESHOLD = 0.10     # share of hashes agreeing on one offset (+-1 frame)
+
+# Transcript MinHash / LSH
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+LSH_BANDS = 32             # 32 bands x 4 rows: candidates from ~0.42 Jaccard upwards
+TEXT_THRESHOLD = 0.80      # estimated Jaccard to call transcripts duplicates
+SEED = 42
+
+# ---------------------------
+# AUDIO FINGERPRINTS
+# ---------------------------
+def _stft_magnitude_db(audio: np.ndarray) -> np.ndarray:
+    """(frames, bins) log-magnitude spectrogram with a Hann window."""
+    if audio.size < N_FFT:
+        audio = np.pad(audio, (0, N_FFT - audio.size))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, N_FFT)[::HOP]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(N_FFT).astype(np.float32), axis=1))
+    return 20 * np.log10(spectrum + 1e-6)
+
+def _local_max_mask(spec: np.ndarray) -> np.ndarray:
+    """True where a cell is the maximum of its PEAK_NEIGHBORHOOD (a separable max filter)."""
+    freq_size, time_size = PEAK_NEIGHBORHOOD
+    padded = np.pad(spec, ((0, 0), (freq_size // 2, freq_size // 2)), constant_values=-np.inf)
+    maxed = np.lib.stride_tricks.sliding_window_view(padded, freq_size, axis=1).max(axis=2)
+    padded = np.pad(maxed, ((time_size // 2, time_size // 2), (0, 0)), constant_values=-np.inf)
+    maxed = np.lib.stride_tricks.sliding_window_view(padded, time_size, axis=0).max(axis=2)
+    return spec == maxed
+
+def audio_fingerprint(audio: np.ndarray) -> list:
+    """Returns [(hash, frame)] landmark pairs for an 8 kHz mono signal."""
+    spec = _stft_magnitude_db(audio)
+    frames, bins = np.nonzero(_local_max_mask(spec))
+    strength = spec[frames, bins]
+
+    # Keep the PEAKS_PER_SEC strongest peaks in every second of audio.
+    frames_per_sec = FP_RATE // HOP
+    block = frames // frames_per_sec
+    order = np.lexsort((-strength, block))
+    block_sorted = block[order]
+    first_in_block = np.searchsorted(block_sorted, block_sorted, side="left")
+    keep = order[np.arange(order.size) - first_in_block < PEAKS_PER_SEC]
+    keep = keep[np.lexsort((bins[keep], frames[keep]))]
+    frames, bins = frames[keep].astype(np.int64), bins[keep].astype(np.int64)
+
+    # Pair each peak with the next FAN_OUT peaks in time.
+    hashes, anchors = [], []
+    for k in range(1, FAN_OUT + 1):
+        dt = frames[k:] - frames[:-k]
+        valid = (dt > 0) & (dt <= MAX_DT)
+        # 9 bits per frequency bin (257 bins at N_FFT=512) + 6 bits for dt.
+        hashes.append(((bins[:-k] << 15) | (bins[k:] << 6) | dt)[valid])
+        anchors.append(frames[:-k][valid])
+    if not hashes:
+        return []
+    return list(zip(np.concatenate(hashes).tolist(), np.concatenate(anchors).tolist()))
+
+def fingerprint_file(audio_path: str) -> list:
+    """Fingerprints the FP_SECONDS excerpt after FP_START_SEC (or the whole file if shorter)."""
+    length = audio_engine.duration(audio_path)
+    start = FP_START_SEC if length > FP_START_SEC + 30.0 else 0.0
+    audio, rate = audio_engine.decode(audio_path, start, min(length, start + FP_SECONDS))
+    return audio_fingerprint(audio_engine.resample_poly(audio, rate, FP_RATE))
+
+# ---------------------------
+# TRANSCRIPT MINHASH
+# ---------------------------
+_rng = np.random.default_rng(SEED)
+# Multiply-shift hashing over uint64 (wrapping): h(x) = (a*x + b) >> 32, a odd.
+_PERM_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+
+def minhash_signature(text: str) -> np.ndarray:
+    """NUM_PERM uint32 minima over the normalized text's word shingles."""
+    words = normalize_text(text).split()
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    values = np.array([int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles],
+                      dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        hashed = (values[None, :] * _PERM_A[:, None] + _PERM_B[:, None]) >> np.uint64(32)
+    return hashed.min(axis=1).astype(np.uint32)
+
+def lsh_buckets(signature: np.ndarray) -> list:
+    rows = NUM_PERM // LSH_BANDS
+    return [hashlib.blake2b(signature[b * rows:(b + 1) * rows].tobytes(), digest_size=8).digest() for b in range(LSH_BANDS)]
+
+# ---------------------------
+# INDEX
+# ---------------------------
+class DedupIndex:
+    """
+    SQLite index of lecture fingerprints:
+
+        lectures:     id, name, audio stamp, transcript stamp
+        audio_hashes: hash -> (lecture, frame), indexed on hash
+        text_sigs:    lecture -> MinHash signature
+        text_lsh:     (band, bucket) -> lecture, indexed on (band, bucket)
+
+    Lecture ids follow indexing order, so "duplicate of" always points at
+    the earlier lecture and reruns give the same answer.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS lectures (id INTEGER PRIMARY KEY, name TEXT UNIQUE, audio_stamp TEXT, text_stamp TEXT);
+            CREATE TABLE IF NOT EXISTS audio_hashes (hash INTEGER, lecture INTEGER, frame INTEGER);
+            CREATE INDEX IF NOT EXISTS audio_hash_idx ON audio_hashes (hash);
+            CREATE TABLE IF NOT EXISTS text_sigs (lecture INTEGER PRIMARY KEY, sig BLOB);
+            CREATE TABLE IF NOT EXISTS text_lsh (band INTEGER, bucket BLOB, lecture INTEGER);
+            CREATE INDEX IF NOT EXISTS text_lsh_idx ON text_lsh (band, bucket);
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _stamp(path: str) -> str:
+        st = os.stat(path)
+        return f"{st.st_size}:{st.st_mtime_ns}"
+
+    def _lecture_id(self, name: str) -> int:
+        row = self.conn.execute("SELECT id FROM lectures WHERE name = ?", (name,)).fetchone()
+        if row:
+            return row[0]
+        return self.conn.execute("INSERT INTO lectures (name) VALUES (?)", (name,)).lastrowid
+
+    def _names(self) -> dict:
+        return dict(self.conn.execute("SELECT id, name FROM lectures"))
+
+    # --- audio ---
+    def add_audio(self, name: str, audio_path: str):
+        """Fingerprints and stores a lecture's audio, unless it is unchanged since last time."""
+        lecture = self._lecture_id(name)
+        stamp = self._stamp(audio_path)
+        if self.conn.execute("SELECT audio_stamp FROM lectures WHERE id = ?", (lecture,)).fetchone()[0] == stamp:
+            return
+        landmarks = fingerprint_file(audio_path)
+        self.conn.execute("DELETE FROM audio_hashes WHERE lecture = ?", (lecture,))
+        self.conn.executemany("INSERT INTO audio_hashes VALUES (?, ?, ?)", [(h, lecture, t) for h, t in landmarks])
+        self.conn.execute("UPDATE lectures SET audio_stamp = ? WHERE id = ?", (stamp, lecture))
+        self.conn.commit()
+
+    def match_audio(self, name: str):
+        """Best earlier lecture sharing time-consistent hashes: (name, score) or None."""
+        lecture = self._lecture_id(name)
+        own = self.conn.execute("SELECT hash, frame FROM audio_hashes WHERE lecture = ?", (lecture,)).fetchall()
+        if not own:
+            return None
+        frames_by_hash = {}
+        for h, t in own:
+            frames_by_hash.setdefault(h, []).append(t)
+
+        offsets = Counter()
+        hashes = list(frames_by_hash)
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT hash, lecture, frame FROM audio_hashes WHERE hash IN ({','.join('?' * len(batch))}) AND lecture < ?",
+                (*batch, lecture))
+            for h, other, t_other in rows:
+                for t in frames_by_hash[h]:
+                    offsets[(other, t_other - t)] += 1
+        if not offsets:
+            return None
+        # Frame boundaries rarely line up between two encodings, so a true
+        # match spreads over neighbouring offsets.
+        (other, offset), _ = max(
+            ((key, offsets[key] + offsets[(key[0], key[1] - 1)] + offsets[(key[0], key[1] + 1)]) for key in list(offsets)),
+            key=lambda item: item[1])
+        count = offsets[(other, offset)] + offsets[(other, offset - 1)] + offsets[(other, offset + 1)]
+        return self._names()[other], count / len(own)
+
+    # --- transcripts ---
+    def add_text(self, name: str, text_path: str, text: str):
+        lecture = self._lecture_id(name)
+        stamp = self._stamp(text_path)
+        if self.conn.execute("SELECT text_stamp FROM lectures WHERE id = ?", (lecture,)).fetchone()[0] == stamp:
+            return
+        signature = minhash_signature(text)
+        self.conn.execute("DELETE FROM text_lsh WHERE lecture = ?", (lecture,))
+        self.conn.execute("INSERT OR REPLACE INTO text_sigs VALUES (?, ?)", (lecture, signature.tobytes()))
+        self.conn.executemany("INSERT INTO text_lsh VALUES (?, ?, ?)",
+                              [(band, bucket, lecture) for band, bucket in enumerate(lsh_buckets(signature))])
+        self.conn.execute("UPDATE lectures SET text_stamp = ? WHERE id = ?", (stamp, lecture))
+        self.conn.commit()
+
+    def match_text(self, name: str):
+        """Best earlier lecture among the LSH candidates: (name, estimated Jaccard) or None."""
+        lecture = self._lecture_id(name)
+        row = self.conn.execute("SELECT sig FROM text_sigs WHERE lecture = ?", (lecture,)).fetchone()
+        if row is None:
+            return None
+        signature = np.frombuffer(row[0], dtype=np.uint32)
+        candidates = set()
+        for band, bucket in enumerate(lsh_buckets(signature)):
+            candidates.update(other for (other,) in self.conn.execute(
+                "SELECT lecture FROM text_lsh WHERE band = ? AND bucket = ? AND lecture < ?", (band, bucket, lecture)))
+        best = None
+        for other in candidates:
+            other_sig = np.frombuffer(self.conn.execute("SELECT sig FROM text_sigs WHERE lecture = ?", (other,)).fetchone()[0], dtype=np.uint32)
+            score = float(np.mean(signature == other_sig))
+            if best is None or score > best[1]:
+                best = (other, score)
+        return (self._names()[best[0]], best[1]) if best else None
+
+    def check(self, name: str, audio_path: str = None, text_path: str = None, text: str = None) -> dict:
+        """
+        Indexes whatever is given for one lecture and returns
+        {"duplicate_of", "audio_score", "text_score"} if it duplicates an
+        earlier lecture, else None.
+        """
+        flags = {}
+        if audio_path:
+            self.add_audio(name, audio_path)
+            match = self.match_audio(name)
+            if match and match[1] >= AUDIO_THRESHOLD:
+                flags["duplicate_of"], flags["audio_score"] = match[0], round(match[1], 3)
+        if text_path and text is not None:
+            self.add_text(name, text_path, text)
+            match = self.match_text(name)
+            if match and match[1] >= TEXT_THRESHOLD:
+                flags.setdefault("duplicate_of", match[0])
+                flags["text_score"] = round(match[1], 3)
+        return flags or None
+
+# ---------------------------
+# DUPLICATES FILE
+# ---------------------------
+def load_duplicates(path: str = DUPLICATES_FILE) -> dict:
+    """{core name: flags} for lectures flagged as duplicates; empty when never run."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_duplicates(duplicates: dict, path: str = DUPLICATES_FILE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(duplicates, f, indent=1, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def scan(audio_dir: str, pdf_dir: str, index_path: str = INDEX_PATH, duplicates_path: str = DUPLICATES_FILE,
+         pdf_backend: str = "auto") -> dict:
+    """
+    Indexes every lecture in the raw audio/PDF directories (only new or
+    changed files are fingerprinted) and rewrites the duplicates file.
+    """
+    from pdf_text_cache import extract_pdf_text
+
+    audio_exts = (".mp3", ".wav", ".m4a", ".opus", ".flac")
+    audio_map = {os.path.splitext(f)[0]: os.path.join(audio_dir, f) for f in os.listdir(audio_dir) if f.lower().endswith(audio_exts)}
+    pdf_map = {os.path.splitext(f)[0]: os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf")} if os.path.isdir(pdf_dir) else {}
+
+    index = DedupIndex(index_path)
+    duplicates = {}
+    try:
+        for name in tqdm(sorted(set(audio_map) | set(pdf_map)), desc="Fingerprinting"):
+            try:
+                text = extract_pdf_text(pdf_map[name], pdf_backend) if name in pdf_map else None
+                flags = index.check(name, audio_map.get(name), pdf_map.get(name), text)
+            except Exception as e:
+                print(f"\n[WARNING] Could not fingerprint '{name}': {e}")
+                continue
+            if flags:
+                duplicates[name] = flags
+    finally:
+        index.close()
+
+    save_duplicates(duplicates, duplicates_path)
+    return duplicates
+
+# ---------------------------
+# MAIN
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flag near-duplicate lectures (audio fingerprints + transcript MinHash) before processing.")
+    parser.add_argument("--audio_dir", default="nptel_data/audio", help="Directory with the downloaded audio.")
+    parser.add_argument("--pdf_dir", default="nptel_data/transcripts", help="Directory with the downloaded PDF transcripts.")
+    parser.add_argument("--index", default=INDEX_PATH, help="SQLite fingerprint index.")
+    parser.add_argument("--output", default=DUPLICATES_FILE, help="Where the flagged duplicates are written.")
+    parser.add_argument("--pdf_backend", choices=["auto", "pypdfium2", "pdftotext", "pdfplumber"], default="auto",
+                        help="PDF text extraction backend (results are shared with task3's PDF cache).")
+    args = parser.parse_args()
+
+    duplicates = scan(args.audio_dir, args.pdf_dir, args.index, args.output, args.pdf_backend)
+    for name, flags in sorted(duplicates.items()):
+        scores = ", ".join(f"{k}={v}" for k, v in flags.items() if k != "duplicate_of")
+        print(f"[DUPLICATE] {name} -> {flags['duplicate_of']} ({scores})")
+    print(f"\n[DONE] {len(duplicates)} duplicates flagged in {args.output}")
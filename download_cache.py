@@ -0,0 +1,146 @@
+# download_cache.py
+# Sidecar index for task1.py downloads, keyed by YouTube video ID and Google Drive file ID.
+
+import os
+import json
+import hashlib
+import threading
+from urllib.parse import urlparse, parse_qs
+
+INDEX_VERSION = 1
+
+# ---------------------------
+# HELPERS
+# ---------------------------
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Streams a file through sha256 and returns the hex digest."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def parse_youtube_url(url):
+    """
+    Returns ("playlist", id), ("video", id) or (None, None) for a YouTube URL,
+    without touching the network. A watch URL carrying a 'list' parameter is
+    treated as a playlist, matching yt-dlp's default behaviour.
+    """
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    query = parse_qs(parsed.query)
+
+    if "list" in query:
+        return "playlist", query["list"][0]
+    if host.endswith("youtu.be"):
+        video_id = parsed.path.strip("/").split("/")[0]
+        return ("video", video_id) if video_id else (None, None)
+    if "youtube.com" in host:
+        if "v" in query:
+            return "video", query["v"][0]
+        parts = [p for p in parsed.path.split("/") if p]
+        if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+            return "video", parts[1]
+    return None, None
+
+# ---------------------------
+# INDEX
+# ---------------------------
+class DownloadIndex:
+    """
+    JSON index of everything task1.py has fetched:
+
+        videos:      video_id -> {title, source_url, path, size, mtime, sha256}
+        transcripts: drive_id -> {title, source_url, path, size, mtime, sha256, etag}
+        playlists:   playlist_id -> [video_id, ...]
+
+    An item is a cache hit when its file still exists with the recorded size
+    and mtime, so repeated runs skip it without any network I/O. A file with
+    the recorded size but a new mtime is confirmed by its sha256.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"version": INDEX_VERSION, "videos": {}, "transcripts": {}, "playlists": {}}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if loaded.get("version") == INDEX_VERSION:
+                    self.data.update(loaded)
+            except (OSError, ValueError) as e:
+                print(f"[WARNING] Ignoring unreadable download index '{path}': {e}")
+
+    def save(self):
+        """Writes the index atomically through a temp file."""
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _is_valid(record):
+        if record is None or not os.path.exists(record["path"]):
+            return False
+        st = os.stat(record["path"])
+        if st.st_size != record["size"]:
+            return False
+        # Records written before mtimes were kept have none and are hashed once.
+        if record.get("mtime") == st.st_mtime:
+            return True
+        if file_sha256(record["path"]) != record["sha256"]:
+            return False
+        record["mtime"] = st.st_mtime
+        return True
+
+    def _record(self, section, key, path, **fields):
+        st = os.stat(path)
+        record = {"path": path, "size": st.st_size, "mtime": st.st_mtime, "sha256": file_sha256(path), **fields}
+        with self._lock:
+            self.data[section][key] = record
+        return record
+
+    # --- videos ---
+    def get_video(self, video_id):
+        """Returns the video record if its audio file is still on disk, else None."""
+        record = self.data["videos"].get(video_id)
+        return record if self._is_valid(record) else None
+
+    def add_video(self, video_id, title, source_url, path):
+        return self._record("videos", video_id, path, title=title, source_url=source_url)
+
+    # --- transcripts ---
+    def get_transcript(self, drive_id):
+        """Returns the transcript record if its PDF is still on disk, else None."""
+        record = self.data["transcripts"].get(drive_id)
+        return record if self._is_valid(record) else None
+
+    def add_transcript(self, drive_id, title, source_url, path, etag=None):
+        return self._record("transcripts", drive_id, path, title=title, source_url=source_url, etag=etag)
+
+    # --- playlists ---
+    def add_playlist(self, playlist_id, video_ids):
+        with self._lock:
+            self.data["playlists"][playlist_id] = list(video_ids)
+
+    def resolve_url(self, url):
+        """
+        Returns the cached video records for a URL, in playlist order, when
+        every one of them is still on disk. Returns None on any miss.
+        """
+        kind, key = parse_youtube_url(url)
+        if kind == "video":
+            video_ids = [key]
+        elif kind == "playlist" and key in self.data["playlists"]:
+            video_ids = self.data["playlists"][key]
+        else:
+            return None
+
+        records = [self.get_video(video_id) for video_id in video_ids]
+        return records if all(records) else None
+
+    def title_map(self):
+        """Rebuilds the clean_filename title -> video ID mapping without extract_info."""
+        return {record["title"]: video_id for video_id, record in self.data["videos"].items()}
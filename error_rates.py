@@ -0,0 +1,156 @@
+# error_rates.py
+# Per-utterance WER/CER with exact substitution/deletion/insertion counts.
+#
+# Edit operations come from rapidfuzz's C implementation (a pure-Python alignment
+# is quadratic per utterance, far too slow at character level for whole lectures).
+# Utterances are spread over a process pool, and results are cached on disk by
+# (reference, hypothesis) hash.
+
+import os
+import sqlite3
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from rapidfuzz.distance import Levenshtein
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+DEFAULT_CACHE_PATH = "nptel_data/.error_rate_cache.sqlite"
+POOL_CHUNK_SIZE = 64   # utterances per task sent to a worker
+MIN_PARALLEL = 256     # below this many uncached pairs, the pool costs more than it saves
+
+# Per-utterance counts, in this order, for words then characters.
+COUNT_FIELDS = ["w_sub", "w_del", "w_ins", "w_hit", "c_sub", "c_del", "c_ins", "c_hit"]
+
+# ---------------------------
+# EDIT OPERATIONS
+# ---------------------------
+def edit_counts(ref, hyp):
+    """Returns (substitutions, deletions, insertions, hits) to turn ref into hyp."""
+    s = d = ins = 0
+    for tag, _, _ in Levenshtein.editops(ref, hyp).as_list():
+        if tag == "replace":
+            s += 1
+        elif tag == "delete":
+            d += 1
+        else:
+            ins += 1
+    return s, d, ins, len(ref) - s - d
+
+def utterance_counts(pair):
+    """Word- and character-level counts for one (reference, hypothesis) pair."""
+    reference, hypothesis = pair
+    # Same tokenization as jiwer's defaults: whitespace words, and characters of
+    # the whitespace-collapsed string.
+    ref_chars = " ".join(reference.split())
+    hyp_chars = " ".join(hypothesis.split())
+    return edit_counts(reference.split(), hypothesis.split()) + edit_counts(ref_chars, hyp_chars)
+
+def _utterance_counts_batch(pairs):
+    return [utterance_counts(pair) for pair in pairs]
+
+# ---------------------------
+# CACHE
+# ---------------------------
+def pair_key(reference: str, hypothesis: str) -> bytes:
+    return hashlib.sha1(reference.encode("utf-8") + b"\0" + hypothesis.encode("utf-8")).digest()
+
+class ErrorRateCache:
+    """SQLite store of per-utterance counts keyed by the (reference, hypothesis) hash."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        columns = ", ".join(f"{field} INTEGER" for field in COUNT_FIELDS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS counts (key BLOB PRIMARY KEY, {columns})")
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for row in self.conn.execute(f"SELECT key, {', '.join(COUNT_FIELDS)} FROM counts WHERE key IN ({placeholders})", batch):
+                found[row[0]] = tuple(row[1:])
+        return found
+
+    def put_many(self, items):
+        placeholders = ",".join("?" * (len(COUNT_FIELDS) + 1))
+        self.conn.executemany(f"INSERT OR REPLACE INTO counts VALUES ({placeholders})", [(key, *counts) for key, counts in items])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+# ---------------------------
+# ENGINE
+# ---------------------------
+def compute_counts(references, hypotheses, workers: int = None, cache: ErrorRateCache = None):
+    """
+    Returns one COUNT_FIELDS tuple per utterance. Cached pairs are looked up
+    first, and only the misses are computed, on a process pool when there
+    are enough of them.
+    """
+    pairs = list(zip(references, hypotheses))
+    keys = [pair_key(r, h) for r, h in pairs]
+    known = cache.get_many(set(keys)) if cache is not None else {}
+
+    missing = list({key: pair for key, pair in zip(keys, pairs) if key not in known}.items())
+    if missing:
+        todo = [pair for _, pair in missing]
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(todo) >= MIN_PARALLEL:
+            chunks = [todo[i:i + POOL_CHUNK_SIZE] for i in range(0, len(todo), POOL_CHUNK_SIZE)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = [counts for chunk in pool.map(_utterance_counts_batch, chunks) for counts in chunk]
+        else:
+            results = _utterance_counts_batch(todo)
+        computed = {key: counts for (key, _), counts in zip(missing, results)}
+        if cache is not None:
+            cache.put_many(computed.items())
+        known.update(computed)
+
+    return [known[key] for key in keys]
+
+class ErrorTotals:
+    """
+    Corpus-level accumulator over per-utterance counts. Totals are summed
+    over operations, not averaged over utterances, so the rates are exact
+    regardless of how the corpus is chunked.
+    """
+
+    def __init__(self):
+        self.totals = dict.fromkeys(COUNT_FIELDS, 0)
+        self.word_accuracy_sum = 0.0
+        self.num_scored = 0
+
+    def add(self, counts):
+        for field, value in zip(COUNT_FIELDS, counts):
+            self.totals[field] += value
+        w_sub, w_del, w_ins, w_hit = counts[:4]
+        ref_words = w_sub + w_del + w_hit
+        if ref_words:
+            self.word_accuracy_sum += 1.0 - (w_sub + w_del + w_ins) / ref_words
+            self.num_scored += 1
+
+    def add_many(self, counts_list):
+        for counts in counts_list:
+            self.add(counts)
+
+    def summary(self) -> dict:
+        """WER, CER, word match rate (hits / reference words) and mean per-utterance word accuracy, in %."""
+        t = self.totals
+        ref_words = t["w_sub"] + t["w_del"] + t["w_hit"]
+        ref_chars = t["c_sub"] + t["c_del"] + t["c_hit"]
+        return {
+            "wer": 100.0 * (t["w_sub"] + t["w_del"] + t["w_ins"]) / ref_words if ref_words else 0.0,
+            "cer": 100.0 * (t["c_sub"] + t["c_del"] + t["c_ins"]) / ref_chars if ref_chars else 0.0,
+            "wmr": 100.0 * t["w_hit"] / ref_words if ref_words else 0.0,
+            "mwa": 100.0 * self.word_accuracy_sum / self.num_scored if self.num_scored else 0.0,
+            "substitutions": t["w_sub"],
+            "deletions": t["w_del"],
+            "insertions": t["w_ins"],
+        }
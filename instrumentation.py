@@ -0,0 +1,231 @@
+# instrumentation.py
+# Shared per-item metrics for every task script.
+#
+# Wrap a unit of work in `measure(stage, item)` and one JSON line is appended to the
+# metrics log when it finishes. Each line records wall and CPU time, the audio seconds
+# handled (so throughput shows up as audio-seconds-per-second), bytes read and written,
+# and peak RSS. Nested measures name sub-steps ("process_audio.ffprobe") so a slow
+# stage can be broken down. Settings come from environment variables, so multiprocessing
+# workers inherit them:
+#
+#   NPTEL_METRICS_LOG   metrics JSONL path (default nptel_data/metrics.jsonl; "" disables)
+#   NPTEL_PROFILE_DIR   if set, every measured item is also run under cProfile and its
+#                       stats dumped to <dir>/<stage>-<item>.prof
+#   NPTEL_PYSPY_OUT     if set (and py-spy is on PATH), the first measured item starts a
+#                       `py-spy record` of this process (and subprocesses) into that file
+#   NPTEL_RUN_ID        groups the records of one run; set on first import and inherited
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import cProfile
+import argparse
+import threading
+import subprocess
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, so RSS and child CPU are recorded as None
+    resource = None
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+DEFAULT_METRICS_LOG = "nptel_data/metrics.jsonl"
+
+os.environ.setdefault("NPTEL_RUN_ID", time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}")
+
+_write_lock = threading.Lock()
+_py_spy = None
+# Only one cProfile profiler can be active per thread, so nested measures don't profile.
+_profiling = threading.local()
+
+def metrics_log_path() -> str:
+    return os.environ.get("NPTEL_METRICS_LOG", DEFAULT_METRICS_LOG)
+
+def _total_size(paths) -> int:
+    return sum(os.path.getsize(p) for p in paths or [] if p and os.path.exists(p))
+
+def _rusage_children():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def peak_rss_mb(children: bool = False):
+    """Peak RSS in MB of this process (or of its waited-for children); None without getrusage."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in KiB on Linux.
+    return round(usage.ru_maxrss / (2**20 if sys.platform == "darwin" else 1024), 1)
+
+def _start_py_spy():
+    """Attaches py-spy to this process once, if requested and available."""
+    global _py_spy
+    output = os.environ.get("NPTEL_PYSPY_OUT")
+    if _py_spy is not None or not output or shutil.which("py-spy") is None:
+        return
+    _py_spy = subprocess.Popen(
+        ["py-spy", "record", "--pid", str(os.getpid()), "--subprocesses", "-o", output],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+def write_record(record: dict, log_path: str = None):
+    """Appends one metrics record; a single write per line keeps concurrent writers whole."""
+    log_path = metrics_log_path() if log_path is None else log_path
+    if not log_path:
+        return
+    directory = os.path.dirname(log_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _write_lock:
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+# ---------------------------
+# MEASUREMENT
+# ---------------------------
+@contextmanager
+def measure(stage: str, item: str = None, inputs=None, outputs=None, audio_seconds: float = None):
+    """
+    Times the enclosed block and logs it as one record.
+
+    inputs/outputs are file paths whose sizes count as bytes read/written
+    (outputs are sized after the block). The yielded dict can be updated
+    inside the block, e.g. record["audio_seconds"] = duration once known,
+    or record["status"] = "error" for a failure the block handles itself.
+
+    cpu_sec is this thread's CPU time; child_cpu_sec is CPU used by
+    subprocesses (ffmpeg/ffprobe) that finished during the block, which
+    under a thread pool may include other items' subprocesses.
+    """
+    _start_py_spy()
+    record = {"stage": stage, "item": item, "audio_seconds": audio_seconds}
+    profile_dir = os.environ.get("NPTEL_PROFILE_DIR")
+    profiler = cProfile.Profile() if profile_dir and not getattr(_profiling, "active", False) else None
+
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    child_start = _rusage_children()
+    bytes_read = _total_size(inputs)
+    status = "ok"
+    if profiler is not None:
+        _profiling.active = True
+        profiler.enable()
+    try:
+        yield record
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _profiling.active = False
+        wall = time.perf_counter() - wall_start
+        audio = record.get("audio_seconds")
+        record.update({
+            "run": os.environ["NPTEL_RUN_ID"],
+            "pid": os.getpid(),
+            "time": time.time(),
+            # The block may mark its own outcome (e.g. an error it caught and reported).
+            "status": status if status == "error" else record.get("status", "ok"),
+            "wall_sec": round(wall, 6),
+            "cpu_sec": round(time.thread_time() - cpu_start, 6),
+            "child_cpu_sec": round(_rusage_children() - child_start, 6) if child_start is not None else None,
+            "audio_sec_per_sec": round(audio / wall, 3) if audio and wall > 0 else None,
+            "bytes_read": bytes_read + record.get("bytes_read", 0),
+            "bytes_written": _total_size(outputs) + record.get("bytes_written", 0),
+            "peak_rss_mb": peak_rss_mb(),
+            "child_peak_rss_mb": peak_rss_mb(children=True),
+        })
+        if profiler is not None:
+            os.makedirs(profile_dir, exist_ok=True)
+            safe_item = re.sub(r"[^\w.-]+", "_", str(item or "all"))
+            profiler.dump_stats(os.path.join(profile_dir, f"{stage}-{safe_item}.prof"))
+        try:
+            write_record(record)
+        except OSError as e:
+            print(f"[WARNING] Could not write metrics record: {e}")
+
+# ---------------------------
+# READING AND SUMMARIES
+# ---------------------------
+def load_records(log_path: str = None, run: str = None) -> list:
+    """Reads the metrics log, optionally only one run (use run="latest" for the newest)."""
+    log_path = metrics_log_path() if log_path is None else log_path
+    if not log_path or not os.path.exists(log_path):
+        return []
+    records = []
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+    if run == "latest" and records:
+        run = max(records, key=lambda r: r["time"])["run"]
+    if run is not None:
+        records = [r for r in records if r["run"] == run]
+    return records
+
+def list_runs(records) -> list:
+    """Run IDs, newest first."""
+    last_seen = {}
+    for r in records:
+        last_seen[r["run"]] = max(last_seen.get(r["run"], 0.0), r["time"])
+    return sorted(last_seen, key=last_seen.get, reverse=True)
+
+def summarize(records) -> list:
+    """One row per stage: counts, total/mean/p95 wall time, CPU, throughput, bytes and peak RSS."""
+    by_stage = {}
+    for r in records:
+        by_stage.setdefault(r["stage"], []).append(r)
+
+    rows = []
+    for stage, items in by_stage.items():
+        walls = sorted(r["wall_sec"] for r in items)
+        wall_total = sum(walls)
+        audio_total = sum(r["audio_seconds"] or 0.0 for r in items)
+        rows.append({
+            "stage": stage,
+            "items": len(items),
+            "errors": sum(1 for r in items if r["status"] == "error"),
+            "wall_sec": round(wall_total, 3),
+            "mean_sec": round(wall_total / len(items), 3),
+            "p95_sec": round(walls[min(len(walls) - 1, int(0.95 * len(walls)))], 3),
+            "cpu_sec": round(sum(r["cpu_sec"] + (r["child_cpu_sec"] or 0.0) for r in items), 3),
+            "audio_sec": round(audio_total, 1),
+            "audio_sec_per_sec": round(audio_total / wall_total, 2) if audio_total and wall_total else None,
+            "mb_read": round(sum(r["bytes_read"] for r in items) / 2**20, 1),
+            "mb_written": round(sum(r["bytes_written"] for r in items) / 2**20, 1),
+            "peak_rss_mb": max((r["peak_rss_mb"] for r in items if r["peak_rss_mb"] is not None), default=None),
+        })
+    rows.sort(key=lambda row: row["wall_sec"], reverse=True)
+    return rows
+
+# ---------------------------
+# MAIN
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the per-stage metrics log written by the task scripts.")
+    parser.add_argument("--log", default=None, help=f"Metrics JSONL (default: $NPTEL_METRICS_LOG or {DEFAULT_METRICS_LOG}).")
+    parser.add_argument("--run", default="latest", help="Run ID to summarize, 'latest', or 'all'.")
+    args = parser.parse_args()
+
+    records = load_records(args.log, None if args.run == "all" else args.run)
+    if not records:
+        print("[INFO] No metrics recorded yet.")
+        raise SystemExit(0)
+
+    columns = ["stage", "items", "errors", "wall_sec", "mean_sec", "p95_sec", "cpu_sec", "audio_sec_per_sec", "mb_read", "mb_written", "peak_rss_mb"]
+    rows = summarize(records)
+    widths = {c: max(len(c), *(len(str(row[c])) for row in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
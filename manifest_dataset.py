@@ -0,0 +1,296 @@
+# manifest_dataset.py
+# Streaming training reader for the Task 4 manifest.
+#
+# The manifest (and, if given, the segment offsets from task2_segment_audio.py) is
+# scanned once for metadata only: paths, offsets, durations and the byte position of
+# each manifest line. Audio is sliced per utterance with sf.read(start, stop), so a
+# 20 s segment never loads its hour-long lecture, and transcripts are re-read from
+# their manifest line when the batch is built.
+#
+# BucketBatchSampler groups utterances of similar length under a budget of padded
+# seconds per batch (batch size x longest item), so batches hold many short clips or
+# a few long ones and little of each batch is padding. iter_batches() decodes the next
+# few batches on a background thread while the training step runs; libsndfile releases
+# the GIL while reading, so the decode overlaps with the step.
+
+import os
+import json
+import time
+import queue
+import random
+import argparse
+import threading
+
+import numpy as np
+import soundfile as sf
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+MANIFEST_FILE = "nptel_data/train_manifest.jsonl"
+SAMPLE_RATE = 16000
+MAX_BATCH_SECONDS = 320.0   # padded seconds per batch
+BUCKET_WIDTH = 1.0          # seconds of duration per bucket
+PREFETCH_BATCHES = 4
+
+# ---------------------------
+# ENTRIES
+# ---------------------------
+def _load_segments(segments_path: str) -> dict:
+    """{absolute audio path: [(offset, duration), ...]} from a segments JSONL."""
+    segments_dir = os.path.dirname(os.path.abspath(segments_path))
+    segments = {}
+    with open(segments_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            path = os.path.normpath(os.path.join(segments_dir, record["audio_filepath"]))
+            segments.setdefault(path, []).append((float(record["offset"]), float(record["duration"])))
+    return segments
+
+def iter_entries(manifest_path: str = MANIFEST_FILE, segments_path: str = None):
+    """
+    Yields one metadata dict per utterance: audio_filepath (as in the manifest),
+    path (absolute), offset, duration and line_offset, the byte position of the
+    manifest line holding its text (None when the utterance has no transcript).
+
+    Lectures that appear in segments_path are replaced by their segments. The
+    segmenter doesn't align text, so segments carry no transcript.
+    """
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    segments = _load_segments(segments_path) if segments_path else {}
+    with open(manifest_path, "rb") as f:
+        while True:
+            line_offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            path = os.path.normpath(os.path.join(manifest_dir, entry["audio_filepath"]))
+            if path in segments:
+                for offset, duration in segments[path]:
+                    yield {"audio_filepath": entry["audio_filepath"], "path": path, "offset": offset,
+                           "duration": duration, "line_offset": None}
+                continue
+            yield {"audio_filepath": entry["audio_filepath"], "path": path, "offset": float(entry.get("offset", 0.0)),
+                   "duration": float(entry["duration"]), "line_offset": line_offset}
+
+def read_audio(entry: dict) -> np.ndarray:
+    """Reads only the utterance's samples as 16kHz mono float32."""
+    start = int(round(entry["offset"] * SAMPLE_RATE))
+    stop = start + int(round(entry["duration"] * SAMPLE_RATE))
+    audio, rate = sf.read(entry["path"], start=start, stop=stop, dtype="float32", always_2d=True)
+    if rate != SAMPLE_RATE:
+        raise ValueError(f"expected {SAMPLE_RATE} Hz audio, got {rate}")
+    return audio.mean(axis=1)
+
+def read_texts(manifest_path: str, entries) -> list:
+    """Transcripts for a batch, read back from their manifest lines."""
+    texts = []
+    with open(manifest_path, "rb") as f:
+        for entry in entries:
+            if entry["line_offset"] is None:
+                texts.append(None)
+                continue
+            f.seek(entry["line_offset"])
+            texts.append(json.loads(f.readline())["text"])
+    return texts
+
+# ---------------------------
+# SAMPLER
+# ---------------------------
+class BucketBatchSampler:
+    """
+    Yields lists of entry indices whose padded length (batch size x longest
+    duration) stays within max_batch_seconds. Indices are grouped into
+    bucket_width-second duration buckets; with shuffle, the order inside each
+    bucket and the order of the batches change every epoch (see set_epoch).
+    An utterance longer than the budget gets a batch of its own.
+
+    Has __iter__ and __len__, so it also works as a torch DataLoader batch_sampler.
+    """
+
+    def __init__(self, durations, max_batch_seconds: float = MAX_BATCH_SECONDS, bucket_width: float = BUCKET_WIDTH,
+                 shuffle: bool = True, seed: int = 0, max_batch_size: int = None):
+        self.durations = [float(d) for d in durations]
+        self.max_batch_seconds = max_batch_seconds
+        self.bucket_width = bucket_width
+        self.shuffle = shuffle
+        self.seed = seed
+        self.max_batch_size = max_batch_size
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def batches(self) -> list:
+        rng = random.Random(self.seed * 100003 + self.epoch)
+        order = list(range(len(self.durations)))
+        if self.shuffle:
+            rng.shuffle(order)
+        # A stable sort keeps the shuffled order within each bucket.
+        order.sort(key=lambda i: int(self.durations[i] // self.bucket_width))
+
+        batches, batch, longest = [], [], 0.0
+        for i in order:
+            longest_with = max(longest, self.durations[i])
+            full = self.max_batch_size is not None and len(batch) >= self.max_batch_size
+            if batch and (full or (len(batch) + 1) * longest_with > self.max_batch_seconds):
+                batches.append(batch)
+                batch, longest_with = [], self.durations[i]
+            batch.append(i)
+            longest = longest_with
+        if batch:
+            batches.append(batch)
+
+        if self.shuffle:
+            rng.shuffle(batches)
+        return batches
+
+    def __iter__(self):
+        return iter(self.batches())
+
+    def __len__(self):
+        return len(self.batches())
+
+# ---------------------------
+# PREFETCHING READER
+# ---------------------------
+def collate(audios) -> tuple:
+    """Zero-pads to the longest clip: returns ((B, T) float32 array, lengths)."""
+    lengths = np.array([a.size for a in audios], dtype=np.int64)
+    padded = np.zeros((len(audios), int(lengths.max(initial=0))), dtype=np.float32)
+    for row, audio in zip(padded, audios):
+        row[:audio.size] = audio
+    return padded, lengths
+
+def _load_batch(manifest_path: str, entries: list):
+    audios, kept = [], []
+    for entry in entries:
+        try:
+            audios.append(read_audio(entry))
+            kept.append(entry)
+        except Exception as e:
+            print(f"\n[ERROR] Could not read {os.path.basename(entry['path'])} at {entry['offset']:.2f}s: {e}")
+    if not kept:
+        return None
+    audio, lengths = collate(audios)
+    return {"audio": audio, "lengths": lengths, "texts": read_texts(manifest_path, kept), "entries": kept}
+
+def iter_batches(manifest_path: str, entries: list, sampler, prefetch: int = PREFETCH_BATCHES):
+    """
+    Yields {"audio" (B, T) float32, "lengths", "texts", "entries"} per sampler
+    batch. A background thread stays up to `prefetch` batches ahead; entries
+    that fail to read are reported and dropped from their batch.
+    """
+    ready = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def producer():
+        try:
+            for indices in sampler:
+                if stop.is_set():
+                    return
+                batch = _load_batch(manifest_path, [entries[i] for i in indices])
+                if batch is not None:
+                    put(batch)
+        except BaseException as e:
+            put(e)
+        put(done)
+
+    thread = threading.Thread(target=producer, name="manifest-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Also reached when the consumer stops early: let the producer exit.
+        stop.set()
+        thread.join()
+
+class ManifestDataset:
+    """
+    The manifest as length-bucketed, prefetched batches:
+
+        dataset = ManifestDataset("nptel_data/train_manifest.jsonl", max_batch_seconds=320)
+        for epoch in range(num_epochs):
+            dataset.set_epoch(epoch)
+            for batch in dataset:
+                ...  # batch["audio"], batch["lengths"], batch["texts"]
+
+    dataset[i] reads a single utterance and len(dataset) counts utterances, for
+    use as a map-style dataset with dataset.sampler as the batch_sampler;
+    dataset.num_batches is the number of batches per epoch.
+    """
+
+    def __init__(self, manifest_path: str = MANIFEST_FILE, segments_path: str = None,
+                 max_batch_seconds: float = MAX_BATCH_SECONDS, bucket_width: float = BUCKET_WIDTH,
+                 shuffle: bool = True, seed: int = 0, max_batch_size: int = None, prefetch: int = PREFETCH_BATCHES):
+        self.manifest_path = manifest_path
+        self.entries = list(iter_entries(manifest_path, segments_path))
+        self.sampler = BucketBatchSampler([e["duration"] for e in self.entries], max_batch_seconds, bucket_width,
+                                          shuffle, seed, max_batch_size)
+        self.prefetch = prefetch
+
+    def set_epoch(self, epoch: int):
+        self.sampler.set_epoch(epoch)
+
+    @property
+    def num_batches(self) -> int:
+        return len(self.sampler)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index: int) -> dict:
+        entry = self.entries[index]
+        return {"audio": read_audio(entry), "text": read_texts(self.manifest_path, [entry])[0], "entry": entry}
+
+    def __iter__(self):
+        return iter_batches(self.manifest_path, self.entries, self.sampler, self.prefetch)
+
+# ---------------------------
+# MAIN
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read one epoch of length-bucketed batches and report padding and throughput.")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="Path of the JSONL manifest from Task 4.")
+    parser.add_argument("--segments", default=None, help="Optional segments JSONL from task2_segment_audio.py.")
+    parser.add_argument("--max_batch_seconds", type=float, default=MAX_BATCH_SECONDS, help="Padded seconds per batch.")
+    parser.add_argument("--bucket_width", type=float, default=BUCKET_WIDTH, help="Seconds of duration per bucket.")
+    parser.add_argument("--max_batch_size", type=int, default=None, help="Optional cap on utterances per batch.")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH_BATCHES, help="Batches decoded ahead of the consumer.")
+    args = parser.parse_args()
+
+    dataset = ManifestDataset(args.manifest, args.segments, args.max_batch_seconds, args.bucket_width,
+                              max_batch_size=args.max_batch_size, prefetch=args.prefetch)
+    print(f"[INFO] {len(dataset)} utterances in {dataset.num_batches} batches.")
+
+    num_batches = audio_seconds = padded_seconds = 0
+    start = time.perf_counter()
+    for batch in dataset:
+        num_batches += 1
+        audio_seconds += batch["lengths"].sum() / SAMPLE_RATE
+        padded_seconds += batch["audio"].size / SAMPLE_RATE
+    elapsed = time.perf_counter() - start
+
+    if num_batches:
+        print(f"[DONE] Read {num_batches} batches ({audio_seconds / 3600:.2f} hours) in {elapsed:.1f}s, "
+              f"{audio_seconds / elapsed:.0f} audio-sec/s, {100 * (1 - audio_seconds / padded_seconds):.1f}% padding.")
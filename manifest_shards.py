@@ -0,0 +1,259 @@
+# manifest_shards.py
+# Sharded binary alternative to train_manifest.jsonl.
+#
+# Layout of a shard directory:
+#   index.json          - sidecar offset index: rows per shard and their first global row
+#   shard-00000.arrow   - Arrow IPC file: audio_filepath, duration, num_words, num_chars,
+#                         text_offset, text_length
+#   shard-00000.text    - UTF-8 blob of the transcripts, addressed by (text_offset, text_length)
+#   shard-00000.stats.json / stats.json - per-shard and merged manifest_stats
+#
+# Arrow IPC files are memory-mapped on read, so the duration/length columns can be
+# scanned without parsing any text, and entry k is read in O(1).
+
+import os
+import json
+import mmap
+import bisect
+
+from manifest_stats import ManifestStats
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+INDEX_FILE = "index.json"
+STATS_FILE = "stats.json"
+ROWS_PER_SHARD = 10000
+FORMAT_VERSION = 1
+
+SCHEMA_FIELDS = [
+    ("audio_filepath", "string"),
+    ("duration", "float64"),
+    ("num_words", "int64"),
+    ("num_chars", "int64"),
+    ("text_offset", "int64"),
+    ("text_length", "int64"),
+]
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The 'pyarrow' library is not installed. Please run 'pip install pyarrow'.")
+
+def _schema():
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in SCHEMA_FIELDS])
+
+# ---------------------------
+# WRITER
+# ---------------------------
+def _write_shard(shard_dir: str, shard_id: int, entries) -> dict:
+    name = f"shard-{shard_id:05d}"
+    columns = {field: [] for field, _ in SCHEMA_FIELDS}
+    offset = 0
+    with open(os.path.join(shard_dir, name + ".text"), "wb") as blob:
+        for entry in entries:
+            encoded = entry["text"].encode("utf-8")
+            blob.write(encoded)
+            columns["audio_filepath"].append(entry["audio_filepath"])
+            columns["duration"].append(float(entry["duration"]))
+            columns["num_words"].append(len(entry["text"].split()))
+            columns["num_chars"].append(len(entry["text"]))
+            columns["text_offset"].append(offset)
+            columns["text_length"].append(len(encoded))
+            offset += len(encoded)
+
+    ManifestStats.from_entries(entries).save(os.path.join(shard_dir, name + ".stats.json"))
+
+    table = pa.table(columns, schema=_schema())
+    with pa.OSFile(os.path.join(shard_dir, name + ".arrow"), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return {"name": name, "num_rows": len(entries)}
+
+def load_index(shard_dir: str):
+    """The shard directory's index dict, or None if it has none yet."""
+    path = os.path.join(shard_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_shards(entries, shard_dir: str, rows_per_shard: int = ROWS_PER_SHARD, audio_root: str = ".",
+                 append: bool = False) -> dict:
+    """
+    Writes manifest entries (dicts with audio_filepath, duration, text) as
+    Arrow shards plus text blobs, then the index. `audio_root` is the directory,
+    relative to shard_dir, that audio_filepath values are relative to.
+
+    With append, the entries go into new shards after the existing ones, whose
+    files are left untouched, and only the new shards' stats are merged in.
+    Returns the index dict.
+    """
+    _require_pyarrow()
+    os.makedirs(shard_dir, exist_ok=True)
+
+    shards = []
+    first_row = 0
+    index = load_index(shard_dir) if append else None
+    if index is not None:
+        if index.get("version") != FORMAT_VERSION or index.get("audio_root") != audio_root:
+            raise ValueError(f"Cannot append to '{shard_dir}': it was written with a different format or audio_root.")
+        shards, first_row = list(index["shards"]), index["num_entries"]
+    num_existing = len(shards)
+    batch = []
+
+    def flush():
+        nonlocal first_row, batch
+        shard = _write_shard(shard_dir, len(shards), batch)
+        shard["first_row"] = first_row
+        shards.append(shard)
+        first_row += shard["num_rows"]
+        batch = []
+
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= rows_per_shard:
+            flush()
+    if batch:
+        flush()
+
+    index = {"version": FORMAT_VERSION, "num_entries": first_row, "audio_root": audio_root, "shards": shards}
+    tmp_path = os.path.join(shard_dir, INDEX_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, os.path.join(shard_dir, INDEX_FILE))
+
+    merge_shard_stats(shard_dir, shards[num_existing:] if num_existing else None)
+    return index
+
+def merge_shard_stats(shard_dir: str, new_shards=None) -> ManifestStats:
+    """
+    Merges every shard's partial stats into <shard_dir>/stats.json. Each
+    shard's stats are computed once when it is written, so adding shards never
+    recomputes the old ones. Given new_shards (index entries of shards just
+    appended), only those are merged into the existing stats.json.
+    """
+    total = ManifestStats.load(os.path.join(shard_dir, STATS_FILE)) if new_shards is not None else None
+    if total is None:
+        total, new_shards = ManifestStats(), load_index(shard_dir)["shards"]
+    for shard in new_shards:
+        partial = ManifestStats.load(os.path.join(shard_dir, shard["name"] + ".stats.json"))
+        if partial is None:
+            raise FileNotFoundError(f"Missing stats for shard '{shard['name']}'")
+        total.merge(partial)
+    total.save(os.path.join(shard_dir, STATS_FILE))
+    return total
+
+def write_shards_from_manifest(manifest_path: str, shard_dir: str, rows_per_shard: int = ROWS_PER_SHARD,
+                               append: bool = False) -> dict:
+    """
+    Converts a JSONL manifest into a shard directory, streaming line by line.
+    With append, only entries whose audio_filepath is not in the shards yet are
+    written, as new shards; entries changed or removed since stay as they were.
+    """
+    existing = set()
+    if append and load_index(shard_dir) is not None:
+        existing = set(ShardedManifest(shard_dir).column("audio_filepath").to_pylist())
+
+    def entries():
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry["audio_filepath"] not in existing:
+                        yield entry
+
+    audio_root = os.path.relpath(os.path.dirname(os.path.abspath(manifest_path)), os.path.abspath(shard_dir))
+    return write_shards(entries(), shard_dir, rows_per_shard, audio_root, append)
+
+# ---------------------------
+# READER
+# ---------------------------
+class ShardedManifest:
+    """
+    Random-access reader for a shard directory.
+
+        manifest = ShardedManifest("nptel_data/manifest_shards")
+        len(manifest); manifest[k]             # O(1) entry lookup
+        manifest.column("duration")            # memory-mapped, no text parsed
+        manifest.shards_for_worker(wid, n)     # split shards across dataloader workers
+
+    Shards are opened lazily and kept mapped for the life of the reader.
+    """
+
+    def __init__(self, shard_dir: str, shard_ids=None):
+        _require_pyarrow()
+        self.shard_dir = shard_dir
+        with open(os.path.join(shard_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+            self.index = json.load(f)
+        self.audio_root = os.path.normpath(os.path.join(shard_dir, self.index.get("audio_root", ".")))
+
+        shards = self.index["shards"]
+        if shard_ids is not None:
+            shards = [shards[i] for i in shard_ids]
+        # Re-base rows so a worker's subset is addressed 0..len-1.
+        self.shards = []
+        first_row = 0
+        for shard in shards:
+            self.shards.append({**shard, "first_row": first_row})
+            first_row += shard["num_rows"]
+        self._starts = [s["first_row"] for s in self.shards]
+        self._num_rows = first_row
+        self._tables = {}
+        self._blobs = {}
+
+    def __len__(self):
+        return self._num_rows
+
+    def _table(self, i):
+        if i not in self._tables:
+            source = pa.memory_map(os.path.join(self.shard_dir, self.shards[i]["name"] + ".arrow"), "r")
+            self._tables[i] = pa.ipc.open_file(source).read_all()
+        return self._tables[i]
+
+    def _blob(self, i):
+        if i not in self._blobs:
+            path = os.path.join(self.shard_dir, self.shards[i]["name"] + ".text")
+            with open(path, "rb") as f:
+                self._blobs[i] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+        return self._blobs[i]
+
+    def locate(self, k: int):
+        """Maps global row k to (shard index, row within shard)."""
+        if k < 0:
+            k += self._num_rows
+        if not 0 <= k < self._num_rows:
+            raise IndexError(k)
+        i = bisect.bisect_right(self._starts, k) - 1
+        return i, k - self._starts[i]
+
+    def __getitem__(self, k: int) -> dict:
+        i, row = self.locate(k)
+        table = self._table(i)
+        offset = table.column("text_offset")[row].as_py()
+        length = table.column("text_length")[row].as_py()
+        return {
+            "audio_filepath": table.column("audio_filepath")[row].as_py(),
+            "duration": table.column("duration")[row].as_py(),
+            "text": self._blob(i)[offset:offset + length].decode("utf-8"),
+        }
+
+    def __iter__(self):
+        for k in range(self._num_rows):
+            yield self[k]
+
+    def audio_path(self, k: int) -> str:
+        """Path of entry k's audio file, resolved against the shard directory."""
+        return os.path.join(self.audio_root, self[k]["audio_filepath"])
+
+    def column(self, name: str):
+        """One metadata column across all shards as a ChunkedArray (zero-copy from the mapped files)."""
+        return pa.chunked_array([self._table(i).column(name) for i in range(len(self.shards))], type=_schema().field(name).type)
+
+    def shards_for_worker(self, worker_id: int, num_workers: int) -> "ShardedManifest":
+        """Reader over every num_workers-th shard, starting at worker_id."""
+        return ShardedManifest(self.shard_dir, shard_ids=list(range(worker_id, len(self.index["shards"]), num_workers)))
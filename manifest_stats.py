@@ -0,0 +1,169 @@
+# manifest_stats.py
+# Mergeable corpus statistics, written by task4 next to the manifest and read by the
+# dashboard, so page loads never rescan the transcripts.
+
+import os
+import json
+from collections import Counter
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+STATS_VERSION = 1
+# Fixed-width bins keep histograms mergeable across builds and shards.
+HISTOGRAM_BIN_WIDTHS = {
+    "duration": 10.0,   # seconds
+    "num_words": 100,
+    "num_chars": 500,
+}
+
+def stats_path_for(manifest_path: str) -> str:
+    return manifest_path + ".stats.json"
+
+# ---------------------------
+# STATS
+# ---------------------------
+class ManifestStats:
+    """
+    Sufficient statistics for the dashboard: totals, the vocabulary and
+    character set as counters, and fixed-width histograms.
+
+    Stats for disjoint sets of entries combine with merge(), and an entry's
+    contribution can be taken back out with subtract(), so an incremental
+    build only touches the entries it adds, changes or removes.
+    """
+
+    def __init__(self):
+        self.num_utterances = 0
+        self.total_duration = 0.0
+        self.num_words = 0
+        self.num_chars = 0
+        self.vocabulary = Counter()
+        self.characters = Counter()
+        self.histograms = {name: Counter() for name in HISTOGRAM_BIN_WIDTHS}
+
+    def _apply(self, entry: dict, sign: int):
+        text = entry["text"]
+        words = text.split()
+        values = {"duration": float(entry["duration"]), "num_words": len(words), "num_chars": len(text)}
+
+        self.num_utterances += sign
+        self.total_duration += sign * values["duration"]
+        self.num_words += sign * values["num_words"]
+        self.num_chars += sign * values["num_chars"]
+        for name, width in HISTOGRAM_BIN_WIDTHS.items():
+            self.histograms[name][int(values[name] // width)] += sign
+
+        if sign > 0:
+            self.vocabulary.update(words)
+            self.characters.update(text)
+        else:
+            self.vocabulary.subtract(words)
+            self.characters.subtract(text)
+
+    def add(self, entry: dict):
+        self._apply(entry, 1)
+
+    def subtract(self, entry: dict):
+        """Removes an entry previously added (e.g. a changed or deleted file)."""
+        self._apply(entry, -1)
+
+    def merge(self, other: "ManifestStats") -> "ManifestStats":
+        self.num_utterances += other.num_utterances
+        self.total_duration += other.total_duration
+        self.num_words += other.num_words
+        self.num_chars += other.num_chars
+        self.vocabulary.update(other.vocabulary)
+        self.characters.update(other.characters)
+        for name in HISTOGRAM_BIN_WIDTHS:
+            self.histograms[name].update(other.histograms[name])
+        return self
+
+    @classmethod
+    def from_entries(cls, entries) -> "ManifestStats":
+        stats = cls()
+        for entry in entries:
+            stats.add(entry)
+        return stats
+
+    # --- views used by the dashboard ---
+    @property
+    def vocab_size(self) -> int:
+        return sum(1 for count in self.vocabulary.values() if count > 0)
+
+    @property
+    def alphabet(self) -> list:
+        return sorted(char for char, count in self.characters.items() if count > 0)
+
+    def histogram(self, name: str):
+        """Returns (left bin edges, counts, bin width) for plotting with ax.bar."""
+        width = HISTOGRAM_BIN_WIDTHS[name]
+        bins = sorted(b for b, count in self.histograms[name].items() if count > 0)
+        return [b * width for b in bins], [self.histograms[name][b] for b in bins], width
+
+    # --- persistence ---
+    def to_dict(self) -> dict:
+        return {
+            "version": STATS_VERSION,
+            "num_utterances": self.num_utterances,
+            "total_duration": self.total_duration,
+            "num_words": self.num_words,
+            "num_chars": self.num_chars,
+            "vocabulary": {w: c for w, c in self.vocabulary.items() if c > 0},
+            "characters": {ch: c for ch, c in self.characters.items() if c > 0},
+            "histograms": {
+                name: {"bin_width": HISTOGRAM_BIN_WIDTHS[name], "counts": {str(b): c for b, c in counts.items() if c > 0}}
+                for name, counts in self.histograms.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ManifestStats":
+        if data.get("version") != STATS_VERSION:
+            raise ValueError(f"unsupported stats version {data.get('version')}")
+        stats = cls()
+        stats.num_utterances = data["num_utterances"]
+        stats.total_duration = data["total_duration"]
+        stats.num_words = data["num_words"]
+        stats.num_chars = data["num_chars"]
+        stats.vocabulary = Counter(data["vocabulary"])
+        stats.characters = Counter(data["characters"])
+        for name in HISTOGRAM_BIN_WIDTHS:
+            hist = data["histograms"][name]
+            if hist["bin_width"] != HISTOGRAM_BIN_WIDTHS[name]:
+                raise ValueError(f"histogram '{name}' was written with a different bin width")
+            stats.histograms[name] = Counter({int(b): c for b, c in hist["counts"].items()})
+        return stats
+
+    def save(self, path: str, manifest_path: str = None):
+        """
+        Writes the stats atomically. When manifest_path is given, its size and
+        mtime are recorded so readers can tell whether the stats are current.
+        """
+        data = self.to_dict()
+        if manifest_path is not None:
+            st = os.stat(manifest_path)
+            data["manifest"] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, manifest_path: str = None):
+        """
+        Reads saved stats, or returns None if they are missing, unreadable, or
+        (when manifest_path is given) stale with respect to the manifest.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if manifest_path is not None:
+                st = os.stat(manifest_path)
+                if data.get("manifest") != {"size": st.st_size, "mtime_ns": st.st_mtime_ns}:
+                    return None
+            return cls.from_dict(data)
+        except (OSError, ValueError, KeyError):
+            return None
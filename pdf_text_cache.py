@@ -0,0 +1,133 @@
+# pdf_text_cache.py
+# Cached PDF text extraction for task3, with a choice of extraction backend.
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    import pdftotext
+except ImportError:
+    pdftotext = None
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+DEFAULT_CACHE_DIR = "nptel_data/.pdf_text_cache"
+# Fastest first; "auto" picks the first one that is installed.
+BACKEND_PREFERENCE = ["pypdfium2", "pdftotext", "pdfplumber"]
+
+def available_backends():
+    installed = {"pypdfium2": pdfium is not None, "pdftotext": pdftotext is not None, "pdfplumber": True}
+    return [name for name in BACKEND_PREFERENCE if installed[name]]
+
+def resolve_backend(backend: str = "auto") -> str:
+    if backend == "auto":
+        return available_backends()[0]
+    if backend not in available_backends():
+        raise ValueError(f"PDF backend '{backend}' is not installed (available: {', '.join(available_backends())}).")
+    return backend
+
+# ---------------------------
+# BACKENDS
+# ---------------------------
+def _page_count(pdf_path: str, backend: str) -> int:
+    if backend == "pypdfium2":
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    if backend == "pdftotext":
+        with open(pdf_path, "rb") as f:
+            return len(pdftotext.PDF(f))
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+def _extract_page_range(task):
+    """Worker: returns the text of pages [start, stop) as a list of strings."""
+    pdf_path, backend, start, stop = task
+    if backend == "pypdfium2":
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            pages = []
+            for i in range(start, stop):
+                textpage = pdf[i].get_textpage()
+                pages.append(textpage.get_text_range().replace("\r\n", "\n"))
+                textpage.close()
+            return pages
+        finally:
+            pdf.close()
+    if backend == "pdftotext":
+        with open(pdf_path, "rb") as f:
+            doc = pdftotext.PDF(f)
+            return [doc[i] for i in range(start, stop)]
+    with pdfplumber.open(pdf_path) as pdf:
+        return [pdf.pages[i].extract_text() or "" for i in range(start, stop)]
+
+# ---------------------------
+# CACHE
+# ---------------------------
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def extract_pdf_pages(pdf_path: str, backend: str = "auto", cache_dir: str = DEFAULT_CACHE_DIR, page_workers: int = 1):
+    """
+    Returns (text, page_offsets) for a PDF, where text is the pages joined
+    with no separator (as task3 has always done) and page_offsets[i] is the
+    character offset at which page i starts.
+
+    Results are cached by PDF content hash and backend, so a renamed or
+    re-downloaded identical PDF is never extracted twice. On a cache miss with
+    page_workers > 1, pages are extracted in parallel across a process pool.
+    """
+    backend = resolve_backend(backend)
+    cache_path = os.path.join(cache_dir, f"{file_sha256(pdf_path)}.{backend}.json")
+
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            return cached["text"], cached["page_offsets"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    num_pages = _page_count(pdf_path, backend)
+    if page_workers > 1 and num_pages > 1:
+        step = -(-num_pages // page_workers)
+        tasks = [(pdf_path, backend, start, min(start + step, num_pages)) for start in range(0, num_pages, step)]
+        with ProcessPoolExecutor(max_workers=page_workers) as pool:
+            pages = [page for chunk in pool.map(_extract_page_range, tasks) for page in chunk]
+    else:
+        pages = _extract_page_range((pdf_path, backend, 0, num_pages))
+
+    page_offsets = []
+    position = 0
+    for page in pages:
+        page_offsets.append(position)
+        position += len(page)
+    text = "".join(pages)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + f".{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"source": os.path.basename(pdf_path), "backend": backend, "text": text, "page_offsets": page_offsets}, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+    return text, page_offsets
+
+def extract_pdf_text(pdf_path: str, backend: str = "auto", cache_dir: str = DEFAULT_CACHE_DIR, page_workers: int = 1) -> str:
+    """Cached full text of a PDF; see extract_pdf_pages."""
+    return extract_pdf_pages(pdf_path, backend, cache_dir, page_workers)[0]
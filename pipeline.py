@@ -0,0 +1,421 @@
+# pipeline.py
+# Single entry point for the whole pipeline:
+#   download audio ─> dedup ─> process audio ─┐
+#   download transcript ──────────────────────┴─> align text ─> manifest (+ stats sidecar)
+#
+# Stages run per lecture and hand each lecture on as soon as its inputs are ready, so
+# the first lecture reaches the manifest while later ones are still downloading. Every
+# (stage, lecture) result is keyed by a hash of the stage parameters and its input files
+# (size + mtime); keys live in <base_dir>/.pipeline_state.json and a step whose key and
+# output are unchanged is skipped on the next run.
+#
+# The stage bodies are the task scripts' own worker functions, so the pipeline and the
+# hand-run scripts produce the same files. Raw downloads go to task1's directories.
+
+import os
+import json
+import queue
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import task1
+import task2_process_audio as task2
+import task3_process_text as task3
+import task4_manifest_file as task4
+import dedup_index
+import quality_filter
+from download_cache import parse_youtube_url
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+STATE_FILE = os.path.join(task1.BASE_DIR, ".pipeline_state.json")
+
+# A config file (JSON) overrides any of these sections key by key.
+DEFAULT_CONFIG = {
+    # Each lecture source is a video or playlist URL plus its transcript links, in
+    # playlist order: {"youtube": "...", "transcripts": ["...", ...]}
+    "lectures": [],
+    "paths": {
+        "processed_audio": task4.AUDIO_DIR,
+        "processed_transcripts": task4.TEXT_DIR,
+        "manifest": task4.OUTPUT_MANIFEST,
+    },
+    # Audio-fingerprint each download and stop near-duplicates before processing.
+    "dedup": True,
+    # quality_filter mode ("off", "tag", "reject") and thresholds, applied when the manifest is built.
+    "quality": {"mode": "off", **quality_filter.DEFAULT_THRESHOLDS},
+    "audio": {"trim_mode": "reverse", "two_pass": False, "engine": "ffmpeg", "keep_pcm": False},
+    "align": {
+        "align_mode": "full",
+        "window_sec": task3.WINDOW_SEC,
+        "overlap_sec": task3.OVERLAP_SEC,
+        "pdf_backend": "pdfplumber",
+        "pdf_cache_dir": task3.DEFAULT_CACHE_DIR,
+    },
+    "workers": {
+        "download": task1.MAX_WORKERS,
+        "process_audio": os.cpu_count() or 1,
+        "align_threads": None,   # torch threads for the (single) alignment worker
+        "manifest": task4.NUM_WORKERS,
+    },
+}
+
+def load_config(path: str = None) -> dict:
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            user_config = json.load(f)
+        for section, value in user_config.items():
+            if isinstance(value, dict) and isinstance(config.get(section), dict):
+                config[section].update(value)
+            else:
+                config[section] = value
+    return config
+
+# ---------------------------
+# STAGES
+# ---------------------------
+# A lecture ("item") is {"title", "entry", "transcript_url"}; its title is the core
+# filename shared by the .mp3, .pdf, .wav and .txt.
+
+def _mp3_path(item, config):
+    return os.path.join(task1.AUDIO_DIR, item["title"] + ".mp3")
+
+def _pdf_path(item, config):
+    return os.path.join(task1.TRANSCRIPT_DIR, item["title"] + ".pdf")
+
+def _wav_path(item, config):
+    return task2.output_path_for(_mp3_path(item, config), config["paths"]["processed_audio"])
+
+def _txt_path(item, config):
+    return os.path.join(config["paths"]["processed_transcripts"], item["title"] + ".txt")
+
+def _run_download_audio(item, config):
+    if item["entry"] is None:
+        # Resolved from the download index, which only does so while the file is on disk.
+        if not os.path.exists(_mp3_path(item, config)):
+            raise RuntimeError("audio is in the download index but missing on disk; rerun with --refresh")
+        return
+    task1._download_entry(item["entry"])
+
+def _run_download_transcript(item, config):
+    task1._download_transcript(item["title"], item["transcript_url"])
+    if not os.path.exists(_pdf_path(item, config)):
+        raise RuntimeError(f"transcript download failed: {item['transcript_url']}")
+
+def _run_dedup(item, config):
+    if not config["dedup"]:
+        return
+    index = dedup_index.DedupIndex()
+    try:
+        flags = index.check(item["title"], _mp3_path(item, config))
+    finally:
+        index.close()
+    if flags:
+        duplicates = dedup_index.load_duplicates()
+        duplicates[item["title"]] = flags
+        dedup_index.save_duplicates(duplicates)
+        raise RuntimeError(f"near-duplicate of '{flags['duplicate_of']}' (audio score {flags.get('audio_score')})")
+
+def _run_process_audio(item, config):
+    os.makedirs(config["paths"]["processed_audio"], exist_ok=True)
+    message = task2.process_file((_mp3_path(item, config), config["paths"]["processed_audio"], config["audio"]))
+    if message:
+        raise RuntimeError(message.strip())
+
+def _run_align_text(item, config):
+    os.makedirs(config["paths"]["processed_transcripts"], exist_ok=True)
+    job = (item["title"], _pdf_path(item, config), _wav_path(item, config), _txt_path(item, config), config["align"])
+    message = task3.align_one_file(job)
+    if message:
+        raise RuntimeError(message.strip())
+    if not os.path.exists(_txt_path(item, config)):
+        raise RuntimeError("the PDF has no extractable text")
+
+def _align_params(options):
+    # overlap_sec only matters to streaming alignment; leaving it out otherwise
+    # keeps existing align_text state valid.
+    if options.get("align_mode") == "streaming":
+        return options
+    return {k: v for k, v in options.items() if k != "overlap_sec"}
+
+# name: (upstream stages, cache-key inputs, output path, work)
+STAGES = {
+    "download_audio": (
+        [],
+        lambda item, config: {"source": (item["entry"] or {}).get("id") or item["title"]},
+        _mp3_path,
+        _run_download_audio,
+    ),
+    "download_transcript": (
+        [],
+        lambda item, config: {"source": item["transcript_url"]},
+        _pdf_path,
+        _run_download_transcript,
+    ),
+    "dedup": (
+        ["download_audio"],
+        lambda item, config: {"enabled": config["dedup"], "mp3": task4.file_stamp(_mp3_path(item, config))},
+        lambda item, config: dedup_index.INDEX_PATH,
+        _run_dedup,
+    ),
+    "process_audio": (
+        ["dedup"],
+        lambda item, config: {"params": task2.processing_params(config["audio"]),
+                              "mp3": task4.file_stamp(_mp3_path(item, config))},
+        _wav_path,
+        _run_process_audio,
+    ),
+    "align_text": (
+        ["process_audio", "download_transcript"],
+        lambda item, config: {"params": _align_params(config["align"]), "model": task3.WHISPER_MODEL_NAME,
+                              "wav": task4.file_stamp(_wav_path(item, config)),
+                              "pdf": task4.file_stamp(_pdf_path(item, config))},
+        _txt_path,
+        _run_align_text,
+    ),
+}
+# Lectures that finish this stage are folded into the manifest.
+SINK_STAGE = "align_text"
+
+def stage_key(stage: str, item: dict, config: dict) -> str:
+    _, inputs, _, _ = STAGES[stage]
+    material = json.dumps({"stage": stage, "inputs": inputs(item, config)}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+# ---------------------------
+# RUNNER
+# ---------------------------
+class PipelineRunner:
+    """
+    Streams lectures through STAGES on one thread pool per stage.
+
+    Alignment runs on a single thread holding one warm Whisper model (use
+    task3_process_text.py --workers for a multi-process alignment pass).
+    The manifest is rebuilt incrementally on its own thread whenever new
+    transcripts have landed, so it grows while the rest is still running.
+    """
+
+    def __init__(self, config: dict, state_path: str = STATE_FILE, refresh: bool = False):
+        self.config = config
+        self.state_path = state_path
+        self.refresh = refresh
+        self.state = self._load_state()
+        self.events = queue.Queue()
+        self.done = {}           # title -> set of finished stages
+        self.failed = {}         # title -> (stage, message)
+        self.counts = {name: {"ran": 0, "cached": 0} for name in STAGES}
+        self.manifest_dirty = False
+        self.manifest_running = False
+        self.manifest_summary = None
+
+    def _load_state(self) -> dict:
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                print(f"[WARNING] Could not read '{self.state_path}'. Rerunning every stage.")
+        return {}
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    # --- discovery ---
+    def _resolve_lectures(self):
+        """Runs on its own thread: turns each source URL into items as soon as it resolves."""
+        for source in self.config["lectures"]:
+            url, transcripts = source["youtube"], source.get("transcripts") or []
+            cached = None if self.refresh else task1.download_index.resolve_url(url)
+            if cached:
+                entries = [None] * len(cached)
+                titles = [record["title"] for record in cached]
+            else:
+                try:
+                    entries = task1.extract_entries(url)
+                except Exception as e:
+                    self.events.put(("error", None, f"Failed to resolve {url}: {e}"))
+                    continue
+                kind, key = parse_youtube_url(url)
+                if kind == "playlist":
+                    task1.download_index.add_playlist(key, [e["id"] for e in entries if e.get("id")])
+                titles = [e["clean_title"] for e in entries]
+
+            if transcripts and len(transcripts) != len(titles):
+                print(f"[WARNING] {url}: {len(titles)} videos but {len(transcripts)} transcripts; pairing in order.")
+            for i, (title, entry) in enumerate(zip(titles, entries)):
+                transcript_url = transcripts[i] if i < len(transcripts) else None
+                self.events.put(("item", {"title": title, "entry": entry, "transcript_url": transcript_url}, None))
+        self.events.put(("resolved", None, None))
+
+    # --- scheduling ---
+    def _submit(self, stage: str, item: dict):
+        _, _, output, work = STAGES[stage]
+        title = item["title"]
+        try:
+            key = stage_key(stage, item, self.config)
+        except OSError as e:
+            self.events.put(("failed", (stage, item), str(e)))
+            return
+        if not self.refresh and self.state.get(stage, {}).get(title) == key and os.path.exists(output(item, self.config)):
+            self.events.put(("cached", (stage, item), key))
+            return
+
+        def run():
+            try:
+                work(item, self.config)
+            except Exception as e:
+                self.events.put(("failed", (stage, item), str(e)))
+                return
+            # Keyed on the inputs as they were when the stage started.
+            self.events.put(("ran", (stage, item), key))
+
+        self.pools[stage].submit(run)
+
+    def _ready_stages(self, item: dict):
+        done = self.done[item["title"]]
+        for stage, (deps, _, _, _) in STAGES.items():
+            if stage in done or stage in self.started[item["title"]]:
+                continue
+            if stage == "download_transcript" and not item["transcript_url"]:
+                continue
+            if all(dep in done for dep in deps):
+                yield stage
+
+    def _advance(self, item: dict):
+        for stage in self._ready_stages(item):
+            self.started[item["title"]].add(stage)
+            self.pending += 1
+            self._submit(stage, item)
+
+    def _request_manifest(self):
+        self.manifest_dirty = True
+        if self.manifest_running:
+            return
+        self.manifest_running = True
+        self.manifest_dirty = False
+        self.pending += 1
+
+        def run():
+            paths = self.config["paths"]
+            quality = dict(self.config["quality"])
+            try:
+                summary = task4.build_manifest(paths["processed_audio"], paths["processed_transcripts"],
+                                               paths["manifest"], self.config["workers"]["manifest"],
+                                               quality_mode=quality.pop("mode"), thresholds=quality)
+                self.events.put(("manifest", None, summary))
+            except Exception as e:
+                self.events.put(("manifest", None, e))
+
+        self.pools["manifest"].submit(run)
+
+    def run(self) -> dict:
+        workers = self.config["workers"]
+        threads = workers["align_threads"] or os.cpu_count() or 1
+        self.pools = {
+            "download_audio": ThreadPoolExecutor(workers["download"]),
+            "download_transcript": ThreadPoolExecutor(workers["download"]),
+            # ffmpeg does the work in a subprocess, so threads are enough here.
+            # One writer for the SQLite fingerprint index.
+            "dedup": ThreadPoolExecutor(1),
+            "process_audio": ThreadPoolExecutor(workers["process_audio"]),
+            # A failed model load would break this pool and leave its items pending;
+            # _init_pool_worker keeps the error so each item fails on its own instead.
+            "align_text": ThreadPoolExecutor(1, initializer=task3._init_pool_worker, initargs=(threads,)),
+            "manifest": ThreadPoolExecutor(1),
+        }
+        self.started = {}
+        self.pending = 1  # the resolver
+        threading.Thread(target=self._resolve_lectures, daemon=True).start()
+
+        try:
+            while self.pending:
+                kind, payload, value = self.events.get()
+                if kind == "item":
+                    if payload["title"] in self.done:
+                        continue
+                    self.done[payload["title"]], self.started[payload["title"]] = set(), set()
+                    self._advance(payload)
+                    continue
+                if kind in ("resolved", "error"):
+                    if kind == "error":
+                        print(f"[ERROR] {value}")
+                    else:
+                        self.pending -= 1
+                    continue
+                if kind == "manifest":
+                    self.pending -= 1
+                    self.manifest_running = False
+                    if isinstance(value, Exception):
+                        print(f"[ERROR] Manifest build failed: {value}")
+                    else:
+                        self.manifest_summary = value
+                    if self.manifest_dirty:
+                        self._request_manifest()
+                    continue
+
+                self.pending -= 1
+                stage, item = payload
+                if kind == "failed":
+                    self.failed[item["title"]] = (stage, value)
+                    print(f"[ERROR] {stage} failed for '{item['title']}': {value}")
+                    continue
+
+                self.counts[stage][kind] += 1
+                self.state.setdefault(stage, {})[item["title"]] = value
+                self._save_state()
+                self.done[item["title"]].add(stage)
+                print(f"[INFO] {stage}: {item['title']} ({kind})")
+                if stage == SINK_STAGE:
+                    self._request_manifest()
+                self._advance(item)
+        finally:
+            for pool in self.pools.values():
+                pool.shutdown(wait=True)
+            task1.download_index.save()
+
+        return {
+            "lectures": len(self.done),
+            "stages": self.counts,
+            "failed": self.failed,
+            "manifest": self.manifest_summary,
+        }
+
+# ---------------------------
+# MAIN
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run download -> process audio -> align text -> manifest as one streaming, cached pipeline.")
+    parser.add_argument("config", nargs="?", default=None, help="JSON config with 'lectures' and optional overrides of the defaults.")
+    parser.add_argument("--state", default=STATE_FILE, help="Where the per-stage cache keys are kept.")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached keys and playlist listings; rerun every stage.")
+    parser.add_argument("--print_config", action="store_true", help="Print the effective config and exit.")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.print_config:
+        print(json.dumps(config, indent=2))
+        raise SystemExit(0)
+    if not config["lectures"]:
+        print("[ERROR] No lectures configured. Add {\"youtube\": ..., \"transcripts\": [...]} entries to the config.")
+        raise SystemExit(1)
+
+    summary = PipelineRunner(config, args.state, args.refresh).run()
+
+    print("\n" + "="*50)
+    print("PIPELINE SUMMARY")
+    print("="*50)
+    print(f"Lectures: {summary['lectures']}")
+    for stage, counts in summary["stages"].items():
+        print(f" - {stage}: {counts['ran']} ran, {counts['cached']} up to date")
+    for title, (stage, message) in summary["failed"].items():
+        print(f" - FAILED at {stage}: {title} ({message})")
+    if summary["manifest"]:
+        print(f"Manifest entries: {summary['manifest']['entries']} -> {config['paths']['manifest']}")
+    print("\n[DONE] Pipeline finished.")
@@ -0,0 +1,213 @@
+# quality_filter.py
+# Per-lecture quality metrics, checked against thresholds before a pair enters the manifest.
+#
+# For each audio/transcript pair the metrics are:
+#   words_per_sec     transcript words per second of audio (misaligned text is far off)
+#   clipped_ratio     share of samples at full scale
+#   silence_ratio     share of 25 ms frames below SILENCE_DB
+#   snr_db            speech-to-noise estimate: 90th minus 10th percentile frame energy
+#   fallback_ratio    share of the transcript task3 took from the raw PDF because
+#                     alignment failed (from <name>.align.json; None if not recorded)
+#
+# Each WAV is streamed in blocks and the frame energies are computed with NumPy,
+# one process per file. Metrics are kept in a sidecar next to the manifest
+# (<manifest>.quality.json), keyed by file size/mtime, so only new or changed pairs
+# are scored and thresholds can be changed without rescoring.
+
+import os
+import json
+import argparse
+import multiprocessing
+
+import numpy as np
+import soundfile as sf
+from tqdm import tqdm
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+FRAME_SEC = 0.025
+BLOCK_FRAMES = 2400         # frames decoded per streaming block (60s)
+CLIP_LEVEL = 0.999          # |sample| at or above this counts as clipped
+SILENCE_DB = -50.0          # frame energy (dBFS) below this counts as silence
+DIGITAL_SILENCE_DB = -90.0  # frames below this are left out of the SNR estimate
+NOISE_PERCENTILE = 10
+SPEECH_PERCENTILE = 90
+
+# A check fails when its metric is past the bound; None disables it.
+DEFAULT_THRESHOLDS = {
+    "min_words_per_sec": 1.0,
+    "max_words_per_sec": 4.5,
+    "max_clipped_ratio": 0.001,
+    "max_silence_ratio": 0.5,
+    "min_snr_db": 15.0,
+    "max_fallback_ratio": 0.1,
+}
+MODES = ["off", "tag", "reject"]
+
+# ---------------------------
+# ALIGNMENT OUTCOME (written by task3)
+# ---------------------------
+def alignment_info_path(text_path: str) -> str:
+    return os.path.splitext(text_path)[0] + ".align.json"
+
+def write_alignment_info(text_path: str, align_mode: str, fallback_ratio: float):
+    with open(alignment_info_path(text_path), "w", encoding="utf-8") as f:
+        json.dump({"align_mode": align_mode, "fallback_ratio": round(fallback_ratio, 4)}, f)
+
+def read_fallback_ratio(text_path: str):
+    try:
+        with open(alignment_info_path(text_path), "r", encoding="utf-8") as f:
+            return float(json.load(f)["fallback_ratio"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+# ---------------------------
+# METRICS
+# ---------------------------
+def audio_metrics(audio_path: str) -> dict:
+    """Duration, clipped/silence ratios and SNR estimate, streamed block by block."""
+    info = sf.info(audio_path)
+    frame_len = max(1, int(FRAME_SEC * info.samplerate))
+    clipped = samples = 0
+    energies = []
+    for block in sf.blocks(audio_path, blocksize=frame_len * BLOCK_FRAMES, dtype="float32", always_2d=True):
+        clipped += int(np.count_nonzero(np.abs(block).max(axis=1) >= CLIP_LEVEL))
+        samples += len(block)
+        mono = block.mean(axis=1)
+        n_frames = len(mono) // frame_len
+        if n_frames:
+            frames = mono[:n_frames * frame_len].reshape(n_frames, frame_len)
+            energies.append(10.0 * np.log10(np.einsum("ij,ij->i", frames, frames) / frame_len + 1e-12))
+
+    energy_db = np.concatenate(energies) if energies else np.empty(0)
+    audible = energy_db[energy_db > DIGITAL_SILENCE_DB]
+    snr_db = None
+    if audible.size:
+        noise_db, speech_db = np.percentile(audible, [NOISE_PERCENTILE, SPEECH_PERCENTILE])
+        snr_db = round(float(speech_db - noise_db), 2)
+    return {
+        "duration": round(info.duration, 3),
+        "clipped_ratio": round(clipped / samples, 6) if samples else 0.0,
+        "silence_ratio": round(float(np.mean(energy_db < SILENCE_DB)), 4) if energy_db.size else 1.0,
+        "snr_db": snr_db,
+    }
+
+def compute_metrics(job):
+    """
+    Worker: returns (core_name, metrics, error) for one
+    (core_name, audio_path, text_path) pair.
+    """
+    core_name, audio_path, text_path = job
+    try:
+        metrics = audio_metrics(audio_path)
+        with open(text_path, "r", encoding="utf-8") as f:
+            num_words = len(f.read().split())
+        metrics["num_words"] = num_words
+        metrics["words_per_sec"] = round(num_words / metrics["duration"], 3) if metrics["duration"] else 0.0
+        metrics["fallback_ratio"] = read_fallback_ratio(text_path)
+        return core_name, metrics, None
+    except Exception as e:
+        return core_name, None, f"[ERROR] Could not score '{core_name}': {e}"
+
+def evaluate(metrics: dict, thresholds: dict = None) -> list:
+    """Names of the failed checks (e.g. ["min_snr_db"]); empty when the pair passes."""
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    failed = []
+    for name, bound in thresholds.items():
+        if bound is None:
+            continue
+        value = metrics.get(name[4:])
+        if value is None:
+            continue
+        if (name.startswith("min_") and value < bound) or (name.startswith("max_") and value > bound):
+            failed.append(name)
+    return failed
+
+# ---------------------------
+# SIDECAR
+# ---------------------------
+def report_path_for(output_manifest: str) -> str:
+    return output_manifest + ".quality.json"
+
+def _stamp(path: str):
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime]
+
+def load_report(report_path: str) -> dict:
+    """{core_name: {"stamp", "metrics"}} from the sidecar, or {} if missing or unreadable."""
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def score_pairs(pairs: dict, report_path: str, workers: int = None, show_progress: bool = True) -> dict:
+    """
+    Returns {core_name: metrics} for pairs = {core_name: (audio_path, text_path)},
+    scoring only pairs whose files changed since the sidecar was written, on a
+    process pool. The sidecar is rewritten with exactly these pairs. Pairs that
+    could not be scored are reported and left out.
+    """
+    old = load_report(report_path)
+    report, todo = {}, []
+    for core_name, (audio_path, text_path) in pairs.items():
+        stamp = [_stamp(audio_path), _stamp(text_path), _stamp(alignment_info_path(text_path))]
+        if old.get(core_name, {}).get("stamp") == stamp:
+            report[core_name] = old[core_name]
+        else:
+            report[core_name] = {"stamp": stamp, "metrics": None}
+            todo.append((core_name, audio_path, text_path))
+
+    if todo:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(todo)))
+        # spawn: this also runs on the pipeline's manifest thread, where forking is unsafe.
+        with multiprocessing.get_context("spawn").Pool(processes=workers) as pool:
+            results = pool.imap_unordered(compute_metrics, todo)
+            for core_name, metrics, error in tqdm(results, total=len(todo), desc="Scoring Quality", disable=not show_progress):
+                if error:
+                    print(f"\n{error}")
+                    del report[core_name]
+                else:
+                    report[core_name]["metrics"] = metrics
+
+    tmp_path = report_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f)
+    os.replace(tmp_path, report_path)
+    return {core_name: value["metrics"] for core_name, value in report.items()}
+
+def load_thresholds(path: str = None) -> dict:
+    """DEFAULT_THRESHOLDS overridden by a JSON file of the same keys."""
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            thresholds.update(json.load(f))
+    return thresholds
+
+# ---------------------------
+# MAIN
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score audio/transcript pairs and list those failing the quality thresholds.")
+    parser.add_argument("--audio_dir", default="nptel_data/processed_audio", help="Directory with processed 16kHz WAVs.")
+    parser.add_argument("--text_dir", default="nptel_data/processed_transcripts", help="Directory with processed .txt transcripts.")
+    parser.add_argument("--manifest", default="nptel_data/train_manifest.jsonl", help="Manifest whose quality sidecar is updated.")
+    parser.add_argument("--thresholds", default=None, help="JSON file overriding the default thresholds.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of scoring processes.")
+    args = parser.parse_args()
+
+    audio_map = {os.path.splitext(f)[0]: os.path.join(args.audio_dir, f) for f in os.listdir(args.audio_dir) if f.lower().endswith(".wav")}
+    text_map = {os.path.splitext(f)[0]: os.path.join(args.text_dir, f) for f in os.listdir(args.text_dir) if f.lower().endswith(".txt")}
+    pairs = {c: (audio_map[c], text_map[c]) for c in sorted(audio_map) if c in text_map}
+
+    thresholds = load_thresholds(args.thresholds)
+    results = score_pairs(pairs, report_path_for(args.manifest), args.workers)
+    failing = {c: evaluate(m, thresholds) for c, m in results.items()}
+    failing = {c: f for c, f in failing.items() if f}
+
+    for core_name, failed in failing.items():
+        print(f"{core_name}: {', '.join(failed)}")
+    print(f"\n[DONE] {len(results)} pairs scored, {len(failing)} fail the thresholds. Metrics in {report_path_for(args.manifest)}")
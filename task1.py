@@ -1,14 +1,35 @@
 import os
 import re
+import time
+import shutil
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
 import requests
 import yt_dlp
 
+from download_cache import DownloadIndex, parse_youtube_url
+from instrumentation import measure
+
 # ---------------------------
 # CONFIG
 # ---------------------------
 BASE_DIR = "nptel_data"
 AUDIO_DIR = os.path.join(BASE_DIR, "audio")
 TRANSCRIPT_DIR = os.path.join(BASE_DIR, "transcripts")
+INDEX_FILE = os.path.join(BASE_DIR, "download_index.json")
+
+# Download engine: bounded concurrency, per-host politeness and retries.
+MAX_WORKERS = 4
+DEFAULT_MIN_INTERVAL = 0.2   # seconds between requests to the same host
+HOST_MIN_INTERVAL = {
+    "drive.google.com": 0.5,
+    "www.youtube.com": 0.5,
+}
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0           # seconds; doubled on every retry
 
 os.makedirs(AUDIO_DIR, exist_ok=True)
 os.makedirs(TRANSCRIPT_DIR, exist_ok=True)
@@ -31,76 +52,264 @@ def get_drive_id(url):
     return None
 
 # ---------------------------
-# DOWNLOAD AUDIO (MODIFIED SECTION)
+# DOWNLOAD ENGINE
 # ---------------------------
-def download_audio(url):
-    print(f"[INFO] Downloading audio from: {url}")
+class PermanentDownloadError(Exception):
+    """A failure that retrying will not fix (e.g. 403/404 from Drive)."""
+
+class HostRateLimiter:
+    """Enforces a minimum interval between requests to the same host."""
+
+    def __init__(self, default_interval=DEFAULT_MIN_INTERVAL, per_host=None):
+        self.default_interval = default_interval
+        self.per_host = per_host or {}
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        interval = self.per_host.get(host, self.default_interval)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_allowed.get(host, now))
+            self._next_allowed[host] = slot + interval
+        if slot > now:
+            time.sleep(slot - now)
+
+rate_limiter = HostRateLimiter(per_host=HOST_MIN_INTERVAL)
+download_index = DownloadIndex(INDEX_FILE)
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Return the process-wide requests.Session with a pooled adapter."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def with_retries(func, description):
+    """Call func() with exponential backoff, re-raising after MAX_RETRIES attempts."""
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            return func()
+        except PermanentDownloadError:
+            raise
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = BACKOFF_BASE * (2 ** (attempt - 1))
+            print(f"[WARNING] {description} failed (attempt {attempt}/{MAX_RETRIES}): {e}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
 
-    # Step 1: Extract title (This part is unchanged)
+_thread_local = threading.local()
+
+def _get_download_ydl():
+    """One YoutubeDL downloader per worker thread (YoutubeDL is not thread-safe)."""
+    if getattr(_thread_local, "ydl", None) is None:
+        ydl_opts = {
+            "format": "bestaudio/best",
+            "outtmpl": os.path.join(AUDIO_DIR, "%(clean_title)s.%(ext)s"),
+            "postprocessors": [
+                {"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "192"},
+            ],
+            "quiet": True,
+            "no_warnings": True,
+        }
+        _thread_local.ydl = yt_dlp.YoutubeDL(ydl_opts)
+    return _thread_local.ydl
+
+# ---------------------------
+# DOWNLOAD AUDIO
+# ---------------------------
+def extract_entries(url):
+    """
+    Single metadata pass for a video or playlist URL.
+    Returns the list of fully-resolved video info dicts, in playlist order.
+    """
     ydl_opts_info = {"quiet": True, "skip_download": True}
+    rate_limiter.wait(url)
     with yt_dlp.YoutubeDL(ydl_opts_info) as ydl:
-        info = ydl.extract_info(url, download=False)
-        title = clean_filename(info.get("title", "LectureNA"))
-
-    # Step 2: Download with cleaned title
-    outpath = os.path.join(AUDIO_DIR, f"{title}.%(ext)s")
-    
-    # --- THIS IS THE ONLY CHANGE ---
-    # The 'preferredcodec' is changed from 'wav' to 'mp3'.
-    ydl_opts = {
-        "format": "bestaudio/best",
-        "outtmpl": outpath,
-        "postprocessors": [
-            {"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "192"},
-        ],
-    }
-    # -------------------------------
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
-
-    # Update the print statement to reflect the new format.
-    print(f"[INFO] Saved audio: {title}.mp3")
+        info = with_retries(lambda: ydl.extract_info(url, download=False), f"Metadata for {url}")
+
+    if info.get("_type") == "playlist":
+        entries = [e for e in info.get("entries") or [] if e]
+    else:
+        entries = [info]
+
+    for entry in entries:
+        entry["clean_title"] = clean_filename(entry.get("title", "LectureNA"))
+    return entries
+
+def _download_entry(entry):
+    """
+    Download one already-extracted video entry without re-running extraction.
+    Entries already in the index, or already on disk, are recorded and skipped.
+    """
+    title = entry["clean_title"]
+    video_id = entry.get("id")
+    url = entry.get("webpage_url") or entry.get("original_url") or title
+    audio_path = os.path.join(AUDIO_DIR, f"{title}.mp3")
+
+    cached = download_index.get_video(video_id) if video_id else None
+    if cached:
+        print(f"[INFO] Cached audio: {cached['title']}.mp3")
+        return cached["title"]
+
+    if not os.path.exists(audio_path):
+        with measure("download_audio", title, outputs=[audio_path], audio_seconds=entry.get("duration")):
+            rate_limiter.wait(url)
+            with_retries(lambda: _get_download_ydl().process_ie_result(dict(entry), download=True), f"Audio download for {url}")
+        print(f"[INFO] Saved audio: {title}.mp3")
+    else:
+        print(f"[INFO] Audio already on disk: {title}.mp3")
+
+    if video_id:
+        download_index.add_video(video_id, title, url, audio_path)
     return title
 
+def download_audio_batch(urls, max_workers=MAX_WORKERS, refresh=False):
+    """
+    Downloads audio for every video/playlist URL on a bounded thread pool.
+    URLs fully covered by the download index are resolved with no network I/O;
+    pass refresh=True to re-resolve playlists (e.g. to pick up new lectures).
+    Returns the cleaned titles in input (and playlist) order.
+    """
+    entries = []
+    for url in urls:
+        cached = None if refresh else download_index.resolve_url(url)
+        if cached:
+            print(f"[INFO] Using cached download index for: {url}")
+            entries.extend({"id": None, "clean_title": record["title"], "cached": True} for record in cached)
+            continue
+
+        print(f"[INFO] Resolving metadata for: {url}")
+        try:
+            url_entries = extract_entries(url)
+        except Exception as e:
+            print(f"[ERROR] Failed to resolve {url}: {e}")
+            continue
+
+        kind, key = parse_youtube_url(url)
+        if kind == "playlist":
+            download_index.add_playlist(key, [e["id"] for e in url_entries if e.get("id")])
+        entries.extend(url_entries)
+
+    # Cache hits are resolved from the index alone; only misses go to the pool.
+    titles = [e["clean_title"] if e.get("cached") else None for e in entries]
+    pending = [i for i, e in enumerate(entries) if not e.get("cached")]
+
+    print(f"[INFO] Downloading {len(pending)} audio tracks with {max_workers} workers ({len(entries) - len(pending)} cached)...")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_download_entry, entries[i]): i for i in pending}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                titles[i] = future.result()
+            except Exception as e:
+                print(f"[ERROR] Failed to download {entries[i]['clean_title']}: {e}")
+
+    download_index.save()
+    return [t for t in titles if t]
+
+def download_audio(url):
+    print(f"[INFO] Downloading audio from: {url}")
+    titles = download_audio_batch([url], max_workers=1)
+    return titles[0] if titles else None
+
 # ---------------------------
-# DOWNLOAD TRANSCRIPTS (Unchanged)
+# DOWNLOAD TRANSCRIPTS
 # ---------------------------
-def download_transcripts(titles_and_links):
-    print(f"[INFO] Downloading {len(titles_and_links)} transcripts...")
+def _fetch_drive_file(file_id, filename):
+    """
+    Streams one Drive file to disk, resuming a partial '.part' download with
+    an HTTP Range request when the server supports it. Returns the ETag, if any.
+    """
+    session = get_session()
+    download_url = f"https://drive.google.com/uc?export=download&id={file_id}"
+    part_path = filename + ".part"
 
-    for title, url in titles_and_links:
-        file_id = get_drive_id(url)
-        if not file_id:
-            print(f"[WARNING] Skipped invalid link: {url}")
-            continue
+    rate_limiter.wait(download_url)
+    response = session.get(download_url, stream=True, timeout=15)
 
-        download_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-        filename = os.path.join(TRANSCRIPT_DIR, f"{clean_filename(title)}.pdf")
+    if "text/html" in response.headers.get("content-type", "").lower():
+        for line in response.text.splitlines():
+            if "confirm=" in line:
+                token = line.split("confirm=")[-1].split("&")[0]
+                download_url = f"{download_url}&confirm={token}"
+                break
+        else:
+            raise PermanentDownloadError("Drive returned an HTML page without a confirm token")
+        response.close()
+        response = None
 
-        session = requests.Session()
-        try:
-            response = session.get(download_url, stream=True, timeout=15)
-
-            if "text/html" in response.headers.get("content-type", "").lower():
-                for line in response.text.splitlines():
-                    if "confirm=" in line:
-                        token = line.split("confirm=")[-1].split("&")[0]
-                        confirm_url = f"{download_url}&confirm={token}"
-                        response = session.get(confirm_url, stream=True, timeout=15)
-                        break
-
-            if response.status_code == 200:
-                with open(filename, "wb") as f:
-                    for chunk in response.iter_content(1024 * 1024):
-                        f.write(chunk)
-                print(f"[INFO] Saved transcript: {filename}")
-            else:
-                print(f"[WARNING] Failed to download (status {response.status_code}): {url}")
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if response is None or offset:
+        if response is not None:
+            response.close()
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        rate_limiter.wait(download_url)
+        response = session.get(download_url, stream=True, timeout=15, headers=headers)
 
-        except Exception as e:
-            print(f"[ERROR] Failed to download {url}: {e}")
+    with response:
+        if response.status_code == 416:
+            # Nothing left to fetch: the partial file is already complete.
+            os.replace(part_path, filename)
+            return None
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RuntimeError(f"status {response.status_code}")
+        if response.status_code not in (200, 206):
+            raise PermanentDownloadError(f"status {response.status_code}")
+
+        etag = response.headers.get("ETag")
+        mode = "ab" if response.status_code == 206 else "wb"
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(1024 * 1024):
+                f.write(chunk)
+
+    os.replace(part_path, filename)
+    return etag
+
+def _download_transcript(title, url):
+    file_id = get_drive_id(url)
+    if not file_id:
+        print(f"[WARNING] Skipped invalid link: {url}")
+        return
+
+    filename = os.path.join(TRANSCRIPT_DIR, f"{clean_filename(title)}.pdf")
 
+    cached = download_index.get_transcript(file_id)
+    if cached:
+        if os.path.abspath(cached["path"]) != os.path.abspath(filename):
+            shutil.copyfile(cached["path"], filename)
+        print(f"[INFO] Cached transcript: {filename}")
+        return
+    # A PDF already at this path that the index doesn't hold for this Drive ID may
+    # be another lecture's file with the same cleaned title, so it is downloaded over.
+
+    try:
+        with measure("download_transcript", clean_filename(title), outputs=[filename]):
+            etag = with_retries(lambda: _fetch_drive_file(file_id, filename), f"Transcript download for {url}")
+        download_index.add_transcript(file_id, clean_filename(title), url, filename, etag=etag)
+        print(f"[INFO] Saved transcript: {filename}")
+    except PermanentDownloadError as e:
+        print(f"[WARNING] Failed to download ({e}): {url}")
+    except Exception as e:
+        print(f"[ERROR] Failed to download {url}: {e}")
+
+def download_transcripts(titles_and_links, max_workers=MAX_WORKERS):
+    print(f"[INFO] Downloading {len(titles_and_links)} transcripts...")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for future in [pool.submit(_download_transcript, title, url) for title, url in titles_and_links]:
+            future.result()
+
+    download_index.save()
     print("[INFO] Transcript download complete.")
 
 # ---------------------------
@@ -121,9 +330,14 @@ def show_summary():
         print("[INFO] Audio and transcripts look consistent.")
 
 # ---------------------------
-# MAIN (Unchanged)
+# MAIN
 # ---------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download NPTEL lecture audio and PDF transcripts.")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Number of concurrent downloads.")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached playlist listings and re-resolve metadata.")
+    args = parser.parse_args()
+
     # Step 1: Collect YouTube links
     print("Now enter YouTube video/playlist links (one per line).")
     print("When finished, press ENTER on an empty line.")
@@ -137,9 +351,7 @@ if __name__ == "__main__":
 
     audio_titles = []
     if yt_links:
-        for link in yt_links:
-            title = download_audio(link)
-            audio_titles.append(title)
+        audio_titles = download_audio_batch(yt_links, max_workers=args.workers, refresh=args.refresh)
     else:
         print("[INFO] No YouTube links provided.")
 
@@ -166,7 +378,7 @@ if __name__ == "__main__":
             titles_and_links.append((name, link))
 
     if titles_and_links:
-        download_transcripts(titles_and_links)
+        download_transcripts(titles_and_links, max_workers=args.workers)
     else:
         print("[INFO] No transcripts provided.")
 
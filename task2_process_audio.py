@@ -1,54 +1,290 @@
 # task2_process_audio.py
-# This version has the trim times (12s start, 31s end) hardcoded.
+# This version has the trim times (12s start, 30s end) hardcoded.
 
 import os
+import json
+import hashlib
 import subprocess
 import argparse
 from multiprocessing import Pool
+import soundfile as sf
 from tqdm import tqdm
 
+import audio_engine
+from dedup_index import load_duplicates
+from instrumentation import measure
+
+# --- HARDCODED TRIM TIMES ---
+# CHANGED: The trim durations are now fixed inside the script.
+START_TRIM = 12.0
+END_TRIM = 30.0
+# ---------------------------
+
+SAMPLE_RATE = 16000
+# ffmpeg's own loudnorm defaults, so single- and two-pass outputs share a target.
+LOUDNORM_TARGET = {"I": -24.0, "TP": -2.0, "LRA": 7.0}
+LOUDNORM_CACHE_DIR = ".loudnorm"
+STATE_FILE = ".task2_state.json"
+
+# ---------------------------
+# FFMPEG HELPERS
+# ---------------------------
+def build_filter_chain(end_trim: float) -> str:
+    """
+    Downmix/resample first so the buffered tail is small, then drop the last
+    `end_trim` seconds by reversing, trimming the (new) start and reversing back.
+    This trims from the end without knowing the duration up front.
+    """
+    return (
+        f"aresample={SAMPLE_RATE},aformat=channel_layouts=mono,"
+        f"areverse,atrim=start={end_trim},asetpts=PTS-STARTPTS,areverse"
+    )
+
+def loudnorm_filter(measured: dict = None) -> str:
+    """Returns the loudnorm filter, in linear second-pass mode when stats are given."""
+    target = ":".join(f"{k}={v}" for k, v in LOUDNORM_TARGET.items())
+    if not measured:
+        return f"loudnorm={target}"
+    return (
+        f"loudnorm={target}"
+        f":measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+        f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+        f":offset={measured['target_offset']}:linear=true"
+    )
+
+def _loudnorm_cache_key(input_file: str, prefilter: str) -> dict:
+    st = os.stat(input_file)
+    return {
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "start_trim": START_TRIM,
+        "end_trim": END_TRIM,
+        "target": LOUDNORM_TARGET,
+        # Differs between trim modes, so each mode keeps its own measurement.
+        "prefilter": prefilter,
+    }
+
+def measure_loudness(input_file: str, prefilter: str, duration_args: list, cache_dir: str) -> dict:
+    """
+    First loudnorm pass: measures the trimmed audio and returns ffmpeg's JSON
+    stats. prefilter and duration_args are those of the second pass, so both
+    passes see the same audio. Results are cached per input file, so reruns
+    skip this decode.
+    """
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    cache_path = os.path.join(cache_dir, base_name + ".json")
+    key = _loudnorm_cache_key(input_file, prefilter)
+
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("key") == key:
+                return cached["stats"]
+        except (OSError, ValueError):
+            pass
+
+    measure_cmd = [
+        "ffmpeg", "-hide_banner", "-nostats", "-ss", str(START_TRIM), "-i", input_file, *duration_args,
+        "-af", f"{prefilter},{loudnorm_filter()}:print_format=json",
+        "-f", "null", "-",
+    ]
+    result = subprocess.run(measure_cmd, capture_output=True, text=True, check=True)
+    stderr = result.stderr
+    stats = json.loads(stderr[stderr.rindex("{"):stderr.rindex("}") + 1])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "stats": stats}, f)
+    return stats
+
+# ---------------------------
+# INCREMENTAL STATE
+# ---------------------------
+def processing_params(options: dict) -> dict:
+    """Every setting that affects the output WAV; a change invalidates it."""
+    params = {
+        "start_trim": START_TRIM,
+        "end_trim": END_TRIM,
+        "sample_rate": SAMPLE_RATE,
+        "loudnorm": LOUDNORM_TARGET,
+        "trim_mode": options.get("trim_mode", "reverse"),
+        "two_pass": options.get("two_pass", False),
+    }
+    # Only recorded when not the default, so existing ffmpeg state stays valid.
+    if options.get("engine", "ffmpeg") != "ffmpeg":
+        params["engine"] = options["engine"]
+        # The .npy is an output too: turning keep_pcm on must redo up-to-date WAVs.
+        if options.get("keep_pcm", False):
+            params["keep_pcm"] = True
+    return params
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_state(output_dir: str) -> dict:
+    state_path = os.path.join(output_dir, STATE_FILE)
+    if not os.path.exists(state_path):
+        return {}
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"[WARNING] Could not read '{state_path}'. Reprocessing everything.")
+        return {}
+
+def save_state(output_dir: str, state: dict):
+    """Writes the state file atomically so an interrupted run never corrupts it."""
+    state_path = os.path.join(output_dir, STATE_FILE)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, state_path)
+
+def output_path_for(input_file: str, output_dir: str) -> str:
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(input_file))[0] + ".wav")
+
+def is_up_to_date(input_file: str, output_dir: str, params: dict, state: dict) -> bool:
+    """
+    O(1) check: the output exists (or the source was skipped as too short)
+    and the recorded source size/mtime and processing params still match. A
+    touched-but-identical source (same size, new mtime) is confirmed by hash
+    and its entry refreshed in place.
+    """
+    output_file = output_path_for(input_file, output_dir)
+    entry = state.get(os.path.basename(output_file))
+    if entry is None or entry["params"] != params:
+        return False
+    if not entry.get("skipped") and not os.path.exists(output_file):
+        return False
+
+    st = os.stat(input_file)
+    if entry["size"] != st.st_size:
+        return False
+    if entry["mtime"] == st.st_mtime:
+        return True
+    if entry["sha256"] == file_sha256(input_file):
+        entry["mtime"] = st.st_mtime
+        return True
+    return False
+
+def state_entry(input_file: str, params: dict, skipped: bool = False) -> dict:
+    st = os.stat(input_file)
+    entry = {
+        "source": os.path.abspath(input_file),
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "sha256": file_sha256(input_file),
+        "params": params,
+    }
+    if skipped:
+        entry["skipped"] = True
+    return entry
+
+# ---------------------------
+# WORKER
+# ---------------------------
 def process_file(args_tuple):
     """
     Worker function that processes a single audio file with fixed trim times.
+
+    args_tuple is (input_file, output_dir) or (input_file, output_dir, options)
+    where options may set:
+      - "trim_mode": "reverse" (default) trims the end inside ffmpeg's filter
+        graph, so no ffprobe call is needed; "probe" is the original
+        ffprobe-then-ffmpeg path.
+      - "two_pass": run a cached loudnorm measurement pass and apply it
+        linearly, instead of one-pass dynamic loudnorm.
+      - "engine": "ffmpeg" (default) or "inprocess", which decodes, resamples
+        and gain-normalizes with audio_engine instead of starting ffmpeg
+        (trim_mode/two_pass don't apply; its gain is always one linear
+        gain measured on the whole lecture).
+      - "keep_pcm": with the in-process engine, also keep the float32
+        buffer as a .npy that task3 memory-maps for alignment.
     """
-    input_file, output_dir = args_tuple
+    input_file, output_dir = args_tuple[:2]
+    options = args_tuple[2] if len(args_tuple) > 2 else {}
+    trim_mode = options.get("trim_mode", "reverse")
+    two_pass = options.get("two_pass", False)
+
     base_name = os.path.basename(input_file)
-    output_file = os.path.join(output_dir, os.path.splitext(base_name)[0] + ".wav")
-    
-    # --- HARDCODED TRIM TIMES ---
-    # CHANGED: The trim durations are now fixed inside the script.
-    start_trim = 12.0
-    end_trim = 30.0
-    # ---------------------------
+    output_file = output_path_for(input_file, output_dir)
+    # Write to a temp name so an interrupted run never leaves a truncated WAV behind.
+    partial_file = output_file + ".part"
 
-    try:
-        # 1. Get total duration using ffprobe
-        ffprobe_cmd = [
-            "ffprobe", "-v", "error", "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1", input_file
-        ]
-        result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, check=True)
-        total_duration = float(result.stdout.strip())
-
-        # 2. Calculate new duration
-        new_duration = total_duration - start_trim - end_trim
-
-        # 3. Validate duration
-        if new_duration <= 0:
-            return f"[WARNING] Skipping '{base_name}': File too short for trim."
-
-        # 4. Run ffmpeg
-        ffmpeg_cmd = [
-            "ffmpeg", "-y", "-i", input_file, "-ss", str(start_trim),
-            "-t", str(new_duration), "-ar", "16000", "-ac", "1",
-            "-af", "loudnorm", output_file
-        ]
-        subprocess.run(ffmpeg_cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        return None # Return None on success
-
-    except Exception as e:
-        return f"[ERROR] Failed processing '{base_name}': {e}"
+    with measure("process_audio", base_name, inputs=[input_file], outputs=[output_file]) as record:
+        try:
+            if options.get("engine", "ffmpeg") == "inprocess":
+                with measure("process_audio.inprocess", base_name):
+                    audio = audio_engine.process_audio(input_file, START_TRIM, END_TRIM,
+                                                       LOUDNORM_TARGET["I"], LOUDNORM_TARGET["TP"], SAMPLE_RATE)
+                if audio is None or audio.size == 0:
+                    record["status"] = "skipped"
+                    return f"[WARNING] Skipping '{base_name}': File too short for trim."
+                audio_engine.write_outputs(audio, output_file, options.get("keep_pcm", False), SAMPLE_RATE)
+                record["audio_seconds"] = audio.size / SAMPLE_RATE
+                return None
+
+            if trim_mode == "probe":
+                # 1. Get total duration using ffprobe
+                ffprobe_cmd = [
+                    "ffprobe", "-v", "error", "-show_entries", "format=duration",
+                    "-of", "default=noprint_wrappers=1:nokey=1", input_file
+                ]
+                with measure("process_audio.ffprobe", base_name):
+                    result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, check=True)
+                total_duration = float(result.stdout.strip())
+
+                # 2. Calculate new duration
+                new_duration = total_duration - START_TRIM - END_TRIM
+
+                # 3. Validate duration
+                if new_duration <= 0:
+                    record["status"] = "skipped"
+                    return f"[WARNING] Skipping '{base_name}': File too short for trim."
+
+                duration_args = ["-t", str(new_duration)]
+                prefilter = f"aresample={SAMPLE_RATE},aformat=channel_layouts=mono"
+            else:
+                duration_args = []
+                prefilter = build_filter_chain(END_TRIM)
+
+            measured = None
+            if two_pass:
+                with measure("process_audio.loudnorm_measure", base_name):
+                    measured = measure_loudness(input_file, prefilter, duration_args, os.path.join(output_dir, LOUDNORM_CACHE_DIR))
+
+            # -ss before -i seeks the input instead of decoding the intro.
+            ffmpeg_cmd = [
+                "ffmpeg", "-y", "-ss", str(START_TRIM), "-i", input_file, *duration_args,
+                "-af", f"{prefilter},{loudnorm_filter(measured)}",
+                "-ar", str(SAMPLE_RATE), "-ac", "1", "-f", "wav", partial_file
+            ]
+            with measure("process_audio.ffmpeg", base_name):
+                subprocess.run(ffmpeg_cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+            # In reverse mode an over-short input yields an empty (header-only) WAV.
+            # The header size varies (ffmpeg adds a LIST chunk), so check the frame count.
+            if sf.info(partial_file).frames == 0:
+                os.remove(partial_file)
+                record["status"] = "skipped"
+                return f"[WARNING] Skipping '{base_name}': File too short for trim."
+            os.replace(partial_file, output_file)
+            record["audio_seconds"] = sf.info(output_file).duration
+
+            return None # Return None on success
+
+        except Exception as e:
+            record["status"] = "error"
+            return f"[ERROR] Failed processing '{base_name}': {e}"
+
+def process_task(task):
+    """Pool wrapper that reports which input a result belongs to."""
+    return task[0], process_file(task)
 
 
 if __name__ == "__main__":
@@ -57,6 +293,18 @@ if __name__ == "__main__":
     parser.add_argument("input_dir", help="Path to the directory containing all audio files.")
     parser.add_argument("output_dir", help="Path to an output directory to store the processed files.")
     parser.add_argument("num_cpus", type=int, help="Number of CPU cores to use for parallel processing.")
+    parser.add_argument("--trim_mode", choices=["reverse", "probe"], default="reverse",
+                        help="'reverse' trims the end in a single ffmpeg call; 'probe' runs ffprobe first.")
+    parser.add_argument("--two_pass", action="store_true",
+                        help="Use two-pass loudnorm; measurement results are cached in <output_dir>/.loudnorm.")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"Skip files whose source and settings are unchanged since the last run (tracked in <output_dir>/{STATE_FILE}).")
+    parser.add_argument("--skip_duplicates", action="store_true",
+                        help="Skip lectures flagged as near-duplicates by dedup_index.py.")
+    parser.add_argument("--engine", choices=["ffmpeg", "inprocess"], default="ffmpeg",
+                        help="'inprocess' decodes/resamples/normalizes in Python (soundfile + NumPy) without ffmpeg subprocesses.")
+    parser.add_argument("--keep_pcm", action="store_true",
+                        help=f"With --engine inprocess, keep float32 buffers in <output_dir>/{audio_engine.PCM_DIR} for task3 to memory-map.")
     args = parser.parse_args()
 
     os.makedirs(args.output_dir, exist_ok=True)
@@ -70,14 +318,40 @@ if __name__ == "__main__":
     if not files_to_process:
         print(f"[ERROR] No audio files found in '{args.input_dir}'.")
         exit(1)
-        
-    tasks = [(f, args.output_dir) for f in files_to_process]
+
+    if args.skip_duplicates:
+        duplicates = load_duplicates()
+        kept = [f for f in files_to_process if os.path.splitext(os.path.basename(f))[0] not in duplicates]
+        print(f"[INFO] Skipping {len(files_to_process) - len(kept)} near-duplicate lectures.")
+        files_to_process = kept
+
+    options = {"trim_mode": args.trim_mode, "two_pass": args.two_pass, "engine": args.engine, "keep_pcm": args.keep_pcm}
+    params = processing_params(options)
+
+    state = load_state(args.output_dir) if args.incremental else {}
+    if args.incremental:
+        pending = [f for f in files_to_process if not is_up_to_date(f, args.output_dir, params, state)]
+        print(f"[INFO] Incremental mode: {len(files_to_process) - len(pending)} up to date, {len(pending)} to process.")
+        files_to_process = pending
+
+    tasks = [(f, args.output_dir, options) for f in files_to_process]
 
     print(f"[INFO] Starting parallel fixed-time trimming using {args.num_cpus} CPUs...")
-    print(f"[INFO] Trimming first 12s and last 31s from each file.")
+    print(f"[INFO] Trimming first {START_TRIM:g}s and last {END_TRIM:g}s from each file.")
 
+    results = []
     with Pool(processes=args.num_cpus) as pool:
-        results = list(tqdm(pool.imap_unordered(process_file, tasks), total=len(tasks)))
+        for input_file, res in tqdm(pool.imap_unordered(process_task, tasks), total=len(tasks)):
+            results.append(res)
+            # Too-short sources are recorded as well, so they aren't re-decoded every run.
+            skipped = res is not None and res.startswith("[WARNING] Skipping")
+            if args.incremental and (res is None or skipped):
+                # Record each outcome as it lands so an interrupted run resumes here.
+                state[os.path.basename(output_path_for(input_file, args.output_dir))] = state_entry(input_file, params, skipped)
+                save_state(args.output_dir, state)
+
+    if args.incremental:
+        save_state(args.output_dir, state)
 
     # Print any errors that occurred
     for res in results:
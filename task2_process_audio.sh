@@ -1,19 +1,28 @@
 #!/bin/bash
-# Usage: ./task2_process_audio.sh <input_dir> <output_dir> <num_cpus>
+# Usage: ./task2_process_audio.sh <input_dir> <output_dir> <num_cpus> [--incremental]
 # Example: bash task2_process_audio.sh nptel_data/audio/ nptel_data/processed_audio/ 4
 #
-# This version has the trim times (12s start, 31s end) hardcoded.
+# This version has the trim times (12s start, 30s end) hardcoded.
+#
+# With --incremental, each output WAV gets a signature file in <output_dir>/.task2_state/
+# recording the source size/mtime/sha256 and the processing settings. Files whose
+# source size/mtime and settings are unchanged are skipped without running ffmpeg;
+# a source with the same size but a new mtime is skipped if its sha256 still matches.
 
 # --- VALIDATE INPUTS ---
-if [ "$#" -ne 3 ]; then
+if [ "$#" -ne 3 ] && ! { [ "$#" -eq 4 ] && [ "$4" = "--incremental" ]; }; then
     echo "ERROR: Invalid number of arguments."
-    echo "Usage: $0 <input_dir> <output_dir> <num_cpus>"
+    echo "Usage: $0 <input_dir> <output_dir> <num_cpus> [--incremental]"
     exit 1
 fi
 
 INPUT_DIR=$1
 OUTPUT_DIR=$2
 N=$3
+INCREMENTAL=0
+if [ "$4" = "--incremental" ]; then
+    INCREMENTAL=1
+fi
 
 # --- HARDCODED TRIM TIMES ---
 # CHANGED: The trim durations are now fixed inside the script.
@@ -21,8 +30,15 @@ START_TRIM=12
 END_TRIM=30
 # ---------------------------
 
+# Everything that affects the output; changing any of it invalidates old outputs.
+PARAMS="start=$START_TRIM end=$END_TRIM ar=16000 ac=1 af=loudnorm"
+
 # --- SETUP ---
 mkdir -p "$OUTPUT_DIR"
+STATE_DIR="$OUTPUT_DIR/.task2_state"
+if [ "$INCREMENTAL" -eq 1 ]; then
+    mkdir -p "$STATE_DIR"
+fi
 
 # --- WORKER FUNCTION ---
 process_one_file() {
@@ -30,6 +46,9 @@ process_one_file() {
     local output_dir="$2"
     local start_trim="$3"
     local end_trim="$4"
+    local incremental="$5"
+    local state_dir="$6"
+    local params="$7"
 
     if [ ! -f "$input_file" ]; then
         return 1
@@ -38,6 +57,28 @@ process_one_file() {
     local base_name
     base_name=$(basename "$input_file")
     local output_file="$output_dir/${base_name%.*}.wav"
+    local state_file="$state_dir/${base_name%.*}.sig"
+
+    local signature=""
+    if [ "$incremental" -eq 1 ]; then
+        signature="$(stat -c '%s %Y' "$input_file") $params"
+        if [ -f "$output_file" ] && [ -f "$state_file" ]; then
+            local recorded recorded_sha256
+            recorded=$(sed -n 1p "$state_file")
+            recorded_sha256=$(sed -n 2p "$state_file")
+            if [ "$recorded" = "$signature" ]; then
+                echo "[INFO] Up to date: '$base_name'"
+                return 0
+            fi
+            # Touched but identical source: same size and settings, same hash.
+            if [ "${recorded%% *}" = "${signature%% *}" ] && [ "${recorded#* * }" = "$params" ] \
+                && [ "$recorded_sha256" = "$(sha256sum "$input_file" | cut -d ' ' -f 1)" ]; then
+                printf '%s\n%s\n' "$signature" "$recorded_sha256" > "$state_file"
+                echo "[INFO] Up to date: '$base_name'"
+                return 0
+            fi
+        fi
+    fi
 
     echo "[INFO] Processing '$base_name'"
 
@@ -59,14 +100,22 @@ process_one_file() {
         return 1
     fi
 
+    # -ss before -i seeks the input instead of decoding the intro.
+    # Write to a temp name so an interrupted run never leaves a truncated WAV behind.
     ffmpeg -y \
-        -i "$input_file" \
         -ss "$start_trim" \
+        -i "$input_file" \
         -t "$new_duration" \
         -ar 16000 \
         -ac 1 \
         -af "loudnorm" \
-        "$output_file" -loglevel error
+        -f wav \
+        "$output_file.part" -loglevel error || return 1
+    mv -f "$output_file.part" "$output_file"
+
+    if [ "$incremental" -eq 1 ]; then
+        printf '%s\n%s\n' "$signature" "$(sha256sum "$input_file" | cut -d ' ' -f 1)" > "$state_file"
+    fi
 }
 export -f process_one_file
 
@@ -76,6 +125,6 @@ echo "[INFO] Trimming first ${START_TRIM}s and last ${END_TRIM}s from each file.
 
 find "$INPUT_DIR" -type f \( -iname "*.wav" -o -iname "*.mp3" -o -iname "*.m4a" \) -print0 | \
     xargs -0 -P "$N" -I {} \
-    bash -c 'process_one_file "$@"' _ {} "$OUTPUT_DIR" "$START_TRIM" "$END_TRIM"
+    bash -c 'process_one_file "$@"' _ {} "$OUTPUT_DIR" "$START_TRIM" "$END_TRIM" "$INCREMENTAL" "$STATE_DIR" "$PARAMS"
 
 echo -e "\n[DONE] All audio files have been trimmed and processed successfully."
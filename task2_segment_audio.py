@@ -0,0 +1,228 @@
+# task2_segment_audio.py
+# Splits the processed 16kHz mono lectures from task2 into 2-20s utterances at
+# silences. No audio is copied: the output is a JSONL of (offset, duration)
+# segments pointing into the processed WAVs, so training can bucket by length.
+
+import os
+import json
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+import soundfile as sf
+from tqdm import tqdm
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+SAMPLE_RATE = 16000
+FRAME_MS = 30               # webrtcvad accepts 10/20/30 ms frames
+BLOCK_FRAMES = 1000         # frames decoded per streaming block (~30s)
+
+MIN_SEGMENT = 2.0           # seconds
+MAX_SEGMENT = 20.0          # seconds
+MIN_SILENCE = 0.3           # a pause this long ends an utterance
+MIN_PAUSE = 0.1             # shorter pauses are never used as cut points
+PAD = 0.15                  # context kept on each side of an utterance
+
+ENERGY_FLOOR_DB = -60.0     # frames below this are always silence
+ENERGY_MARGIN_DB = 10.0     # speech must be this far above the noise floor
+NOISE_ADAPT = 0.01          # how fast the noise floor rises
+HANGOVER_FRAMES = 3         # frames of speech kept after energy drops
+
+# ---------------------------
+# FRAME-LEVEL VAD
+# ---------------------------
+def _iter_frame_blocks(audio_path: str, frame_len: int):
+    """Streams the WAV as (n_frames, frame_len) float32 blocks."""
+    block_len = frame_len * BLOCK_FRAMES
+    for block in sf.blocks(audio_path, blocksize=block_len, dtype="float32", always_2d=True):
+        mono = block.mean(axis=1)
+        n_frames = len(mono) // frame_len
+        if n_frames:
+            yield mono[: n_frames * frame_len].reshape(n_frames, frame_len)
+
+def energy_speech_flags(audio_path: str, frame_len: int):
+    """
+    Energy VAD with an adaptive noise floor: the floor snaps down to quiet
+    frames and creeps up slowly, and a frame is speech when it is
+    ENERGY_MARGIN_DB above the floor. Yields one bool per frame.
+    """
+    noise_floor = None
+    hangover = 0
+    for frames in _iter_frame_blocks(audio_path, frame_len):
+        energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        for e in energy_db:
+            if noise_floor is None or e < noise_floor:
+                noise_floor = e
+            else:
+                noise_floor += NOISE_ADAPT * (e - noise_floor)
+
+            if e > ENERGY_FLOOR_DB and e > noise_floor + ENERGY_MARGIN_DB:
+                hangover = HANGOVER_FRAMES
+                yield True
+            elif hangover > 0:
+                hangover -= 1
+                yield True
+            else:
+                yield False
+
+def webrtc_speech_flags(audio_path: str, frame_len: int, aggressiveness: int = 2):
+    """WebRTC VAD over 16-bit PCM frames. Yields one bool per frame."""
+    vad = webrtcvad.Vad(aggressiveness)
+    for frames in _iter_frame_blocks(audio_path, frame_len):
+        pcm = (np.clip(frames, -1.0, 1.0) * 32767).astype(np.int16)
+        for frame in pcm:
+            yield vad.is_speech(frame.tobytes(), SAMPLE_RATE)
+
+# ---------------------------
+# SEGMENTATION
+# ---------------------------
+def segment_from_flags(flags, frame_sec: float, min_seg: float = MIN_SEGMENT, max_seg: float = MAX_SEGMENT,
+                       min_silence: float = MIN_SILENCE):
+    """
+    Turns a stream of per-frame speech flags into (start, end) utterances.
+
+    An utterance ends at the first pause of at least `min_silence` once it is
+    `min_seg` long. If it reaches `max_seg` first, it is cut at the longest
+    pause seen after `min_seg`, or hard-cut when there was none. A pause that
+    would carry the utterance past `max_seg` ends it at the pause start.
+    Leftovers shorter than `min_seg` are merged into the previous utterance
+    when that stays within `max_seg`, otherwise dropped. No emitted utterance
+    is shorter than `min_seg` or longer than `max_seg`.
+    """
+    segments = []
+    seg_start = None
+    silence_start = None
+    pauses = []  # (start, end) of pauses inside the current utterance
+    t = 0.0
+
+    def emit(start, end):
+        end = min(end, start + max_seg)
+        if end - start >= min_seg:
+            segments.append((start, end))
+        elif segments and end - segments[-1][0] <= max_seg:
+            segments[-1] = (segments[-1][0], end)
+
+    for i, speech in enumerate(flags):
+        t = i * frame_sec
+        if speech:
+            if seg_start is None:
+                seg_start = t
+            elif silence_start is not None and t - silence_start >= MIN_PAUSE:
+                pauses.append((silence_start, t))
+            silence_start = None
+
+            if t - seg_start >= max_seg:
+                candidates = [p for p in pauses if p[0] - seg_start >= min_seg]
+                if candidates:
+                    cut_start, cut_end = max(candidates, key=lambda p: p[1] - p[0])
+                    emit(seg_start, cut_start)
+                    seg_start = cut_end
+                else:
+                    emit(seg_start, t)
+                    seg_start = t
+                pauses = [p for p in pauses if p[0] >= seg_start]
+        else:
+            if seg_start is None:
+                continue
+            if silence_start is None:
+                silence_start = t
+            long_pause = t - silence_start >= min_silence and silence_start - seg_start >= min_seg
+            # A short utterance can't wait out a pause that would take it past max_seg.
+            if long_pause or t + frame_sec - seg_start > max_seg:
+                emit(seg_start, silence_start)
+                seg_start, silence_start, pauses = None, None, []
+
+        # Hold back the newest utterance so a short leftover can still merge into it.
+        while len(segments) > 1:
+            yield segments.pop(0)
+
+    if seg_start is not None:
+        emit(seg_start, silence_start if silence_start is not None else t + frame_sec)
+    yield from segments
+
+def segment_file(task):
+    """
+    Worker: runs VAD over one processed WAV and returns (audio_path, segments, error)
+    where segments is a list of (offset, duration) in seconds.
+    """
+    audio_path, backend = task
+    try:
+        info = sf.info(audio_path)
+        if info.samplerate != SAMPLE_RATE:
+            return audio_path, [], f"[WARNING] Skipping '{os.path.basename(audio_path)}': expected {SAMPLE_RATE} Hz, got {info.samplerate}."
+
+        frame_len = SAMPLE_RATE * FRAME_MS // 1000
+        frame_sec = frame_len / SAMPLE_RATE
+        if backend == "webrtc":
+            flags = webrtc_speech_flags(audio_path, frame_len)
+        else:
+            flags = energy_speech_flags(audio_path, frame_len)
+
+        segments = []
+        # Leave room for the padding so padded utterances stay within MAX_SEGMENT.
+        for start, end in segment_from_flags(flags, frame_sec, max_seg=MAX_SEGMENT - 2 * PAD):
+            start = max(0.0, start - PAD)
+            end = min(info.duration, end + PAD)
+            segments.append((round(start, 3), round(end - start, 3)))
+        return audio_path, segments, None
+
+    except Exception as e:
+        return audio_path, [], f"[ERROR] Failed segmenting '{os.path.basename(audio_path)}': {e}"
+
+# ---------------------------
+# MAIN
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split processed lectures into utterances with voice activity detection.")
+    parser.add_argument("--audio_dir", default="nptel_data/processed_audio", help="Directory of processed 16kHz WAVs from Task 2.")
+    parser.add_argument("--output", default="nptel_data/segments.jsonl", help="Path of the segment offsets JSONL to write.")
+    parser.add_argument("--num_cpus", type=int, default=os.cpu_count(), help="Number of CPU cores to use.")
+    parser.add_argument("--vad", choices=["energy", "webrtc"], default="energy", help="VAD backend ('webrtc' needs the webrtcvad package).")
+    args = parser.parse_args()
+
+    if args.vad == "webrtc" and webrtcvad is None:
+        print("[ERROR] The 'webrtcvad' library is not installed. Please run 'pip install webrtcvad' or use --vad energy.")
+        exit(1)
+
+    wav_files = sorted(
+        os.path.join(args.audio_dir, f) for f in os.listdir(args.audio_dir) if f.lower().endswith(".wav")
+    )
+    if not wav_files:
+        print(f"[ERROR] No processed WAV files found in '{args.audio_dir}'.")
+        exit(1)
+
+    print(f"[INFO] Segmenting {len(wav_files)} files with the '{args.vad}' VAD using {args.num_cpus} CPUs...")
+
+    with Pool(processes=args.num_cpus) as pool:
+        results = list(tqdm(pool.imap(segment_file, [(f, args.vad) for f in wav_files]), total=len(wav_files)))
+
+    # Paths are stored relative to the output file, as in the training manifest.
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    segment_count = 0
+    total_seconds = 0.0
+    with open(args.output, "w", encoding="utf-8") as f_out:
+        for audio_path, segments, error in results:
+            if error:
+                print(error)
+                continue
+            relative_audio_path = os.path.relpath(os.path.abspath(audio_path), output_dir)
+            core_name = os.path.splitext(os.path.basename(audio_path))[0]
+            for i, (offset, duration) in enumerate(segments):
+                entry = {
+                    "audio_filepath": relative_audio_path,
+                    "offset": offset,
+                    "duration": duration,
+                    "segment_id": f"{core_name}_{i:04d}",
+                }
+                f_out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                segment_count += 1
+                total_seconds += duration
+
+    print(f"\n[DONE] Wrote {segment_count} segments ({total_seconds / 3600:.2f} hours) to {args.output}")
@@ -2,24 +2,38 @@
 
 import os
 import re
-import string
+import json
+import difflib
+import hashlib
 import argparse
+import multiprocessing
 import whisper_timestamped as whisper
-import pdfplumber
-from num2words import num2words
+import soundfile as sf
 from tqdm import tqdm
 
-def align_and_extract_text(audio_path: str, raw_pdf_text: str, model) -> str:
+from pdf_text_cache import DEFAULT_CACHE_DIR, extract_pdf_text
+from text_normalizer import normalize_text
+from instrumentation import measure
+from audio_engine import load_for_alignment
+from dedup_index import load_duplicates
+from quality_filter import write_alignment_info
+
+def align_and_extract_text(audio_path: str, raw_pdf_text: str, model):
     """
     Performs forced alignment to find the exact text in the PDF that
     matches the audio content.
+
+    Returns (text, fallback_ratio): 1.0 when alignment failed and the full
+    PDF text was used instead, else 0.0.
     """
     try:
         # --- THIS IS THE CRITICAL FIX ---
         # The library expects the transcript text to be passed via the 'initial_prompt' argument, not 'text'.
+        # Samples come from the engine's memory-mapped buffer when task2 kept one,
+        # else straight from the WAV, so Whisper never starts its own ffmpeg decode.
         result = whisper.transcribe(
             model,
-            audio_path,
+            load_for_alignment(audio_path),
             initial_prompt=raw_pdf_text, # CORRECTED ARGUMENT
             language="en"
         )
@@ -29,44 +43,305 @@ def align_and_extract_text(audio_path: str, raw_pdf_text: str, model) -> str:
         # This automatically discards any non-spoken intro/outro text from the PDF.
         aligned_text = " ".join(segment['text'].strip() for segment in result['segments'])
         
-        return aligned_text
+        return aligned_text, 0.0
 
     except Exception as e:
         print(f"\n[WARNING] Forced alignment failed for {os.path.basename(audio_path)}: {e}. Falling back to full text.")
-        return raw_pdf_text
+        return raw_pdf_text, 1.0
+
+# ---------------------------
+# WINDOWED ALIGNMENT
+# ---------------------------
+WINDOW_SEC = 30.0           # one Whisper context per window
+PROMPT_SLACK = 1.5          # prompt covers this many windows' worth of PDF words
+MAX_PROMPT_WORDS = 150      # keeps the prompt inside Whisper's prompt budget
+
+def _norm_words(words):
+    return [re.sub(r"[^\w]", "", w.lower()) for w in words]
+
+def _advance_pointer(pdf_words, pointer: int, search_len: int, heard_words) -> int:
+    """
+    Returns the PDF word index just past the last PDF word that matches what
+    was heard in this window, searching pdf_words[pointer:pointer + search_len].
+    """
+    candidates = _norm_words(pdf_words[pointer:pointer + search_len])
+    matcher = difflib.SequenceMatcher(None, candidates, _norm_words(heard_words), autojunk=False)
+    blocks = [b for b in matcher.get_matching_blocks() if b.size]
+    if not blocks:
+        return None
+    last = blocks[-1]
+    return pointer + last.a + last.size
+
+def align_windowed(audio_path: str, raw_pdf_text: str, model, window_sec: float = WINDOW_SEC):
+    """
+    Aligns the lecture one fixed-length window at a time. Each window is read
+    from disk on its own (memory stays bounded) and is prompted only with the
+    slice of PDF text starting at a running word-offset pointer, which is
+    advanced to the last PDF word matched in the window.
+
+    A window that fails to align falls back to its own PDF slice only, instead
+    of the whole file falling back to the raw PDF text.
+
+    Returns (text, words, fallback_ratio) where words carries lecture-level
+    timestamps and fallback_ratio is the share of windows that fell back.
+    """
+    info = sf.info(audio_path)
+    pdf_words = raw_pdf_text.split()
+    words_per_sec = len(pdf_words) / info.duration if info.duration else 0.0
+    window_frames = int(window_sec * info.samplerate)
+
+    pointer = 0
+    texts, words = [], []
+    num_windows = fallback_windows = 0
+    for window_start in range(0, info.frames, window_frames):
+        offset = window_start / info.samplerate
+        expected = max(1, int(words_per_sec * window_sec))
+        prompt_words = pdf_words[pointer:pointer + min(MAX_PROMPT_WORDS, int(expected * PROMPT_SLACK) + 1)]
+        num_windows += 1
+
+        try:
+            audio = load_for_alignment(audio_path, window_start, window_start + window_frames)
+            result = whisper.transcribe(model, audio, initial_prompt=" ".join(prompt_words), language="en")
+
+            window_words = []
+            for segment in result["segments"]:
+                texts.append(segment["text"].strip())
+                for word in segment.get("words", []):
+                    window_words.append({**word, "start": round(word["start"] + offset, 3), "end": round(word["end"] + offset, 3)})
+            words.extend(window_words)
+
+            new_pointer = _advance_pointer(pdf_words, pointer, 2 * len(prompt_words), [w["text"] for w in window_words])
+            pointer = new_pointer if new_pointer is not None else pointer + expected
+
+        except Exception as e:
+            print(f"\n[WARNING] Window at {offset:.0f}s failed for {os.path.basename(audio_path)}: {e}. Using its PDF slice.")
+            texts.append(" ".join(pdf_words[pointer:pointer + expected]))
+            pointer += expected
+            fallback_windows += 1
+
+    return " ".join(t for t in texts if t), words, fallback_windows / num_windows if num_windows else 0.0
+
+# ---------------------------
+# STREAMING ALIGNMENT
+# ---------------------------
+OVERLAP_SEC = 5.0           # audio shared by consecutive streaming windows
+
+def partial_path_for(output_path: str) -> str:
+    return os.path.splitext(output_path)[0] + ".partial.jsonl"
+
+def _read_checkpoint(partial_path: str, header: dict):
+    """
+    Returns (window records, byte length of the intact part) of the partial
+    file, or ([], 0) when it is missing or was written for other inputs or
+    settings. A last line cut short by a crash is not part of the intact part.
+    """
+    if not os.path.exists(partial_path):
+        return [], 0
+    with open(partial_path, "rb") as f:
+        lines = f.read().split(b"\n")[:-1]  # only newline-terminated lines are complete
+    try:
+        if not lines or json.loads(lines[0]) != header:
+            return [], 0
+        records = [json.loads(line) for line in lines[1:]]
+    except ValueError:
+        return [], 0
+    return records, sum(len(line) + 1 for line in lines)
+
+def _append_checkpoint(f, record: dict):
+    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def align_streaming(audio_path: str, raw_pdf_text: str, model, partial_path: str,
+                    window_sec: float = WINDOW_SEC, overlap_sec: float = OVERLAP_SEC):
+    """
+    Aligns overlapping windows (window_sec long, overlap_sec shared with the
+    next one) through the loaded model, prompting each with the PDF slice at a
+    running word pointer as in align_windowed. Windows are stitched at the
+    middle of each overlap: a window keeps the words whose midpoint falls
+    between its two cut points, so words cut off at a window edge come from
+    the neighbour that heard them whole.
+
+    Every finished window is appended (and fsync'ed) to partial_path, headed
+    by the audio/PDF stamp and settings. A rerun with the same inputs resumes
+    after the last complete window. Only one window's audio and result are
+    held at a time, so memory does not grow with the lecture's length.
+
+    Returns (text, words, fallback_ratio) like align_windowed; the caller
+    removes partial_path once the transcript is written.
+    """
+    info = sf.info(audio_path)
+    pdf_words = raw_pdf_text.split()
+    window_frames = int(window_sec * info.samplerate)
+    stride_frames = max(1, window_frames - int(overlap_sec * info.samplerate))
+    stride_sec = stride_frames / info.samplerate
+    words_per_sec = len(pdf_words) / info.duration if info.duration else 0.0
+    expected = max(1, int(words_per_sec * stride_sec))
+    half_overlap = (window_frames - stride_frames) / 2 / info.samplerate
+
+    header = {
+        "audio": [os.path.getsize(audio_path), os.path.getmtime(audio_path)],
+        "pdf_sha1": hashlib.sha1(raw_pdf_text.encode("utf-8")).hexdigest(),
+        "window_sec": window_sec, "overlap_sec": overlap_sec, "model": WHISPER_MODEL_NAME,
+    }
+    done, intact_bytes = _read_checkpoint(partial_path, header)
+    window_starts = range(0, max(1, info.frames - (window_frames - stride_frames)), stride_frames)
+    pointer = done[-1]["pointer"] if done else 0
+    if done:
+        print(f"\n[INFO] Resuming {os.path.basename(audio_path)} at window {len(done)}/{len(window_starts)}.")
+
+    with open(partial_path, "r+" if intact_bytes else "w", encoding="utf-8") as f:
+        if intact_bytes:
+            # Drop a torn last line and continue after the intact windows.
+            f.truncate(intact_bytes)
+            f.seek(intact_bytes)
+        else:
+            _append_checkpoint(f, header)
+
+        for index in range(len(done), len(window_starts)):
+            window_start = window_starts[index]
+            offset = window_start / info.samplerate
+            head_cut = offset + half_overlap if index > 0 else float("-inf")
+            tail_cut = offset + stride_sec + half_overlap if index < len(window_starts) - 1 else float("inf")
+            prompt_words = pdf_words[pointer:pointer + min(MAX_PROMPT_WORDS, int(expected * PROMPT_SLACK) + 1)]
+
+            try:
+                audio = load_for_alignment(audio_path, window_start, window_start + window_frames)
+                result = whisper.transcribe(model, audio, initial_prompt=" ".join(prompt_words), language="en")
+                kept = []
+                for segment in result["segments"]:
+                    # Segments without word timings are kept or dropped whole.
+                    for word in segment.get("words") or [{"text": segment["text"].strip(), "start": segment["start"], "end": segment["end"]}]:
+                        start, end = word["start"] + offset, word["end"] + offset
+                        if head_cut <= (start + end) / 2 < tail_cut:
+                            kept.append({**word, "start": round(start, 3), "end": round(end, 3)})
+                new_pointer = _advance_pointer(pdf_words, pointer, 2 * len(prompt_words), [w["text"] for w in kept])
+                pointer = new_pointer if new_pointer is not None else pointer + expected
+                record = {"window": index, "text": " ".join(w["text"].strip() for w in kept), "words": kept, "fallback": False}
+
+            except Exception as e:
+                print(f"\n[WARNING] Window at {offset:.0f}s failed for {os.path.basename(audio_path)}: {e}. Using its PDF slice.")
+                record = {"window": index, "text": " ".join(pdf_words[pointer:pointer + expected]), "words": [], "fallback": True}
+                pointer += expected
+
+            record["pointer"] = pointer
+            _append_checkpoint(f, record)
+
+    texts, words, fallback_windows = [], [], 0
+    for record in _read_checkpoint(partial_path, header)[0]:
+        texts.append(record["text"])
+        words.extend(record["words"])
+        fallback_windows += record["fallback"]
+    return " ".join(t for t in texts if t), words, fallback_windows / len(window_starts)
 
 def clean_aligned_text(text: str) -> str:
     """
     Applies the final cleaning steps (lowercase, punctuation, numbers) to the
-    perfectly aligned text.
+    perfectly aligned text. See text_normalizer for the implementation.
+    """
+    return normalize_text(text)
+
+# ---------------------------
+# ALIGNMENT WORKER POOL
+# ---------------------------
+WHISPER_MODEL_NAME = "base.en"
+
+# Each pool worker loads the model once in _init_worker and keeps it warm.
+_worker_model = None
+
+def _init_worker(threads_per_worker: int):
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads_per_worker)
+    _worker_model = whisper.load_model(WHISPER_MODEL_NAME)
+
+# A failing Pool initializer makes multiprocessing respawn the worker forever, so
+# pool workers keep the load error and report it from align_one_file instead.
+_worker_error = None
+
+def _init_pool_worker(threads_per_worker: int):
+    global _worker_error
+    try:
+        _init_worker(threads_per_worker)
+    except Exception as e:
+        _worker_error = f"[FATAL] Could not load Whisper model. Error: {e}"
+
+def align_one_file(job) -> str:
     """
+    Extracts, aligns, cleans and writes the transcript for one lecture.
+    Returns an error message, or None on success.
+    """
+    core_name, pdf_path, audio_path, output_path, options = job
+    if _worker_error:
+        return _worker_error
+    with measure("align_text", core_name, inputs=[pdf_path, audio_path], outputs=[output_path],
+                 audio_seconds=_audio_duration(audio_path)) as record:
+        try:
+            with measure("align_text.pdf_text", core_name, inputs=[pdf_path]):
+                full_raw_text = extract_pdf_text(pdf_path, options.get("pdf_backend", "pdfplumber"), options.get("pdf_cache_dir", DEFAULT_CACHE_DIR))
 
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    def _replace_digits(match):
-        try: return num2words(match.group(0))
-        except: return match.group(0)
-    text = re.sub(r'\d+', _replace_digits, text)
+            if not full_raw_text.strip():
+                record["status"] = "skipped"
+                return None
+
+            with measure("align_text.whisper", core_name, audio_seconds=record["audio_seconds"]):
+                align_mode = options.get("align_mode", "full")
+                if align_mode == "full":
+                    aligned_text, fallback_ratio = align_and_extract_text(audio_path, full_raw_text, _worker_model)
+                else:
+                    if align_mode == "streaming":
+                        aligned_text, words, fallback_ratio = align_streaming(audio_path, full_raw_text, _worker_model, partial_path_for(output_path),
+                                                                              options.get("window_sec", WINDOW_SEC), options.get("overlap_sec", OVERLAP_SEC))
+                    else:
+                        aligned_text, words, fallback_ratio = align_windowed(audio_path, full_raw_text, _worker_model, options.get("window_sec", WINDOW_SEC))
+                    words_path = os.path.splitext(output_path)[0] + ".words.json"
+                    with open(words_path, "w", encoding="utf-8") as f:
+                        json.dump(words, f, ensure_ascii=False)
+            final_text = clean_aligned_text(aligned_text)
+
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(final_text)
+            # Read by quality_filter.py, so fallback transcripts don't pass as aligned ones.
+            write_alignment_info(output_path, align_mode, fallback_ratio)
+            if os.path.exists(partial_path_for(output_path)):
+                os.remove(partial_path_for(output_path))
+            return None
 
-    text = text.lower()
-    translator = str.maketrans('', '', string.punctuation)
-    text = text.translate(translator)
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text
+        except Exception as e:
+            record["status"] = "error"
+            return f"\n[ERROR] A critical error occurred while processing '{os.path.basename(pdf_path)}': {e}"
 
-def process_all_files(pdf_dir: str, audio_dir: str, txt_dir: str):
+def _audio_duration(audio_path: str) -> float:
+    try:
+        return sf.info(audio_path).duration
+    except Exception:
+        return 0.0
+
+def process_all_files(pdf_dir: str, audio_dir: str, txt_dir: str, workers: int = 1, threads_per_worker: int = None,
+                      align_mode: str = "full", window_sec: float = WINDOW_SEC, overlap_sec: float = OVERLAP_SEC,
+                      pdf_backend: str = "pdfplumber", pdf_cache_dir: str = DEFAULT_CACHE_DIR,
+                      skip_duplicates: bool = False):
     """
     Main function to process all PDFs, aligning them with their corresponding audio files.
+
+    With workers > 1, lectures are spread over a process pool whose workers
+    each load the Whisper model once and run with `threads_per_worker` torch
+    intra-op threads. Jobs are queued longest-first so the long lectures
+    don't end up running alone at the tail of the run.
+
+    align_mode "windowed" uses align_windowed and also writes word-level
+    timestamps to <core_name>.words.json next to each transcript. "streaming"
+    (align_streaming) does too, and checkpoints each window to
+    <core_name>.partial.jsonl so an interrupted lecture resumes mid-file. Either way
+    <core_name>.align.json records how much of the text fell back to the PDF.
+
+    skip_duplicates leaves out lectures flagged by dedup_index.py.
+
+    PDF text comes from the pdf_text_cache layer. Uncached PDFs are extracted
+    up front in this process, with pages spread over a process pool, so the
+    alignment workers only ever hit the cache.
     """
     os.makedirs(txt_dir, exist_ok=True)
-    
-    print("[INFO] Loading Whisper ASR model for alignment (this may take a moment)...")
-    try:
-        whisper_model = whisper.load_model("base.en")
-    except Exception as e:
-        print(f"[FATAL] Could not load Whisper model. Error: {e}")
-        return
 
     pdf_map = {os.path.splitext(f)[0]: os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir) if f.lower().endswith('.pdf')}
     audio_map = {os.path.splitext(f)[0]: os.path.join(audio_dir, f) for f in os.listdir(audio_dir) if f.lower().endswith('.wav')}
@@ -75,32 +350,55 @@ def process_all_files(pdf_dir: str, audio_dir: str, txt_dir: str):
         print(f"[WARNING] No PDF files found in '{pdf_dir}'.")
         return
 
-    print(f"[INFO] Found {len(pdf_map)} PDFs to process. Starting forced alignment...")
-    
-    for core_name, pdf_path in tqdm(pdf_map.items(), desc="Aligning Transcripts"):
+    options = {"align_mode": align_mode, "window_sec": window_sec, "overlap_sec": overlap_sec, "pdf_backend": pdf_backend, "pdf_cache_dir": pdf_cache_dir}
+    duplicates = load_duplicates() if skip_duplicates else {}
+    jobs = []
+    for core_name, pdf_path in pdf_map.items():
+        if core_name in duplicates:
+            print(f"[INFO] Skipping '{core_name}': near-duplicate of '{duplicates[core_name]['duplicate_of']}'.")
+            continue
         if core_name not in audio_map:
-            print(f"\n[WARNING] No matching PROCESSED audio found for '{core_name}.pdf'. Skipping.")
+            print(f"[WARNING] No matching PROCESSED audio found for '{core_name}.pdf'. Skipping.")
             continue
-        
-        audio_path = audio_map[core_name]
+        jobs.append((core_name, pdf_path, audio_map[core_name], os.path.join(txt_dir, core_name + ".txt"), options))
+
+    jobs.sort(key=lambda job: _audio_duration(job[2]), reverse=True)
 
+    for job in tqdm(jobs, desc="Extracting PDF text"):
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                full_raw_text = "".join(page.extract_text() or "" for page in pdf.pages)
-            
-            if not full_raw_text.strip():
-                continue
+            with measure("pdf_extract", job[0], inputs=[job[1]]):
+                extract_pdf_text(job[1], pdf_backend, pdf_cache_dir, page_workers=os.cpu_count() or 1)
+        except Exception as e:
+            print(f"\n[WARNING] Could not pre-extract '{os.path.basename(job[1])}': {e}")
 
-            aligned_text = align_and_extract_text(audio_path, full_raw_text, whisper_model)
-            final_text = clean_aligned_text(aligned_text)
+    workers = max(1, min(workers, len(jobs) or 1))
+    if threads_per_worker is None:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
 
-            output_path = os.path.join(txt_dir, core_name + ".txt")
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(final_text)
+    print(f"[INFO] Found {len(pdf_map)} PDFs to process. Starting forced alignment...")
 
+    if workers == 1:
+        print("[INFO] Loading Whisper ASR model for alignment (this may take a moment)...")
+        try:
+            _init_worker(threads_per_worker)
         except Exception as e:
-            print(f"\n[ERROR] A critical error occurred while processing '{os.path.basename(pdf_path)}': {e}")
-    
+            print(f"[FATAL] Could not load Whisper model. Error: {e}")
+            return
+        for job in tqdm(jobs, desc="Aligning Transcripts"):
+            error = align_one_file(job)
+            if error:
+                print(error)
+    else:
+        print(f"[INFO] Starting {workers} alignment workers with {threads_per_worker} threads each (each loads the Whisper model once)...")
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(processes=workers, initializer=_init_pool_worker, initargs=(threads_per_worker,)) as pool:
+            for error in tqdm(pool.imap_unordered(align_one_file, jobs), total=len(jobs), desc="Aligning Transcripts"):
+                if error and error.startswith("[FATAL]"):
+                    print(f"\n{error}")
+                    return
+                if error:
+                    print(error)
+
     print("\n[DONE] Task 3 completed with forced alignment.")
 
 if __name__ == "__main__":
@@ -108,7 +406,19 @@ if __name__ == "__main__":
     parser.add_argument("--pdf_dir", default="nptel_data/transcripts", help="Path to the directory with raw PDF transcripts.")
     parser.add_argument("--audio_dir", default="nptel_data/processed_audio", help="Path to the directory with PROCESSED audio files from Task 2.")
     parser.add_argument("--txt_dir", default="nptel_data/processed_transcripts", help="Path to save cleaned and aligned .txt files.")
-    
+    parser.add_argument("--workers", type=int, default=1, help="Number of alignment worker processes, each with its own warm Whisper model.")
+    parser.add_argument("--threads_per_worker", type=int, default=None, help="Torch intra-op threads per worker (default: CPU count / workers).")
+    parser.add_argument("--align_mode", choices=["full", "windowed", "streaming"], default="full",
+                        help="'full' prompts Whisper with the whole PDF; 'windowed' aligns fixed windows against a running slice of the PDF; "
+                             "'streaming' aligns overlapping windows and checkpoints each one, so interrupted lectures resume mid-file.")
+    parser.add_argument("--pdf_backend", choices=["auto", "pypdfium2", "pdftotext", "pdfplumber"], default="pdfplumber",
+                        help="PDF text extraction backend; 'auto' picks the fastest installed one.")
+    parser.add_argument("--pdf_cache_dir", default=DEFAULT_CACHE_DIR, help="Directory for the PDF text cache (keyed by PDF hash).")
+    parser.add_argument("--window_sec", type=float, default=WINDOW_SEC, help="Window length in seconds for --align_mode windowed/streaming.")
+    parser.add_argument("--overlap_sec", type=float, default=OVERLAP_SEC, help="Seconds shared by consecutive windows in --align_mode streaming.")
+    parser.add_argument("--skip_duplicates", action="store_true", help="Skip lectures flagged as near-duplicates by dedup_index.py.")
+
     args = parser.parse_args()
-    
-    process_all_files(args.pdf_dir, args.audio_dir, args.txt_dir)
+
+    process_all_files(args.pdf_dir, args.audio_dir, args.txt_dir, args.workers, args.threads_per_worker,
+                      args.align_mode, args.window_sec, args.overlap_sec, args.pdf_backend, args.pdf_cache_dir, args.skip_duplicates)
@@ -2,9 +2,17 @@
 
 import os
 import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
 import soundfile as sf
 from tqdm import tqdm # Import tqdm for a nice progress bar
 
+from manifest_shards import ROWS_PER_SHARD, write_shards_from_manifest
+from manifest_stats import ManifestStats, stats_path_for
+from instrumentation import measure
+import quality_filter
+
 # ---------------------------
 # CONFIG (Same format as your original script)
 # ---------------------------
@@ -13,6 +21,9 @@ AUDIO_DIR = "nptel_data/processed_audio"
 TEXT_DIR = "nptel_data/processed_transcripts"
 OUTPUT_MANIFEST = "nptel_data/train_manifest.jsonl"
 
+# Header stats and transcript reads are I/O bound, so threads scale well.
+NUM_WORKERS = 16
+
 # --- HELPER FUNCTION FOR ROBUST MATCHING ---
 def create_file_map(directory: str, extension: str):
     """
@@ -23,7 +34,7 @@ def create_file_map(directory: str, extension: str):
     if not os.path.isdir(directory):
         print(f"[ERROR] Directory not found: {directory}")
         return file_map
-        
+
     for filename in os.listdir(directory):
         if filename.lower().endswith(extension):
             base_name = os.path.splitext(filename)[0]
@@ -32,73 +43,208 @@ def create_file_map(directory: str, extension: str):
     return file_map
 
 # ---------------------------
-# CREATE TRAINING MANIFEST (Main logic block)
+# INCREMENTAL STATE
 # ---------------------------
-print("[INFO] Starting manifest creation...")
+def state_path_for(output_manifest: str) -> str:
+    return output_manifest + ".state.json"
 
-# Create maps based on core filenames for robust matching.
-audio_map = create_file_map(AUDIO_DIR, ".wav")
-text_map = create_file_map(TEXT_DIR, ".txt")
+def file_stamp(path: str):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime]
 
-# Counters for a better final summary
-entry_count = 0
-missing_transcript_count = 0
+def load_existing(output_manifest: str):
+    """
+    Returns ({core_name: manifest line}, {core_name: stamps}) from the previous
+    build, or empty dicts when there is nothing (valid) to merge with.
+    """
+    state_path = state_path_for(output_manifest)
+    if not (os.path.exists(output_manifest) and os.path.exists(state_path)):
+        return {}, {}
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            stamps = json.load(f)
+        lines = {}
+        with open(output_manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    core_name = os.path.splitext(os.path.basename(entry["audio_filepath"]))[0]
+                    lines[core_name] = line if line.endswith("\n") else line + "\n"
+        return lines, stamps
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[WARNING] Could not read previous manifest state ({e}). Rebuilding from scratch.")
+        return {}, {}
+
+def write_atomic(path: str, lines):
+    """Writes lines to a temp file next to path and renames it into place."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    os.replace(tmp_path, path)
 
-# Open the output file for writing
-with open(OUTPUT_MANIFEST, "w", encoding="utf-8") as f_out:
+# ---------------------------
+# CREATE TRAINING MANIFEST (Main logic block)
+# ---------------------------
+def make_entry(audio_path: str, text_path: str, manifest_dir: str, quality_flags=None):
+    """
+    Builds the manifest line for one audio/transcript pair; quality_flags, if
+    any, are kept on the entry. Returns (line or None, error or None,
+    duration); None/None means an empty transcript.
+    """
+    try:
+        # Get duration from the file header instantly with soundfile
+        duration = round(sf.info(audio_path).duration, 3)
+
+        # Read transcript
+        with open(text_path, "r", encoding="utf-8") as f:
+            transcript = f.read().strip()
+
+        if not transcript:
+            return None, None, duration
+
+        # Create a relative path from the manifest file's location for portability
+        relative_audio_path = os.path.relpath(os.path.abspath(audio_path), manifest_dir)
+
+        entry = {
+            "audio_filepath": relative_audio_path,
+            "duration": duration,
+            "text": transcript
+        }
+        if quality_flags:
+            entry["quality_flags"] = quality_flags
+        return json.dumps(entry, ensure_ascii=False) + "\n", None, duration
+
+    except Exception as e:
+        return None, f"\n[ERROR] Could not process {os.path.basename(audio_path)}: {e}", 0.0
+
+def build_manifest(audio_dir: str = AUDIO_DIR, text_dir: str = TEXT_DIR, output_manifest: str = OUTPUT_MANIFEST,
+                   workers: int = NUM_WORKERS, incremental: bool = True, quality_mode: str = "off",
+                   thresholds: dict = None) -> dict:
+    """
+    Builds (or updates) the training manifest and returns a summary dict.
+
+    Pairs are matched by core filename. With incremental=True, pairs whose
+    audio and transcript size/mtime are unchanged since the last build reuse
+    their previous manifest line; only new or changed pairs are stat'ed and
+    read, on a thread pool. The manifest is written atomically and kept
+    sorted by core name, and the manifest_stats sidecar is updated alongside.
+
+    With quality_mode "tag" or "reject", every pair is first scored by
+    quality_filter (new or changed pairs only, in parallel) and checked
+    against thresholds: failing pairs get a "quality_flags" list, or are
+    left out of the manifest.
+    """
+    print("[INFO] Starting manifest creation...")
 
-    print(f"[INFO] Found {len(audio_map)} audio files. Matching with transcripts...")
+    # Create maps based on core filenames for robust matching.
+    audio_map = create_file_map(audio_dir, ".wav")
+    text_map = create_file_map(text_dir, ".txt")
+    manifest_dir = os.path.dirname(os.path.abspath(output_manifest))
 
-    # --- THIS IS THE ONLY CHANGE ---
-    # Get the list of core names from the audio files and sort them alphabetically.
-    # This will ensure the manifest is written in the correct order (1.1, 1.2, 1.3, etc.).
-    sorted_core_names = sorted(audio_map.keys())
-    # -------------------------------
-
-    # Iterate through the NEW sorted list of core names
-    for core_name in tqdm(sorted_core_names, desc="Creating Manifest"):
-        audio_path = audio_map[core_name]
-        
-        if core_name in text_map:
-            text_path = text_map[core_name]
-
-            try:
-                # Get duration from the file header instantly with soundfile
-                info = sf.info(audio_path)
-                duration = round(info.duration, 3)
-
-                # Read transcript
-                with open(text_path, "r", encoding="utf-8") as f:
-                    transcript = f.read().strip()
-
-                if not transcript:
-                    # Don't print a warning inside the tqdm loop to keep output clean
-                    continue
-
-                # Create a relative path from the manifest file's location for portability
-                manifest_dir = os.path.dirname(os.path.abspath(OUTPUT_MANIFEST))
-                relative_audio_path = os.path.relpath(os.path.abspath(audio_path), manifest_dir)
-
-                # Write JSON line
-                entry = {
-                    "audio_filepath": relative_audio_path,
-                    "duration": duration,
-                    "text": transcript
-                }
-                f_out.write(json.dumps(entry, ensure_ascii=False) + "\n")
-                entry_count += 1
-
-            except Exception as e:
-                print(f"\n[ERROR] Could not process {os.path.basename(audio_path)}: {e}")
+    print(f"[INFO] Found {len(audio_map)} audio files. Matching with transcripts...")
 
+    old_lines, old_stamps = load_existing(output_manifest) if incremental else ({}, {})
+    old_stats = ManifestStats.load(stats_path_for(output_manifest), output_manifest) if old_lines else None
+
+    # Sorting the core names keeps the manifest in lecture order (1.1, 1.2, 1.3, etc.).
+    paired = sorted(core_name for core_name in audio_map if core_name in text_map)
+    missing_transcript_count = len(audio_map) - len(paired)
+
+    flags = {}
+    if quality_mode != "off":
+        metrics = quality_filter.score_pairs({c: (audio_map[c], text_map[c]) for c in paired},
+                                             quality_filter.report_path_for(output_manifest))
+        flags = {c: quality_filter.evaluate(m, thresholds) for c, m in metrics.items() if m}
+    rejected = {c for c in paired if flags.get(c)} if quality_mode == "reject" else set()
+    if rejected:
+        print(f"[INFO] {len(rejected)} pairs fail the quality thresholds and are left out.")
+        paired = [c for c in paired if c not in rejected]
+
+    lines, stamps, todo = {}, {}, []
+    for core_name in paired:
+        stamp = {"audio": file_stamp(audio_map[core_name]), "text": file_stamp(text_map[core_name])}
+        if flags.get(core_name):
+            stamp["quality_flags"] = flags[core_name]
+        stamps[core_name] = stamp
+        old_stamp = old_stamps.get(core_name)
+        if old_stamp == stamp and core_name in old_lines:
+            lines[core_name] = old_lines[core_name]
+        elif old_stamp == {**stamp, "empty": True}:
+            stamps[core_name] = old_stamp  # unchanged and known to be empty
+        else:
+            todo.append(core_name)
+
+    print(f"[INFO] {len(paired) - len(todo)} entries unchanged, {len(todo)} new or changed.")
+
+    # One metrics record for the whole stage; a record per entry would cost a
+    # locked log append per pair. The writes are inside it so bytes_written counts them.
+    with measure("manifest", os.path.basename(output_manifest), inputs=[text_map[c] for c in todo],
+                 outputs=[output_manifest, stats_path_for(output_manifest)], audio_seconds=0.0) as record:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda c: make_entry(audio_map[c], text_map[c], manifest_dir, flags.get(c)), todo)
+            for core_name, (line, error, duration) in tqdm(zip(todo, results), total=len(todo), desc="Creating Manifest"):
+                if error:
+                    print(error)
+                    del stamps[core_name]
+                elif line is None:
+                    # Empty transcripts are marked in the state so they are not re-read next time.
+                    stamps[core_name]["empty"] = True
+                else:
+                    lines[core_name] = line
+                    record["audio_seconds"] += duration
+
+        write_atomic(output_manifest, (lines[c] for c in paired if c in lines))
+        write_atomic(state_path_for(output_manifest), [json.dumps(stamps)])
+
+        # The stats sidecar is updated with only the entries that changed; it is
+        # rebuilt from every line when there is no current sidecar to merge into.
+        if old_stats is not None:
+            stats = old_stats
+            for core_name, old_line in old_lines.items():
+                if lines.get(core_name) != old_line:
+                    stats.subtract(json.loads(old_line))
+            for core_name, line in lines.items():
+                if old_lines.get(core_name) != line:
+                    stats.add(json.loads(line))
         else:
-            missing_transcript_count += 1
-
-# Final Summary
-print("\n" + "="*50)
-print("MANIFEST CREATION SUMMARY")
-print("="*50)
-print(f"Total audio files found: {len(audio_map)}")
-print(f"Successfully created manifest entries: {entry_count}")
-print(f"Audio files with missing transcripts: {missing_transcript_count}")
-print(f"\n[DONE] Training manifest created: {OUTPUT_MANIFEST}")
+            stats = ManifestStats.from_entries(json.loads(line) for line in lines.values())
+        stats.save(stats_path_for(output_manifest), output_manifest)
+
+    return {
+        "audio_files": len(audio_map),
+        "entries": len(lines),
+        "updated": len([c for c in todo if c in lines]),
+        "missing_transcripts": missing_transcript_count,
+        "rejected": len(rejected),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the training manifest from processed audio and transcripts.")
+    parser.add_argument("--audio_dir", default=AUDIO_DIR, help="Directory with processed 16kHz WAVs.")
+    parser.add_argument("--text_dir", default=TEXT_DIR, help="Directory with processed .txt transcripts.")
+    parser.add_argument("--output", default=OUTPUT_MANIFEST, help="Path of the manifest to write.")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="Threads used to stat audio and read transcripts.")
+    parser.add_argument("--full", action="store_true", help="Ignore the previous manifest and rebuild every entry.")
+    parser.add_argument("--quality", choices=quality_filter.MODES, default="off",
+                        help="Check pairs against the quality thresholds and 'tag' or 'reject' those that fail.")
+    parser.add_argument("--thresholds", default=None, help="JSON file overriding the quality thresholds (see quality_filter.py).")
+    parser.add_argument("--shard_dir", default=None, help="Also write Arrow shards + text blobs + offset index to this directory.")
+    parser.add_argument("--rows_per_shard", type=int, default=ROWS_PER_SHARD, help="Entries per shard for --shard_dir.")
+    args = parser.parse_args()
+
+    summary = build_manifest(args.audio_dir, args.text_dir, args.output, args.workers, incremental=not args.full,
+                             quality_mode=args.quality, thresholds=quality_filter.load_thresholds(args.thresholds))
+
+    # Final Summary
+    print("\n" + "="*50)
+    print("MANIFEST CREATION SUMMARY")
+    print("="*50)
+    print(f"Total audio files found: {summary['audio_files']}")
+    print(f"Successfully created manifest entries: {summary['entries']} ({summary['updated']} new or updated)")
+    print(f"Audio files with missing transcripts: {summary['missing_transcripts']}")
+    print(f"Pairs rejected by the quality filter: {summary['rejected']}")
+    print(f"\n[DONE] Training manifest created: {args.output}")
+
+    if args.shard_dir:
+        index = write_shards_from_manifest(args.output, args.shard_dir, args.rows_per_shard)
+        print(f"[DONE] Wrote {index['num_entries']} entries in {len(index['shards'])} shards to {args.shard_dir}")
@@ -0,0 +1,202 @@
+# task4_pack_webdataset.py
+# Packs the training manifest from Task 4 into WebDataset-style tar shards, so the
+# dataset can be read with sequential I/O instead of many small random file opens.
+#
+# Each sample is stored as consecutive tar members sharing one key:
+#   <key>.wav (or <key>.flac)   - the audio (only the segment, if the entry has an offset)
+#   <key>.txt                   - the transcript
+#   <key>.json                  - duration, source audio path and offset
+# Keys contain no dots, as WebDataset splits member names at the first dot.
+
+import io
+import os
+import json
+import tarfile
+import argparse
+
+import soundfile as sf
+from tqdm import tqdm
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+MANIFEST_FILE = "nptel_data/train_manifest.jsonl"
+OUTPUT_DIR = "nptel_data/webdataset"
+SHARD_SIZE_MB = 1024
+SHARD_LIST_FILE = "shards.json"
+
+# ---------------------------
+# PACKING
+# ---------------------------
+def sample_key(entry: dict, index: int) -> str:
+    core_name = os.path.splitext(os.path.basename(entry["audio_filepath"]))[0]
+    key = core_name.replace(".", "_")
+    if "offset" in entry:
+        key = f"{key}_{int(round(entry['offset'] * 1000)):09d}"
+    return f"{index:09d}_{key}"
+
+def _add_bytes(tar, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+def _encode_audio(audio_path: str, entry: dict, flac: bool):
+    """Returns (extension, bytes) for an entry, cutting out its segment if it has an offset."""
+    if not flac and "offset" not in entry:
+        with open(audio_path, "rb") as f:
+            return "wav", f.read()
+
+    info = sf.info(audio_path)
+    start = int(round(entry.get("offset", 0.0) * info.samplerate))
+    stop = start + int(round(entry["duration"] * info.samplerate)) if "offset" in entry else None
+    data, samplerate = sf.read(audio_path, start=start, stop=stop, dtype="int16")
+
+    buffer = io.BytesIO()
+    if flac:
+        sf.write(buffer, data, samplerate, format="FLAC")
+        return "flac", buffer.getvalue()
+    sf.write(buffer, data, samplerate, format="WAV", subtype="PCM_16")
+    return "wav", buffer.getvalue()
+
+def read_manifest(manifest_path: str):
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def pack_shards(manifest_path: str = MANIFEST_FILE, output_dir: str = OUTPUT_DIR, shard_size_mb: int = SHARD_SIZE_MB,
+                flac: bool = False, sort_by_duration: bool = False) -> list:
+    """
+    Streams every manifest entry into fixed-size tar shards and returns the
+    shard list (also written to <output_dir>/shards.json).
+
+    sort_by_duration orders samples by length, so consecutive samples (and
+    whole shards) fall into similar-length buckets and batches pad less.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    shard_bytes = shard_size_mb * 1024 * 1024
+
+    entries = read_manifest(manifest_path)
+    if sort_by_duration:
+        entries = sorted(entries, key=lambda e: e["duration"])
+
+    shards = []
+    tar = None
+
+    def open_shard():
+        name = f"shard-{len(shards):06d}.tar"
+        shards.append({"name": name, "num_samples": 0, "duration": 0.0})
+        return tarfile.open(os.path.join(output_dir, name), "w")
+
+    try:
+        for index, entry in enumerate(tqdm(entries, desc="Packing Shards")):
+            if tar is None or tar.fileobj.tell() >= shard_bytes:
+                if tar is not None:
+                    tar.close()
+                tar = open_shard()
+
+            audio_path = os.path.join(manifest_dir, entry["audio_filepath"])
+            try:
+                ext, audio_bytes = _encode_audio(audio_path, entry, flac)
+            except Exception as e:
+                print(f"\n[ERROR] Could not read {os.path.basename(audio_path)}: {e}")
+                continue
+
+            key = sample_key(entry, index)
+            meta = {
+                "audio_filepath": entry["audio_filepath"],
+                "duration": entry["duration"],
+                "offset": entry.get("offset", 0.0),
+            }
+            _add_bytes(tar, f"{key}.{ext}", audio_bytes)
+            _add_bytes(tar, f"{key}.txt", entry.get("text", "").encode("utf-8"))
+            _add_bytes(tar, f"{key}.json", json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+            shards[-1]["num_samples"] += 1
+            shards[-1]["duration"] += entry["duration"]
+    finally:
+        if tar is not None:
+            tar.close()
+
+    with open(os.path.join(output_dir, SHARD_LIST_FILE), "w", encoding="utf-8") as f:
+        json.dump({"shards": shards, "flac": flac, "sorted_by_duration": sort_by_duration}, f, indent=1)
+    return shards
+
+# ---------------------------
+# STREAMING READER
+# ---------------------------
+def list_shards(shard_dir: str) -> list:
+    with open(os.path.join(shard_dir, SHARD_LIST_FILE), "r", encoding="utf-8") as f:
+        return [os.path.join(shard_dir, s["name"]) for s in json.load(f)["shards"]]
+
+def _iter_tar_samples(shard_path: str):
+    """Groups consecutive members of one tar stream by key."""
+    current_key, sample = None, {}
+    with tarfile.open(shard_path, "r|") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            key, ext = member.name.split(".", 1)
+            if key != current_key and sample:
+                yield sample
+                sample = {}
+            current_key = key
+            sample["__key__"] = key
+            sample[ext] = tar.extractfile(member).read()
+    if sample:
+        yield sample
+
+def iter_samples(shard_paths, rank: int = 0, world_size: int = 1, decode: bool = True):
+    """
+    Streams samples from tar shards with purely sequential reads.
+
+    For multi-node/multi-worker reading, pass this node's rank and the world
+    size. With at least as many shards as readers, each reader gets whole
+    shards (round-robin); with fewer, every reader streams all shards and
+    keeps every world_size-th sample, so any reader count works without
+    re-packing.
+
+    With decode=True each sample is {"key", "audio" (float32 array),
+    "sample_rate", "text", "meta"}; otherwise the raw member bytes by extension.
+    """
+    shard_paths = list(shard_paths)
+    if len(shard_paths) >= world_size:
+        shard_paths, stride, start = shard_paths[rank::world_size], 1, 0
+    else:
+        stride, start = world_size, rank
+
+    position = 0
+    for shard_path in shard_paths:
+        for sample in _iter_tar_samples(shard_path):
+            keep = position % stride == start
+            position += 1
+            if not keep:
+                continue
+            if not decode:
+                yield sample
+                continue
+            audio_ext = "flac" if "flac" in sample else "wav"
+            audio, sample_rate = sf.read(io.BytesIO(sample[audio_ext]), dtype="float32")
+            yield {
+                "key": sample["__key__"],
+                "audio": audio,
+                "sample_rate": sample_rate,
+                "text": sample.get("txt", b"").decode("utf-8"),
+                "meta": json.loads(sample["json"]) if "json" in sample else {},
+            }
+
+# ---------------------------
+# MAIN
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack the training manifest into WebDataset-style tar shards.")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="Path of the JSONL manifest from Task 4.")
+    parser.add_argument("--output_dir", default=OUTPUT_DIR, help="Directory to write the tar shards to.")
+    parser.add_argument("--shard_size_mb", type=int, default=SHARD_SIZE_MB, help="Target size of each shard in MB.")
+    parser.add_argument("--flac", action="store_true", help="Store audio as FLAC instead of WAV (about half the size).")
+    parser.add_argument("--sort_by_duration", action="store_true", help="Order samples by duration for length-bucketed shards.")
+    args = parser.parse_args()
+
+    shards = pack_shards(args.manifest, args.output_dir, args.shard_size_mb, args.flac, args.sort_by_duration)
+    total_samples = sum(s["num_samples"] for s in shards)
+    print(f"\n[DONE] Packed {total_samples} samples into {len(shards)} shards in {args.output_dir}")
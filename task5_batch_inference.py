@@ -0,0 +1,160 @@
+# task5_batch_inference.py
+# Offline ASR pass that produces real hypotheses for the dashboard's error-rate panels.
+#
+# Runs the Task 3 Whisper model over the manifest in duration-sorted batches and appends
+# normalized predictions to a sidecar (<manifest>.pred.jsonl). Entries longer than one
+# 30s Whisper window (whole lectures) are cut into consecutive windows that are decoded
+# as a batch and joined. Entries that already have a prediction from the same model are
+# skipped, so reruns only process new utterances.
+#
+# Whisper/torch are imported inside the inference functions so the dashboard can use
+# the sidecar helpers below without loading them.
+
+import os
+import json
+import argparse
+
+import soundfile as sf
+from tqdm import tqdm
+
+from text_normalizer import normalize_batch
+from instrumentation import measure
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+MANIFEST_FILE = "nptel_data/train_manifest.jsonl"
+BATCH_SIZE = 16
+SAMPLE_RATE = 16000
+# Whisper decodes 30s windows; shorter utterances are batched together, longer
+# ones are split into windows that are batched within the utterance.
+MAX_BATCHED_SECONDS = 30.0
+
+def predictions_path_for(manifest_path: str) -> str:
+    return manifest_path + ".pred.jsonl"
+
+def entry_key(entry: dict):
+    """Identifies an utterance: the audio file plus the segment offset, if any."""
+    return entry["audio_filepath"], round(float(entry.get("offset", 0.0)), 3)
+
+# ---------------------------
+# PREDICTIONS SIDECAR
+# ---------------------------
+def load_predictions(manifest_path: str, model_name: str = None) -> dict:
+    """Returns {entry_key: pred_text}, optionally only for one model."""
+    path = predictions_path_for(manifest_path)
+    predictions = {}
+    if not os.path.exists(path):
+        return predictions
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if model_name is None or record.get("model") == model_name:
+                predictions[entry_key(record)] = record["pred_text"]
+    return predictions
+
+# ---------------------------
+# INFERENCE
+# ---------------------------
+def read_audio(entry: dict, manifest_dir: str):
+    """Reads one utterance (or segment) as 16kHz mono float32."""
+    audio_path = os.path.join(manifest_dir, entry["audio_filepath"])
+    info = sf.info(audio_path)
+    if info.samplerate != SAMPLE_RATE:
+        raise ValueError(f"expected {SAMPLE_RATE} Hz audio, got {info.samplerate}")
+    start = int(round(float(entry.get("offset", 0.0)) * SAMPLE_RATE))
+    stop = start + int(round(float(entry["duration"]) * SAMPLE_RATE)) if "offset" in entry else None
+    audio, _ = sf.read(audio_path, start=start, stop=stop, dtype="float32", always_2d=True)
+    return audio.mean(axis=1)
+
+def transcribe_batch(model, audios) -> list:
+    """Decodes up to 30s clips together as one batch of log-mel spectrograms."""
+    import torch
+    import whisper
+    mels = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audio)), model.dims.n_mels)
+        for audio in audios
+    ]).to(model.device)
+    options = whisper.DecodingOptions(language="en", without_timestamps=True, fp16=model.device.type == "cuda")
+    return [result.text for result in whisper.decode(model, mels, options)]
+
+def transcribe_windows(model, audio, batch_size: int = BATCH_SIZE) -> str:
+    """
+    Decodes a clip longer than 30s as consecutive 30s windows, batch_size at a
+    time, and joins the texts. Unlike transcribe() the windows are fixed, so a
+    word on a window boundary may be cut; fine for error-rate estimates.
+    """
+    window = int(MAX_BATCHED_SECONDS * SAMPLE_RATE)
+    windows = [audio[i:i + window] for i in range(0, len(audio), window)]
+    texts = []
+    for i in range(0, len(windows), batch_size):
+        texts.extend(transcribe_batch(model, windows[i:i + batch_size]))
+    return " ".join(text.strip() for text in texts if text.strip())
+
+def predict_manifest(manifest_path: str = MANIFEST_FILE, model_name: str = None, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Predicts every manifest entry that has no prediction from `model_name`
+    (default: the Task 3 alignment model) yet and appends the results to the
+    sidecar after each batch. Returns the number of new predictions.
+    """
+    from task3_process_text import WHISPER_MODEL_NAME, whisper as whisper_timestamped
+    model_name = model_name or WHISPER_MODEL_NAME
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    done = load_predictions(manifest_path, model_name)
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    todo = [e for e in entries if entry_key(e) not in done]
+    print(f"[INFO] {len(entries) - len(todo)} entries already predicted, {len(todo)} to go.")
+    if not todo:
+        return 0
+
+    # Sorting by duration keeps each batch's clips similar in length.
+    todo.sort(key=lambda e: float(e["duration"]))
+    short = [e for e in todo if float(e["duration"]) <= MAX_BATCHED_SECONDS]
+    long = [e for e in todo if float(e["duration"]) > MAX_BATCHED_SECONDS]
+    batches = [short[i:i + batch_size] for i in range(0, len(short), batch_size)] + [[e] for e in long]
+
+    print(f"[INFO] Loading Whisper model '{model_name}'...")
+    model = whisper_timestamped.load_model(model_name)
+
+    written = 0
+    with open(predictions_path_for(manifest_path), "a", encoding="utf-8") as f_out:
+        for batch in tqdm(batches, desc="Predicting"):
+            try:
+                with measure("inference", batch[0]["audio_filepath"], audio_seconds=sum(float(e["duration"]) for e in batch)):
+                    audios = [read_audio(e, manifest_dir) for e in batch]
+                    if float(batch[0]["duration"]) <= MAX_BATCHED_SECONDS:
+                        texts = transcribe_batch(model, audios)
+                    else:
+                        texts = [transcribe_windows(model, audios[0], batch_size)]
+            except Exception as e:
+                print(f"\n[ERROR] Batch starting at '{batch[0]['audio_filepath']}' failed: {e}")
+                continue
+
+            for entry, pred_text in zip(batch, normalize_batch(texts)):
+                audio_filepath, offset = entry_key(entry)
+                record = {"audio_filepath": audio_filepath, "offset": offset, "model": model_name, "pred_text": pred_text}
+                f_out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f_out.flush()
+            written += len(batch)
+    return written
+
+# ---------------------------
+# MAIN
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run batched Whisper inference over the manifest for the dashboard's error rates.")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="Path of the JSONL manifest.")
+    parser.add_argument("--model", default=None, help="Whisper model name (defaults to the Task 3 alignment model).")
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE, help="Utterances (up to 30s each), or 30s windows of a longer one, decoded together.")
+    args = parser.parse_args()
+
+    count = predict_manifest(args.manifest, args.model, args.batch_size)
+    print(f"\n[DONE] Wrote {count} predictions to {predictions_path_for(args.manifest)}")
@@ -1,5 +1,5 @@
 # final_dashboard_v2_backwards_compatible.py
-# This script is modified to work with older versions of the 'jiwer' library.
+# Error rates come from the per-utterance engine in error_rates.py.
 
 import os
 import json
@@ -7,78 +7,148 @@ import pandas as pd
 import streamlit as st
 import matplotlib.pyplot as plt
 
-try:
-    import jiwer
-except ImportError:
-    st.error("The 'jiwer' library is not installed. Please run 'pip install jiwer'.")
-    st.stop()
+from manifest_stats import ManifestStats, stats_path_for
+from error_rates import DEFAULT_CACHE_PATH, ErrorRateCache, ErrorTotals, compute_counts
+from task5_batch_inference import entry_key, load_predictions, predictions_path_for
+from instrumentation import list_runs, load_records, metrics_log_path, summarize
+from waveform_preview import Samples, envelope, peak_table, spectrogram
+from quality_filter import DEFAULT_THRESHOLDS, evaluate, load_report, report_path_for
 
 # ---------------------------
 # CONFIGURATION
 # ---------------------------
 MANIFEST_FILE = "nptel_data/train_manifest.jsonl"
+WAVEFORM_COLUMNS = 1500     # min/max pairs drawn per inspector view
+MAX_PLAYBACK_SEC = 120      # longer views are shown but not offered for playback
 
 # ---------------------------
 # DATA LOADING AND PROCESSING
 # ---------------------------
-def load_and_prepare_data(manifest_path):
+CHUNK_ROWS = 10000  # manifest rows parsed per chunk; bounds peak memory on large manifests
+
+def _file_stamp(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+@st.cache_data(show_spinner="Loading manifest...")
+def _load_manifest(manifest_path, manifest_stamp, predictions_stamp, text_stats=True):
     """
-    Loads data from the manifest, calculates per-file stats, and
-    simulates prediction text for error rate calculation.
+    Parses the manifest chunk by chunk and returns (df, partials).
+
+    With text_stats, per-file counts are computed with vectorized string ops
+    and vocabulary/alphabet are folded in per chunk; without (the stats
+    sidecar already has them) only the error counts are.
+    Error rates use the hypotheses written by task5_batch_inference.py; entries
+    without one are left out. The returned DataFrame has no text column, so
+    the full transcripts never stay in memory. The stamps are only there to
+    key the cache, so an updated manifest or prediction file is reloaded.
+    """
+    predictions = load_predictions(manifest_path)
+    frames = []
+    vocabulary, alphabet = set(), set()
+    error_totals = ErrorTotals()
+    error_cache = ErrorRateCache(DEFAULT_CACHE_PATH)
+
+    with pd.read_json(manifest_path, lines=True, chunksize=CHUNK_ROWS) as reader:
+        for chunk in reader:
+            text = chunk["text"].fillna("").astype(str)
+            if text_stats:
+                chunk["num_words"] = text.str.split().str.len()
+                chunk["num_chars"] = text.str.len()
+
+                vocabulary.update(" ".join(text.tolist()).split())
+                alphabet.update("".join(text.tolist()))
+
+            # Per-utterance edit operations (cached, parallel); the totals are
+            # summed over operations so chunking does not change the rates.
+            hypothesis = [predictions.get(entry_key(row)) for row in chunk.to_dict("records")]
+            scored = [i for i, hyp in enumerate(hypothesis) if hyp is not None]
+            counts = compute_counts([text.iat[i] for i in scored], [hypothesis[i] for i in scored], cache=error_cache)
+            error_totals.add_many(counts)
+            chunk["wer"] = float("nan")
+            chunk.iloc[scored, chunk.columns.get_loc("wer")] = [
+                100.0 * (s + d + i) / (s + d + h) if (s + d + h) else 0.0
+                for s, d, i, h in (c[:4] for c in counts)
+            ]
+
+            frames.append(chunk.drop(columns=["text"]))
+
+    error_cache.close()
+    df = pd.concat(frames, ignore_index=True)
+    partials = {
+        "vocabulary_size": len(vocabulary),
+        "alphabet": sorted(alphabet),
+        "errors": error_totals.summary() if error_totals.num_scored else None,
+    }
+    return df, partials
+
+@st.cache_data(show_spinner="Loading utterance list...")
+def _load_utterances(manifest_path, manifest_stamp):
+    """Only the columns the inspector needs (audio_filepath, duration, offset); no text is kept."""
+    rows = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                rows.append({"audio_filepath": entry["audio_filepath"], "duration": entry["duration"],
+                             "offset": entry.get("offset", float("nan"))})
+    return pd.DataFrame(rows)
+
+def load_and_prepare_data(manifest_path, corpus_stats=None):
+    """
+    Loads data from the manifest (cached until it or the prediction sidecar
+    changes) and calculates per-file stats and error rates.
+
+    With a current stats sidecar the manifest is only scanned for error
+    rates, i.e. not at all when there are no predictions; df is then None.
     """
     if not os.path.exists(manifest_path):
         st.error(f"Error: Manifest file not found at '{manifest_path}'. Please check the path.")
-        return None
+        return None, None
     if os.path.getsize(manifest_path) == 0:
         st.warning("The manifest file is empty. No data to display.")
-        return None
+        return None, None
 
-    data = []
-    with open(manifest_path, "r", encoding="utf-8") as f:
-        for line in f:
-            data.append(json.loads(line.strip()))
-    
-    df = pd.DataFrame(data)
-
-    def simulate_prediction(text):
-        words = text.split()
-        if len(words) > 3 and len(words) % 3 == 0:
-            return " ".join(words[:-1])
-        return text
+    predictions_stamp = _file_stamp(predictions_path_for(manifest_path))
+    if corpus_stats is not None and predictions_stamp is None:
+        return None, {"errors": None}
+    return _load_manifest(manifest_path, _file_stamp(manifest_path), predictions_stamp, text_stats=corpus_stats is None)
 
-    df['predicted_text'] = df['text'].apply(simulate_prediction)
-    
-    df['num_words'] = df['text'].apply(lambda x: len(x.split()))
-    df['num_chars'] = df['text'].apply(lambda x: len(x))
-    return df
+def load_corpus_stats(manifest_path):
+    """
+    Reads the stats sidecar written by task4, or None when it is missing or
+    out of date with the manifest (then everything is computed from the scan).
+    """
+    if not os.path.exists(manifest_path):
+        return None
+    return ManifestStats.load(stats_path_for(manifest_path), manifest_path)
 
-def calculate_all_statistics(df):
+def calculate_all_statistics(df, partials, corpus_stats=None):
     """
-    Calculates all statistics, modified to use older jiwer functions.
+    Combines the per-file columns and the aggregates collected while loading.
+    Global statistics come from the precomputed sidecar when it is current.
     """
     # 1. Global Statistics
-    total_hours = df['duration'].sum() / 3600
-    num_utterances = len(df)
-    vocabulary = set(" ".join(df['text'].tolist()).split())
-    vocab_size = len(vocabulary)
-    alphabet = sorted(list(set("".join(df['text'].tolist()))))
+    if corpus_stats is not None:
+        total_hours = corpus_stats.total_duration / 3600
+        num_utterances = corpus_stats.num_utterances
+        vocab_size = corpus_stats.vocab_size
+        alphabet = corpus_stats.alphabet
+    else:
+        total_hours = df['duration'].sum() / 3600
+        num_utterances = len(df)
+        vocab_size = partials["vocabulary_size"]
+        alphabet = partials["alphabet"]
 
     # 2. Error Rate Statistics
-    ground_truth = df['text'].tolist()
-    hypothesis = df['predicted_text'].tolist()
-
-    # --- CODE CHANGE IS HERE ---
-    # Instead of compute_measures, call wer() and cer() separately.
-    wer_rate = jiwer.wer(ground_truth, hypothesis)
-    cer_rate = jiwer.cer(ground_truth, hypothesis)
-    
-    wer = wer_rate * 100
-    cer = cer_rate * 100
-    
-    # Approximate the other two metrics based on WER
-    mean_word_accuracy = 100 - wer
-    word_match_rate = 100 - wer # This is a common approximation for WMR
-    # ---------------------------
+    # Without predictions there is nothing to score; the panels show NaN.
+    errors = partials["errors"] or dict.fromkeys(["wer", "cer", "wmr", "mwa"], float("nan"))
+    wer = errors["wer"]
+    cer = errors["cer"]
+    word_match_rate = errors["wmr"]        # matched words / reference words
+    mean_word_accuracy = errors["mwa"]     # mean of per-utterance (1 - WER)
 
     stats = {
         "total_hours": total_hours,
@@ -92,6 +162,80 @@ def calculate_all_statistics(df):
     }
     return stats
 
+@st.cache_data(show_spinner=False)
+def _load_metrics(log_path, log_stamp):
+    """Metrics records from the instrumentation log; the stamp keys the cache."""
+    return load_records(log_path)
+
+@st.cache_data(show_spinner=False)
+def _load_quality(report_path, report_stamp):
+    """Per-lecture quality metrics from the sidecar written by quality_filter; the stamp keys the cache."""
+    rows = [{"lecture": core_name, **value["metrics"]} for core_name, value in load_report(report_path).items() if value.get("metrics")]
+    if not rows:
+        return None
+    df = pd.DataFrame(rows)
+    df["failed_checks"] = [", ".join(evaluate(m, DEFAULT_THRESHOLDS)) for m in df.to_dict("records")]
+    return df
+
+@st.cache_resource(max_entries=16)
+def _open_samples(audio_path, audio_stamp):
+    """Memory-mapped view of one WAV, shared by all sessions; the stamp keys the cache."""
+    return Samples(audio_path)
+
+@st.cache_data(max_entries=16, show_spinner="Indexing waveform peaks...")
+def _peak_table(audio_path, audio_stamp):
+    return peak_table(_open_samples(audio_path, audio_stamp))
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def _spectrogram(audio_path, audio_stamp, start, stop):
+    return spectrogram(_open_samples(audio_path, audio_stamp), start, stop)
+
+def plot_inspector(audio_path, offset, duration):
+    """
+    Waveform and spectrogram of the zoom window picked with the slider. Only
+    the window's samples are read; zoomed-out views use the cached peak table.
+    """
+    stamp = _file_stamp(audio_path)
+    samples = _open_samples(audio_path, stamp)
+    begin = offset
+    end = min(offset + duration, samples.duration) if duration else samples.duration
+    view = st.slider("Window (sec)", min_value=float(begin), max_value=float(end), value=(float(begin), float(min(end, begin + 30.0))),
+                     step=0.1, format="%.1f")
+    start, stop = int(view[0] * samples.rate), int(view[1] * samples.rate)
+    if stop <= start:
+        st.info("Pick a window longer than zero seconds.")
+        return
+
+    times, mins, maxs = envelope(samples, start, stop, WAVEFORM_COLUMNS, _peak_table(audio_path, stamp))
+    image, extent = _spectrogram(audio_path, stamp, start, stop)
+
+    fig, (ax_wave, ax_spec) = plt.subplots(2, 1, figsize=(12, 5), sharex=True)
+    ax_wave.fill_between(times, mins, maxs, color="steelblue", linewidth=0)
+    ax_wave.set_ylim(-1, 1)
+    ax_wave.set_ylabel("Amplitude")
+    ax_spec.imshow(image, origin="lower", aspect="auto", extent=extent, cmap="magma",
+                   vmin=image.max() - 80, vmax=image.max())
+    ax_spec.set_xlabel("Time (seconds)")
+    ax_spec.set_ylabel("Frequency (Hz)")
+    st.pyplot(fig)
+
+    if view[1] - view[0] <= MAX_PLAYBACK_SEC:
+        st.audio(samples.read(start, stop), sample_rate=samples.rate)
+    else:
+        st.caption(f"Narrow the window to {MAX_PLAYBACK_SEC} seconds or less to play it.")
+
+def plot_histogram(df, corpus_stats, column, color, xlabel):
+    """Histogram of a per-file column, drawn from the sidecar's bins when available."""
+    fig, ax = plt.subplots()
+    if corpus_stats is not None:
+        edges, counts, width = corpus_stats.histogram(column)
+        ax.bar(edges, counts, width=width, align='edge', color=color, edgecolor='black')
+    else:
+        ax.hist(df[column], bins=30, color=color, edgecolor='black')
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel("Count of Files")
+    st.pyplot(fig)
+
 # ---------------------------
 # STREAMLIT DASHBOARD UI
 # ---------------------------
@@ -99,10 +243,11 @@ def calculate_all_statistics(df):
 st.set_page_config(layout="wide")
 st.title("Speech Data Explorer")
 
-df = load_and_prepare_data(MANIFEST_FILE)
+corpus_stats = load_corpus_stats(MANIFEST_FILE)
+df, partials = load_and_prepare_data(MANIFEST_FILE, corpus_stats)
 
-if df is not None:
-    stats = calculate_all_statistics(df)
+if partials is not None:
+    stats = calculate_all_statistics(df, partials, corpus_stats)
 
     st.subheader("Global Statistics")
     
@@ -126,6 +271,8 @@ if df is not None:
         st.markdown(f'<div class="metric-box"><div class="label">Alphabet size</div><div class="value">{len(stats["alphabet"])} chars</div></div>', unsafe_allow_html=True)
 
     # Row 2: Error Rate Stats
+    if partials["errors"] is None:
+        st.info("No ASR predictions found. Run `python3 task5_batch_inference.py` to fill in the error-rate panels.")
     col5, col6, col7, col8 = st.columns(4)
     with col5:
         st.markdown(f'<div class="metric-box"><div class="label">Word Error Rate (WER), %</div><div class="value">{stats["wer"]:.2f}</div></div>', unsafe_allow_html=True)
@@ -147,24 +294,69 @@ if df is not None:
     
     with h_col1:
         st.subheader("Duration per File (sec)")
-        fig, ax = plt.subplots()
-        ax.hist(df['duration'], bins=30, color='skyblue', edgecolor='black')
-        ax.set_xlabel("Duration (seconds)")
-        ax.set_ylabel("Count of Files")
-        st.pyplot(fig)
+        plot_histogram(df, corpus_stats, 'duration', 'skyblue', "Duration (seconds)")
 
     with h_col2:
         st.subheader("Words per File")
-        fig, ax = plt.subplots()
-        ax.hist(df['num_words'], bins=30, color='salmon', edgecolor='black')
-        ax.set_xlabel("Number of Words")
-        ax.set_ylabel("Count of Files")
-        st.pyplot(fig)
+        plot_histogram(df, corpus_stats, 'num_words', 'salmon', "Number of Words")
 
     with h_col3:
         st.subheader("Characters per File")
-        fig, ax = plt.subplots()
-        ax.hist(df['num_chars'], bins=30, color='lightgreen', edgecolor='black')
-        ax.set_xlabel("Number of Characters")
-        ax.set_ylabel("Count of Files")
-        st.pyplot(fig)
+        plot_histogram(df, corpus_stats, 'num_chars', 'lightgreen', "Number of Characters")
+
+    # Per-utterance inspector: waveform + spectrogram of any window, read lazily.
+    st.markdown("---")
+    st.header("Utterance Inspector")
+    # The utterance list is only read from the manifest once the inspector is opened.
+    if st.checkbox("Inspect utterances", value=False):
+        utterances = _load_utterances(MANIFEST_FILE, _file_stamp(MANIFEST_FILE))
+        records = utterances.to_dict("records")
+        labels = [f"{os.path.basename(r['audio_filepath'])}" + (f" @ {r['offset']:.1f}s" if pd.notna(r.get("offset", float("nan"))) else "")
+                  for r in records]
+        choice = st.selectbox("Utterance", range(len(records)), format_func=labels.__getitem__)
+        entry = records[choice]
+        audio_path = os.path.join(os.path.dirname(os.path.abspath(MANIFEST_FILE)), entry["audio_filepath"])
+        if os.path.exists(audio_path):
+            has_offset = pd.notna(entry.get("offset", float("nan")))
+            plot_inspector(audio_path, float(entry["offset"]) if has_offset else 0.0, float(entry["duration"]) if has_offset else None)
+        else:
+            st.warning(f"Audio file not found: {audio_path}")
+
+# Pipeline performance, from the per-stage metrics log written by the task scripts.
+metrics_records = _load_metrics(metrics_log_path(), _file_stamp(metrics_log_path()))
+if metrics_records:
+    st.markdown("---")
+    st.header("Pipeline Performance")
+    runs = list_runs(metrics_records)
+    run = st.selectbox("Run", runs, index=0)
+    summary = pd.DataFrame(summarize([r for r in metrics_records if r["run"] == run]))
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+    st.caption("Wall/CPU time in seconds; audio_sec_per_sec is audio processed per second of wall time. "
+               "Sub-steps (e.g. process_audio.ffmpeg) are also counted in their parent stage.")
+
+# Data quality, from the metrics quality_filter keeps next to the manifest.
+quality_df = _load_quality(report_path_for(MANIFEST_FILE), _file_stamp(report_path_for(MANIFEST_FILE)))
+if quality_df is not None:
+    st.markdown("---")
+    st.header("Data Quality")
+    failing = quality_df[quality_df["failed_checks"] != ""]
+    q_col1, q_col2, q_col3 = st.columns(3)
+    with q_col1:
+        st.markdown(f'<div class="metric-box"><div class="label">Lectures scored</div><div class="value">{len(quality_df):,}</div></div>', unsafe_allow_html=True)
+    with q_col2:
+        st.markdown(f'<div class="metric-box"><div class="label">Failing a threshold</div><div class="value">{len(failing):,}</div></div>', unsafe_allow_html=True)
+    with q_col3:
+        st.markdown(f'<div class="metric-box"><div class="label">Hours failing</div><div class="value">{failing["duration"].sum() / 3600:.2f} hours</div></div>', unsafe_allow_html=True)
+
+    qh_col1, qh_col2 = st.columns(2)
+    with qh_col1:
+        st.subheader("Speaking Rate (words/sec)")
+        plot_histogram(quality_df, None, "words_per_sec", "plum", "Words per Second")
+    with qh_col2:
+        st.subheader("Estimated SNR (dB)")
+        plot_histogram(quality_df.dropna(subset=["snr_db"]), None, "snr_db", "khaki", "SNR (dB)")
+
+    only_failing = st.checkbox("Only lectures failing a threshold", value=True)
+    st.dataframe(failing if only_failing else quality_df, use_container_width=True, hide_index=True)
+    st.caption("Checked against the default thresholds in quality_filter.py: "
+               + ", ".join(f"{name} = {bound}" for name, bound in DEFAULT_THRESHOLDS.items()))
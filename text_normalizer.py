@@ -0,0 +1,64 @@
+# text_normalizer.py
+# Transcript normalizer shared by task3 and later stages.
+# Output is byte-for-byte identical to the original task3 clean_aligned_text:
+# collapse whitespace, digits -> words, lowercase, strip ASCII punctuation.
+
+import re
+import string
+from functools import lru_cache
+
+from num2words import num2words
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+DIGIT_RUN = re.compile(r"\d+")
+PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+NUMBER_CACHE_SIZE = 65536
+# Joins batch items; not whitespace, punctuation, a digit or a cased letter,
+# so no step of the normalizer can merge or alter items across it.
+BATCH_SEPARATOR = "\x00"
+
+# ---------------------------
+# NORMALIZER
+# ---------------------------
+@lru_cache(maxsize=NUMBER_CACHE_SIZE)
+def verbalize_number(digits: str) -> str:
+    """num2words for one run of digits, memoized; unconvertible runs are kept as-is."""
+    try:
+        return num2words(digits)
+    except Exception:
+        return digits
+
+def _replace_digits(match):
+    return verbalize_number(match.group(0))
+
+def _normalize_joined(text: str) -> str:
+    """
+    Everything but the final whitespace collapse, done as C-level passes:
+    one regex scan for digit runs (skipped when there are none), lower()
+    and a single translate() for punctuation.
+    """
+    if DIGIT_RUN.search(text):
+        text = DIGIT_RUN.sub(_replace_digits, text)
+    return text.lower().translate(PUNCTUATION_TABLE)
+
+def normalize_text(text: str) -> str:
+    """Normalizes one transcript or segment."""
+    # str.split() and re's \s share the same Unicode whitespace definition,
+    # so this matches the old re.sub(r'\s+', ' ', ...).strip() exactly.
+    return " ".join(_normalize_joined(text).split())
+
+def normalize_batch(texts):
+    """
+    Normalizes a list of strings at once. The items are joined into a single
+    string so the regex, lower() and translate() passes each run once for the
+    whole batch, which removes the per-call overhead on many short segments.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    if any(BATCH_SEPARATOR in t for t in texts):
+        return [normalize_text(t) for t in texts]
+    joined = _normalize_joined(BATCH_SEPARATOR.join(texts))
+    return [" ".join(part.split()) for part in joined.split(BATCH_SEPARATOR)]
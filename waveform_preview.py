@@ -0,0 +1,152 @@
+# waveform_preview.py
+# Lazy waveform and spectrogram views of processed lectures, for the dashboard's inspector.
+#
+# PCM WAVs are memory-mapped (np.memmap over the RIFF data chunk), so a view reads only
+# the pages of its own window; other formats fall back to sf.read(start, stop). The
+# waveform is drawn as min/max pairs per pixel column: zoomed-in windows are reduced from
+# the raw samples, zoomed-out ones from a per-file table of per-block peaks built in one
+# pass. The spectrogram takes one short FFT frame per output column, so its cost depends
+# on the output resolution and not on the window length.
+
+import os
+import struct
+
+import numpy as np
+import soundfile as sf
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+PEAK_BLOCK = 256            # samples per entry in the peak table
+SCAN_BLOCKS = 4096          # peak-table entries computed per read
+SPEC_N_FFT = 512
+SPEC_COLUMNS = 600
+SPEC_BINS = 128
+
+_MEMMAP_DTYPES = {"PCM_16": ("<i2", 1 / 32768), "PCM_32": ("<i4", 1 / 2**31), "FLOAT": ("<f4", 1.0)}
+
+# ---------------------------
+# SAMPLE ACCESS
+# ---------------------------
+def _wav_data_offset(path: str):
+    """Byte offset of the RIFF 'data' chunk payload, or None if there isn't one."""
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"data":
+                return f.tell()
+            f.seek(size + (size & 1), os.SEEK_CUR)
+
+class Samples:
+    """
+    Mono float32 access to [start, stop) sample windows of one file. PCM WAVs
+    are read through a memory map; anything else through soundfile seeks.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        info = sf.info(path)
+        self.rate = info.samplerate
+        self.frames = info.frames
+        self.channels = info.channels
+        self._map, self._scale = None, 1.0
+        offset = _wav_data_offset(path) if info.format == "WAV" and info.subtype in _MEMMAP_DTYPES else None
+        if offset is not None:
+            dtype, self._scale = _MEMMAP_DTYPES[info.subtype]
+            self._map = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(self.frames, self.channels))
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.rate
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        start, stop = max(0, start), min(self.frames, stop)
+        if stop <= start:
+            return np.zeros(0, dtype=np.float32)
+        if self._map is not None:
+            window = self._map[start:stop]
+            return (window.mean(axis=1) if self.channels > 1 else window[:, 0]).astype(np.float32) * np.float32(self._scale)
+        audio, _ = sf.read(self.path, start=start, stop=stop, dtype="float32", always_2d=True)
+        return audio.mean(axis=1)
+
+    def gather(self, positions: np.ndarray, length: int) -> np.ndarray:
+        """(len(positions), length) frames starting at each position, zero past the end."""
+        if self._map is None:
+            out = np.zeros((len(positions), length), dtype=np.float32)
+            for row, position in zip(out, positions):
+                window = self.read(position, position + length)
+                row[:window.size] = window
+            return out
+        index = positions[:, None] + np.arange(length)
+        valid = index < self.frames
+        mono = self._map[np.minimum(index, self.frames - 1)].astype(np.float32).mean(axis=-1)
+        return np.where(valid, mono * np.float32(self._scale), np.float32(0))
+
+# ---------------------------
+# WAVEFORM
+# ---------------------------
+def peak_table(samples: Samples):
+    """(mins, maxs) per PEAK_BLOCK samples over the whole file, in one streaming pass."""
+    num_blocks = -(-samples.frames // PEAK_BLOCK)
+    mins = np.empty(num_blocks, dtype=np.float32)
+    maxs = np.empty(num_blocks, dtype=np.float32)
+    step = PEAK_BLOCK * SCAN_BLOCKS
+    for start in range(0, samples.frames, step):
+        chunk = samples.read(start, start + step)
+        n = -(-chunk.size // PEAK_BLOCK)
+        chunk = np.pad(chunk, (0, n * PEAK_BLOCK - chunk.size), mode="edge").reshape(n, PEAK_BLOCK)
+        first = start // PEAK_BLOCK
+        mins[first:first + n] = chunk.min(axis=1)
+        maxs[first:first + n] = chunk.max(axis=1)
+    return mins, maxs
+
+def _reduce(mins: np.ndarray, maxs: np.ndarray, width: int):
+    """Folds per-item (min, max) pairs into `width` columns."""
+    per = -(-mins.size // width)
+    pad = per * width - mins.size
+    mins = np.pad(mins, (0, pad), mode="edge").reshape(width, per) if mins.size else np.zeros((width, 1), np.float32)
+    maxs = np.pad(maxs, (0, pad), mode="edge").reshape(width, per) if maxs.size else np.zeros((width, 1), np.float32)
+    return mins.min(axis=1), maxs.max(axis=1)
+
+def envelope(samples: Samples, start: int, stop: int, width: int, peaks=None):
+    """
+    (times in seconds, mins, maxs) with `width` columns for [start, stop).
+    Windows spanning more than PEAK_BLOCK samples per column are reduced from
+    the peak table (if given), so a zoomed-out hour costs no sample reads.
+    """
+    start, stop = max(0, start), min(samples.frames, stop)
+    width = max(1, min(width, stop - start))
+    if peaks is not None and (stop - start) / width >= PEAK_BLOCK:
+        first, last = start // PEAK_BLOCK, -(-stop // PEAK_BLOCK)
+        mins, maxs = _reduce(peaks[0][first:last], peaks[1][first:last], width)
+    else:
+        window = samples.read(start, stop)
+        mins, maxs = _reduce(window, window, width)
+    times = (start + (np.arange(width) + 0.5) * (stop - start) / width) / samples.rate
+    return times, mins, maxs
+
+# ---------------------------
+# SPECTROGRAM
+# ---------------------------
+def spectrogram(samples: Samples, start: int, stop: int, columns: int = SPEC_COLUMNS,
+                n_fft: int = SPEC_N_FFT, bins: int = SPEC_BINS):
+    """
+    Low-resolution log-magnitude spectrogram of [start, stop): one Hann
+    window of n_fft samples per column (evenly spaced, so long windows are
+    sampled, not averaged) and `bins` frequency rows. Returns (image in dB of
+    shape (bins, columns), extent (t0, t1, 0, nyquist)) for imshow.
+    """
+    start, stop = max(0, start), min(samples.frames, stop)
+    columns = max(1, min(columns, (stop - start) // (n_fft // 4) or 1))
+    positions = np.linspace(start, max(start, stop - n_fft), columns).astype(np.int64)
+    frames = samples.gather(positions, n_fft) * np.hanning(n_fft).astype(np.float32)
+    power = np.abs(np.fft.rfft(frames, axis=1)[:, :n_fft // 2]) ** 2
+    power = power.reshape(columns, bins, -1).mean(axis=2) if (n_fft // 2) % bins == 0 else power
+    image = 10 * np.log10(power.T + 1e-10)
+    return image, (start / samples.rate, stop / samples.rate, 0, samples.rate / 2)